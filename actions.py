@@ -0,0 +1,103 @@
+import asyncio
+import time
+from contextvars import ContextVar
+
+# Index of the action being run within its parse result (0 for a single intent), so
+# handlers can tell two identical actions of one command apart
+current_action_index = ContextVar("current_action_index", default=0)
+
+
+def split_actions(parsed):
+    """
+    Return the ordered list of actions in a parse result.
+
+    Accepts both the multi-action shape ({"actions": [...]}) and a single intent object.
+    """
+    actions = parsed.get("actions") if isinstance(parsed, dict) else None
+    if isinstance(actions, list):
+        return [action for action in actions if isinstance(action, dict)]
+    return [parsed] if parsed else []
+
+
+def action_target(action):
+    """
+    Return the key of the device or light group an action affects. Actions with the same
+    key are run in order; different keys run concurrently.
+    """
+    intent = action.get("intent")
+    if intent in ("set_color", "trigger_scene"):
+        location = action.get("location") or ("living_room" if intent == "trigger_scene" else "")
+        return ("lights", "_".join(str(location).lower().split()))
+    if intent == "trigger_ifttt" or (not intent and action.get("device")):
+        return ("ifttt", str(action.get("device", "")).lower())
+    if intent == "lg_tv_control":
+        return ("lg_tv",)
+    return ("other", intent)
+
+
+class ActionDispatcher:
+    """
+    Run parsed actions concurrently while keeping actions on the same target in order.
+
+    dispatch() may be called as actions become available (e.g. while a completion is
+    still streaming); each action starts immediately unless an earlier action on the
+    same target is still running, in which case it waits for that one to finish.
+
+    Args:
+        execute: async callable (action) -> (status_code, body dict)
+        on_start: Optional callable (index, action) invoked when an action starts running
+        on_done: Optional callable (result) invoked with each action's result as it finishes
+    """
+
+    def __init__(self, execute, on_start=None, on_done=None):
+        self.execute = execute
+        self.on_start = on_start
+        self.on_done = on_done
+        self.started_at = time.perf_counter()
+        self._tasks = {}
+        self._tails = {}
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def dispatched(self, index):
+        return index in self._tasks
+
+    def dispatch(self, index, action):
+        if index in self._tasks:
+            return
+        target = action_target(action)
+        previous = self._tails.get(target)
+        task = asyncio.create_task(self._run(index, action, previous))
+        self._tasks[index] = task
+        self._tails[target] = task
+
+    async def _run(self, index, action, previous):
+        if previous is not None:
+            # Only ordering matters here; the earlier action reports its own failure
+            await asyncio.wait([previous])
+        start = time.perf_counter()
+        # Each action runs in its own task, so this is only seen by this action
+        current_action_index.set(index)
+        if self.on_start:
+            self.on_start(index, action)
+        try:
+            status_code, body = await self.execute(action)
+        except Exception as e:
+            status_code, body = 500, {"error": str(e)}
+        end = time.perf_counter()
+        result = {
+            "index": index,
+            "intent": action.get("intent"),
+            "status_code": status_code,
+            "result": body,
+            "started_ms": round((start - self.started_at) * 1000, 1),
+            "elapsed_ms": round((end - start) * 1000, 1)
+        }
+        if self.on_done:
+            self.on_done(result)
+        return result
+
+    async def results(self):
+        """Wait for every dispatched action and return their results in action order."""
+        return [await self._tasks[index] for index in sorted(self._tasks)]
@@ -0,0 +1,373 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from metrics import AUTOMATION_LAG_SECONDS
+
+DEFAULT_AUTOMATIONS_PATH = os.path.join("data", "automations.db")
+# The bridge carries a transition's duration in 100 ms ticks in a 16-bit field
+MAX_TRANSITION_SECONDS = 6553.0
+# A step this overdue (e.g. missed while the app was down) is skipped if a later step is due too
+MISSED_STEP_SECONDS = 60.0
+DEFAULT_SUNRISE_SECONDS = 30 * 60
+DEFAULT_SLEEP_SECONDS = 20 * 60
+
+# (hue degrees, bri): deep red at the lowest brightness up to a bright warm white
+SUNRISE_KEYFRAMES = ((0, 1), (15, 60), (30, 150), (40, 254))
+NIGHTLIGHT = (25, 3)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS automations (
+    id TEXT PRIMARY KEY,
+    job TEXT NOT NULL
+)
+"""
+
+
+def parse_when(at=None, in_seconds=None, now=None):
+    """
+    Resolve a start time to a Unix timestamp.
+
+    Args:
+        at: Unix timestamp, "HH:MM" (the next time it is that local time) or an ISO 8601 datetime
+        in_seconds: Seconds from now (used when at is not given)
+        now: Current Unix timestamp (defaults to time.time())
+
+    Raises:
+        ValueError: If at can't be parsed
+    """
+    now = time.time() if now is None else now
+    if at is None:
+        return now + float(in_seconds or 0)
+    if isinstance(at, (int, float)):
+        return float(at)
+    try:
+        clock = datetime.strptime(at, "%H:%M").time()
+    except ValueError:
+        return datetime.fromisoformat(at).timestamp()
+    today = datetime.fromtimestamp(now)
+    when = datetime.combine(today.date(), clock)
+    if when.timestamp() <= now:
+        when += timedelta(days=1)
+    return when.timestamp()
+
+
+def color_step(offset, location, hue, bri, transition):
+    action = {"intent": "set_color", "location": location, "hue": min(360, max(0, round(hue))), "sat": 254, "bri": min(254, max(1, round(bri)))}
+    if transition:
+        action["transition_seconds"] = round(transition, 1)
+    return {"offset": round(offset, 3), "action": action}
+
+
+def keyframe_steps(location, keyframes, duration):
+    """
+    Steps that move a room through (hue, bri) keyframes over duration seconds.
+
+    The first keyframe is set straight away and each later one is reached with a single
+    Hue transition, so the bridge interpolates between them. Segments longer than
+    MAX_TRANSITION_SECONDS are split at linearly interpolated intermediate colours.
+    """
+    if len(keyframes) < 2:
+        raise ValueError("A transition needs at least two keyframes")
+    segment = duration / (len(keyframes) - 1)
+    parts = max(1, int(-(-segment // MAX_TRANSITION_SECONDS)))
+    steps = [color_step(0, location, keyframes[0][0], keyframes[0][1], None)]
+    for index, ((hue_from, bri_from), (hue_to, bri_to)) in enumerate(zip(keyframes, keyframes[1:])):
+        for part in range(1, parts + 1):
+            fraction = part / parts
+            offset = index * segment + (part - 1) * segment / parts
+            hue = hue_from + (hue_to - hue_from) * fraction
+            bri = bri_from + (bri_to - bri_from) * fraction
+            steps.append(color_step(offset, location, hue, bri, segment / parts))
+    return steps
+
+
+def action_steps(action):
+    """
+    A single action as steps. A set_color or trigger_scene with a transition longer than the
+    bridge allows is capped at MAX_TRANSITION_SECONDS, as the starting colour is unknown.
+    """
+    if not isinstance(action, dict) or not action.get("intent"):
+        raise ValueError("'action' must be an intent object")
+    action = dict(action)
+    if action.get("transition_seconds") is not None:
+        action["transition_seconds"] = min(float(action["transition_seconds"]), MAX_TRANSITION_SECONDS)
+    return [{"offset": 0, "action": action}]
+
+
+def routine_steps(body):
+    """
+    Steps for a named routine.
+
+    "sunrise": deep red to bright warm white in location over duration_seconds (30 min).
+    "sleep": fade location to a dim nightlight over duration_seconds (20 min).
+    "fade": to {"hue", "bri"} or {"scene"} over duration_seconds, from {"hue", "bri"} if given.
+
+    Raises:
+        ValueError: For an unknown routine or missing fields
+    """
+    routine = body.get("routine")
+    location = body.get("location")
+    if not location:
+        raise ValueError("Routines need a 'location'")
+    if routine == "sunrise":
+        return keyframe_steps(location, SUNRISE_KEYFRAMES, float(body.get("duration_seconds", DEFAULT_SUNRISE_SECONDS)))
+    duration = float(body.get("duration_seconds", DEFAULT_SLEEP_SECONDS))
+    if routine == "sleep":
+        return action_steps({"intent": "set_color", "location": location, "hue": NIGHTLIGHT[0], "sat": 254, "bri": NIGHTLIGHT[1], "transition_seconds": duration})
+    if routine == "fade":
+        target = body.get("to") or {}
+        if target.get("scene"):
+            return action_steps({"intent": "trigger_scene", "scene_name": target["scene"], "location": location, "transition_seconds": duration})
+        if target.get("hue") is None or target.get("bri") is None:
+            raise ValueError("'fade' needs 'to': {\"hue\", \"bri\"} or {\"scene\"}")
+        start = body.get("from")
+        if start and start.get("hue") is not None and start.get("bri") is not None:
+            return keyframe_steps(location, ((start["hue"], start["bri"]), (target["hue"], target["bri"])), duration)
+        return action_steps({"intent": "set_color", "location": location, "hue": target["hue"], "sat": 254, "bri": target["bri"], "transition_seconds": duration})
+    raise ValueError(f"Unknown routine {routine!r} (expected sunrise, sleep or fade)")
+
+
+def build_steps(body):
+    """Steps for an /automations request: a "routine", a single "action", or explicit "steps"."""
+    if body.get("routine"):
+        return routine_steps(body)
+    if body.get("action") is not None:
+        return action_steps(body["action"])
+    steps = body.get("steps")
+    if not steps or not all(isinstance(step, dict) and "action" in step for step in steps):
+        raise ValueError("Expected a 'routine', an 'action' or a list of 'steps' ({\"offset\", \"action\"})")
+    return sorted(({"offset": float(step.get("offset", 0)), "action": step["action"]} for step in steps), key=lambda step: step["offset"])
+
+
+class AutomationScheduler:
+    """
+    In-process scheduler for timed actions and multi-step transitions.
+
+    Each job is a list of steps ({"offset": seconds from the job's start, "action": ...})
+    run through run_action at their due times, optionally repeating every `every` seconds.
+    Due times sit in a heap, so adding, cancelling and firing are O(log n) and the loop
+    sleeps until the earliest one (thousands of pending jobs cost nothing between firings).
+    Cancelled or rescheduled entries are dropped lazily when they reach the top.
+
+    Jobs are stored in SQLite and reloaded by start(), so they survive restarts. A step
+    missed by more than MISSED_STEP_SECONDS is skipped when a later step of the same job is
+    already due (each step sets an absolute state), and a repeating job that missed whole
+    occurrences resumes at its next one. The delay between a step's due time and when it
+    ran is recorded in the jarvis_automation_lag_seconds histogram.
+
+    Args:
+        run_action: async callable (action) -> (status_code, body dict)
+        path: SQLite database file (None keeps jobs in memory only)
+        clock: Returns the current Unix time
+    """
+
+    def __init__(self, run_action, path=DEFAULT_AUTOMATIONS_PATH, clock=time.time):
+        self.run_action = run_action
+        self.path = path
+        self.clock = clock
+        self.fired = 0
+        self.failed = 0
+        self.skipped = 0
+        self.lags = deque(maxlen=200)
+        self.recent_failures = deque(maxlen=20)
+        self._jobs = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._db = None
+        self._task = None
+        self._wakeup = None
+        self._running = set()
+        # job id -> its latest step's task, so a job's steps reach the bridge in order
+        self._tails = {}
+
+    def _conn(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path or "")
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path or ":memory:", isolation_level=None)
+            self._db.execute(_SCHEMA)
+        return self._db
+
+    def start(self):
+        """Load the stored jobs and start the timer loop (if not running)."""
+        if self._task is not None:
+            return
+        for job_id, data in self._conn().execute("SELECT id, job FROM automations").fetchall():
+            self._jobs[job_id] = json.loads(data)
+            self._push(self._jobs[job_id])
+        if self._jobs:
+            logging.info(f"Loaded {len(self._jobs)} scheduled automations")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the loop; stored jobs are picked up again by the next start()."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._running:
+            await asyncio.wait(self._running)
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job["due"], next(self._sequence), job["id"]))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _save(self, job):
+        self._conn().execute("INSERT OR REPLACE INTO automations (id, job) VALUES (?, ?)", (job["id"], json.dumps(job)))
+
+    def add(self, steps, start, every=None, name=None):
+        """
+        Schedule a job.
+
+        Args:
+            steps: list of {"offset": seconds, "action": dict}, sorted by offset
+            start: Unix time of offset 0
+            every: Repeat interval in seconds (None runs once)
+            name: Label shown in jobs()
+
+        Returns:
+            dict: The stored job
+        """
+        if not steps:
+            raise ValueError("A job needs at least one step")
+        if every is not None and every <= steps[-1]["offset"]:
+            raise ValueError("'every_seconds' must be longer than the job's steps")
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "name": name,
+            "steps": steps,
+            "start": start,
+            "every": every,
+            "next": 0,
+            "due": start + steps[0]["offset"],
+            "created": self.clock()
+        }
+        self._jobs[job["id"]] = job
+        self._save(job)
+        self._push(job)
+        return job
+
+    def cancel(self, job_id):
+        """Remove a job; its heap entry is discarded when it comes up. Returns False if unknown."""
+        if self._jobs.pop(job_id, None) is None:
+            return False
+        self._conn().execute("DELETE FROM automations WHERE id = ?", (job_id,))
+        return True
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        return sorted(self._jobs.values(), key=lambda job: job["due"])
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            while self._heap:
+                due, _, job_id = self._heap[0]
+                job = self._jobs.get(job_id)
+                if job is None or job["due"] != due:
+                    heapq.heappop(self._heap)
+                    continue
+                timeout = due - self.clock()
+                break
+            if timeout is None or timeout > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            heapq.heappop(self._heap)
+            self._fire(job)
+
+    def _fire(self, job):
+        now = self.clock()
+        steps = job["steps"]
+        # Catch up after downtime: only the latest overdue step of a job matters
+        while (
+            job["next"] + 1 < len(steps)
+            and now - job["due"] > MISSED_STEP_SECONDS
+            and job["start"] + steps[job["next"] + 1]["offset"] <= now
+        ):
+            job["next"] += 1
+            job["due"] = job["start"] + steps[job["next"]]["offset"]
+            self.skipped += 1
+        lag = max(0.0, now - job["due"])
+        self.lags.append(lag)
+        AUTOMATION_LAG_SECONDS.observe(lag, steps[job["next"]]["action"].get("intent") or "")
+        previous = self._tails.get(job["id"])
+        task = asyncio.create_task(self._execute(job, steps[job["next"]]["action"], previous))
+        self._tails[job["id"]] = task
+        self._running.add(task)
+        task.add_done_callback(self._finished)
+
+        job["next"] += 1
+        if job["next"] >= len(steps):
+            if not job["every"]:
+                self.cancel(job["id"])
+                return
+            job["next"] = 0
+            job["start"] += job["every"]
+            # Occurrences missed entirely (app down for days) are not replayed
+            while job["start"] + steps[-1]["offset"] < now:
+                job["start"] += job["every"]
+        job["due"] = job["start"] + steps[job["next"]]["offset"]
+        self._save(job)
+        self._push(job)
+
+    def _finished(self, task):
+        self._running.discard(task)
+        for job_id, tail in list(self._tails.items()):
+            if tail is task:
+                del self._tails[job_id]
+
+    async def _execute(self, job, action, previous):
+        if previous is not None:
+            await asyncio.wait([previous])
+        self.fired += 1
+        try:
+            status_code, body = await self.run_action(dict(action))
+        except Exception as e:
+            status_code, body = 500, {"error": str(e)}
+        if status_code >= 400:
+            self.failed += 1
+            self.recent_failures.append({"job": job["id"], "name": job["name"], "status": status_code, "error": body.get("error"), "at": self.clock()})
+            logging.warning(f"Automation {job['name'] or job['id']} step failed ({status_code}): {body.get('error')}")
+
+    def stats(self):
+        lags = sorted(self.lags)
+
+        def ms(fraction):
+            if not lags:
+                return None
+            return round(lags[min(len(lags) - 1, int(fraction * len(lags)))] * 1000, 1)
+
+        upcoming = min((job["due"] for job in self._jobs.values()), default=None)
+        return {
+            "pending": len(self._jobs),
+            "next_due_in_s": None if upcoming is None else round(max(0.0, upcoming - self.clock()), 1),
+            "fired": self.fired,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "lag_ms": {"p50": ms(0.5), "p99": ms(0.99), "max": ms(1.0)},
+            "recent_failures": list(self.recent_failures)
+        }
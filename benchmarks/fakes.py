@@ -0,0 +1,350 @@
+"""
+Local stand-ins for the Hue bridge, the OpenAI API, IFTTT and an LG webOS TV, for reproducible benchmarks.
+
+Run from the repo root:
+    python -m benchmarks.fakes [--bridge-port 8081] [--openai-port 8082] [--ifttt-port 8083] [--tv-port 8084]
+        [--bridge-latency-ms 20] [--bridge-429-rate 0.0] [--llm-latency-ms 300] [--ifttt-latency-ms 50]
+        [--llm-slow-rate 0.0] [--llm-slow-ms 5000] [--llm-fast-latency-ms 100] [--llm-fast-invalid-rate 0.0]
+
+Point the app at them with HUE_BRIDGE_SCHEME=http HUE_BRIDGE_IP=127.0.0.1:8081,
+OPENAI_BASE_URL=http://127.0.0.1:8082/v1, IFTTT_BASE_URL=http://127.0.0.1:8083 and
+LG_TV_HOST=127.0.0.1:8084 LG_TV_SECURE=false.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from local_parser import parse_locally
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENES_JSON = os.path.join(ROOT, "scenes.json")
+FAKE_LOCATIONS = ("bedroom", "living_room")
+
+
+def load_scenes(path=SCENES_JSON):
+    try:
+        with open(path) as f:
+            return json.load(f).get("data", [])
+    except (OSError, ValueError):
+        return []
+
+
+def bridge_app(latency_ms=20.0, rate_429=0.0, scenes=None):
+    """
+    CLIP v2 bridge serving scenes.json and accepting PUT/POST/DELETE on any resource.
+    Each write waits latency_ms and fails with 429 with probability rate_429.
+    """
+    app = FastAPI()
+    resources = {"scene": {s["id"]: s for s in (load_scenes() if scenes is None else scenes)}}
+    app.state.counts = {"get": 0, "put": 0, "post": 0, "delete": 0, "throttled": 0}
+
+    async def write_delay():
+        await asyncio.sleep(latency_ms / 1000.0)
+        if rate_429 and random.random() < rate_429:
+            app.state.counts["throttled"] += 1
+            return JSONResponse({"errors": [{"description": "Too many requests"}], "data": []}, status_code=429)
+        return None
+
+    @app.get("/clip/v2/resource/{rtype}")
+    async def list_resources(rtype: str):
+        app.state.counts["get"] += 1
+        return {"errors": [], "data": list(resources.get(rtype, {}).values())}
+
+    @app.get("/clip/v2/resource/{rtype}/{rid}")
+    async def get_resource(rtype: str, rid: str):
+        app.state.counts["get"] += 1
+        item = resources.get(rtype, {}).get(rid)
+        if item is None:
+            return JSONResponse({"errors": [{"description": "Not found"}], "data": []}, status_code=404)
+        return {"errors": [], "data": [item]}
+
+    @app.put("/clip/v2/resource/{rtype}/{rid}")
+    async def put_resource(rtype: str, rid: str, request: Request):
+        app.state.counts["put"] += 1
+        throttled = await write_delay()
+        if throttled:
+            return throttled
+        resources.setdefault(rtype, {}).setdefault(rid, {"id": rid, "type": rtype}).update(await request.json())
+        return {"errors": [], "data": [{"rid": rid, "rtype": rtype}]}
+
+    @app.post("/clip/v2/resource/{rtype}")
+    async def post_resource(rtype: str, request: Request):
+        app.state.counts["post"] += 1
+        throttled = await write_delay()
+        if throttled:
+            return throttled
+        rid = str(uuid.uuid4())
+        resources.setdefault(rtype, {})[rid] = {"id": rid, "type": rtype, **(await request.json())}
+        return {"errors": [], "data": [{"rid": rid, "rtype": rtype}]}
+
+    @app.delete("/clip/v2/resource/{rtype}/{rid}")
+    async def delete_resource(rtype: str, rid: str):
+        app.state.counts["delete"] += 1
+        resources.get(rtype, {}).pop(rid, None)
+        return {"errors": [], "data": [{"rid": rid, "rtype": rtype}]}
+
+    @app.get("/bench/stats")
+    async def stats():
+        return app.state.counts
+
+    return app
+
+
+def fake_intent(text, scene_names):
+    """Deterministic intent for a request: the local grammar's answer, else a set_color."""
+    parsed, _ = parse_locally(text, scene_names, FAKE_LOCATIONS)
+    if parsed:
+        return parsed
+    location = "living_room" if "living" in text.lower() else "bedroom"
+    return {"intent": "set_color", "location": location, "hue": sum(map(ord, text)) % 360, "sat": 200, "bri": 150}
+
+
+def is_reasoning_model(model):
+    return model.startswith(("o1", "o3", "o4"))
+
+
+def openai_app(
+    latency_ms=300.0,
+    chunk_delay_ms=10.0,
+    chunk_chars=8,
+    scenes=None,
+    slow_rate=0.0,
+    slow_latency_ms=5000.0,
+    fast_latency_ms=100.0,
+    fast_invalid_rate=0.0
+):
+    """
+    OpenAI-compatible /v1/chat/completions. Non-streamed responses wait latency_ms; streamed
+    ones send the first chunk after latency_ms and the rest every chunk_delay_ms. With
+    probability slow_rate a completion waits slow_latency_ms instead (a tail-latency outlier).
+
+    Non-reasoning models (anything but o1/o3/o4) stand in for a small fast model: they wait
+    fast_latency_ms, and with probability fast_invalid_rate answer with an intent that is
+    missing its required fields.
+    """
+    app = FastAPI()
+    scene_names = [s.get("metadata", {}).get("name", "").lower() for s in (load_scenes() if scenes is None else scenes)]
+    app.state.counts = {"completions": 0, "streamed": 0, "slow": 0, "by_model": {}, "invalid": 0}
+
+    def first_byte_delay(model):
+        if slow_rate and random.random() < slow_rate:
+            app.state.counts["slow"] += 1
+            return slow_latency_ms / 1000.0
+        return (latency_ms if is_reasoning_model(model) else fast_latency_ms) / 1000.0
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "o4-mini-2025-04-16", "object": "model", "created": 0, "owned_by": "fake"}]}
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        app.state.counts["completions"] += 1
+        app.state.counts["by_model"][model] = app.state.counts["by_model"].get(model, 0) + 1
+        user = next((m["content"] for m in reversed(body.get("messages", [])) if m.get("role") == "user"), "")
+        intent = fake_intent(user.replace("Request:", "").strip(), scene_names)
+        if not is_reasoning_model(model) and fast_invalid_rate and random.random() < fast_invalid_rate:
+            app.state.counts["invalid"] += 1
+            intent = {"intent": intent.get("intent")}
+        content = json.dumps(intent)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        delay = first_byte_delay(model)
+        if not body.get("stream"):
+            await asyncio.sleep(delay)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }
+
+        app.state.counts["streamed"] += 1
+
+        async def events():
+            await asyncio.sleep(delay)
+            for i in range(0, len(content), chunk_chars):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": content[i:i + chunk_chars]}, "finish_reason": None}]
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(chunk_delay_ms / 1000.0)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/bench/stats")
+    async def stats():
+        return app.state.counts
+
+    return app
+
+
+def ifttt_app(latency_ms=50.0):
+    """IFTTT webhook sink: accepts /trigger/{event}/json/with/key/{key} and counts events."""
+    app = FastAPI()
+    app.state.counts = {}
+
+    @app.post("/trigger/{event}/json/with/key/{key}")
+    async def trigger(event: str, key: str):
+        await asyncio.sleep(latency_ms / 1000.0)
+        app.state.counts[event] = app.state.counts.get(event, 0) + 1
+        return {"status": "ok"}
+
+    @app.get("/bench/stats")
+    async def stats():
+        return app.state.counts
+
+    return app
+
+
+def webos_app(latency_ms=5.0):
+    """
+    LG webOS (SSAP) TV on a WebSocket at /. The first registration without a known
+    client-key is "paired" straight away (a real TV shows a prompt first) and issued a
+    key. Requests are answered concurrently after latency_ms; unknown URIs get an error
+    frame. POST /bench/drop closes every open session, like the TV being switched off.
+    """
+    app = FastAPI()
+    app.state.counts = {"connections": 0, "registrations": 0, "pairings": 0, "requests": 0, "errors": 0}
+    app.state.keys = set()
+    app.state.volume = 10
+    sockets = set()
+
+    def handle(uri, payload):
+        if uri == "ssap://audio/setVolume":
+            app.state.volume = payload.get("volume", app.state.volume)
+        elif uri in ("ssap://audio/volumeUp", "ssap://audio/volumeDown"):
+            app.state.volume += 1 if uri.endswith("Up") else -1
+        elif uri == "ssap://audio/getVolume":
+            return {"returnValue": True, "volume": app.state.volume}
+        elif not uri.startswith(("ssap://system", "ssap://audio", "ssap://tv", "ssap://media.controls")):
+            return None
+        return {"returnValue": True}
+
+    async def respond(websocket, frame):
+        await asyncio.sleep(latency_ms / 1000.0)
+        result = handle(frame.get("uri", ""), frame.get("payload") or {})
+        if result is None:
+            app.state.counts["errors"] += 1
+            reply = {"type": "error", "id": frame.get("id"), "error": "404 no such service or method", "payload": {}}
+        else:
+            reply = {"type": "response", "id": frame.get("id"), "payload": result}
+        try:
+            await websocket.send_text(json.dumps(reply))
+        except Exception:
+            pass
+
+    @app.websocket("/")
+    async def session(websocket: WebSocket):
+        await websocket.accept()
+        app.state.counts["connections"] += 1
+        sockets.add(websocket)
+        tasks = set()
+        try:
+            while True:
+                frame = json.loads(await websocket.receive_text())
+                if frame.get("type") == "register":
+                    app.state.counts["registrations"] += 1
+                    key = (frame.get("payload") or {}).get("client-key")
+                    if key not in app.state.keys:
+                        app.state.counts["pairings"] += 1
+                        await websocket.send_text(json.dumps({"type": "response", "id": frame["id"], "payload": {"pairingType": "PROMPT", "returnValue": True}}))
+                        key = uuid.uuid4().hex
+                        app.state.keys.add(key)
+                    await websocket.send_text(json.dumps({"type": "registered", "id": frame["id"], "payload": {"client-key": key}}))
+                    continue
+                app.state.counts["requests"] += 1
+                task = asyncio.create_task(respond(websocket, frame))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            sockets.discard(websocket)
+            for task in tasks:
+                task.cancel()
+
+    @app.post("/bench/drop")
+    async def drop():
+        dropped = len(sockets)
+        for websocket in list(sockets):
+            await websocket.close()
+        return {"dropped": dropped}
+
+    @app.get("/bench/stats")
+    async def stats():
+        return {**app.state.counts, "volume": app.state.volume}
+
+    return app
+
+
+def serve_in_thread(app, port, host="127.0.0.1"):
+    """Run app with uvicorn on a background thread; returns the uvicorn.Server (set should_exit to stop)."""
+    server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bridge-port", type=int, default=8081)
+    parser.add_argument("--openai-port", type=int, default=8082)
+    parser.add_argument("--ifttt-port", type=int, default=8083)
+    parser.add_argument("--tv-port", type=int, default=8084)
+    parser.add_argument("--bridge-latency-ms", type=float, default=20.0)
+    parser.add_argument("--bridge-429-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-chunk-delay-ms", type=float, default=10.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0)
+    parser.add_argument("--llm-slow-ms", type=float, default=5000.0)
+    parser.add_argument("--llm-fast-latency-ms", type=float, default=100.0)
+    parser.add_argument("--llm-fast-invalid-rate", type=float, default=0.0)
+    parser.add_argument("--ifttt-latency-ms", type=float, default=50.0)
+    parser.add_argument("--tv-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    servers = [
+        serve_in_thread(bridge_app(args.bridge_latency_ms, args.bridge_429_rate), args.bridge_port),
+        serve_in_thread(openai_app(
+            args.llm_latency_ms,
+            args.llm_chunk_delay_ms,
+            slow_rate=args.llm_slow_rate,
+            slow_latency_ms=args.llm_slow_ms,
+            fast_latency_ms=args.llm_fast_latency_ms,
+            fast_invalid_rate=args.llm_fast_invalid_rate
+        ), args.openai_port),
+        serve_in_thread(ifttt_app(args.ifttt_latency_ms), args.ifttt_port),
+        serve_in_thread(webos_app(args.tv_latency_ms), args.tv_port)
+    ]
+    print(f"Fake bridge on :{args.bridge_port}, OpenAI on :{args.openai_port}, IFTTT on :{args.ifttt_port}, TV on :{args.tv_port}", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
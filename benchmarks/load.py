@@ -0,0 +1,287 @@
+"""
+Load-test /control (Hue/IFTTT and LG TV commands), /parse and /execute and report throughput and p50/p95/p99 per endpoint.
+
+Run from the repo root. Without --target the app is started locally against the fake
+bridge, OpenAI and IFTTT servers from benchmarks/fakes.py:
+    python -m benchmarks.load [--requests 200] [--concurrency 8] [--save baseline.json]
+    python -m benchmarks.load --compare baseline.json [--threshold 0.15]
+    python -m benchmarks.load --target http://127.0.0.1:8000   # an already running app
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.fakes import ROOT, bridge_app, ifttt_app, openai_app, serve_in_thread, webos_app
+
+SCENES = ["relax", "read", "movie mode", "sunset", "fireplace", "concentrate"]
+COLORS = ["blue", "warm orange", "deep red", "soft pink", "green", "purple"]
+
+
+def control_bodies():
+    for i in itertools.count():
+        kind = i % 3
+        if kind == 0:
+            yield {"intent": "set_color", "location": ("bedroom", "living_room")[i % 2], "hue": (i * 37) % 360, "sat": 254, "bri": 150}
+        elif kind == 1:
+            yield {"intent": "trigger_scene", "scene_name": SCENES[i % len(SCENES)], "location": "living_room"}
+        else:
+            yield {"intent": "trigger_ifttt", "device": ("ac", "tv")[i % 2], "command": ("on", "off")[(i // 2) % 2]}
+
+
+def text_bodies(tag=""):
+    # Half are simple commands the local grammar answers; the rest need the (fake) LLM and
+    # carry a counter (and the tag, so one endpoint's texts aren't another's) so they miss
+    # the intent cache
+    for i in itertools.count():
+        if i % 2 == 0:
+            yield {"text": f"{SCENES[i % len(SCENES)]} in the living room"}
+        else:
+            yield {"text": f"make the bedroom feel {COLORS[i % len(COLORS)]} number {tag}{i}"}
+
+
+def tv_bodies():
+    commands = ["volume up", "volume down", "pause", "play", "mute", "unmute"]
+    for i in itertools.count():
+        yield {"intent": "lg_tv_control", "command": commands[i % len(commands)]}
+
+
+WORKLOADS = {
+    "control": ("/control", control_bodies),
+    "tv": ("/control", tv_bodies),
+    "parse": ("/parse", lambda: text_bodies("p")),
+    "execute": ("/execute", lambda: text_bodies("e"))
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def run_endpoint(client, path, bodies, requests, concurrency):
+    """Send requests bodies taken from the bodies iterator to path, concurrency at a time."""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            body = next(bodies)
+            start = time.perf_counter()
+            try:
+                response = await client.post(path, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1)
+    }
+
+
+async def run_load(target, endpoints, requests, concurrency):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=target, timeout=60, limits=limits) as client:
+        results = {}
+        for name in endpoints:
+            path, make_bodies = WORKLOADS[name]
+            # Shared by the warm-up and the timed run, so the timed texts are new ones
+            bodies = make_bodies()
+            # A few untimed requests so connection setup and first-call imports aren't measured
+            await run_endpoint(client, path, bodies, min(concurrency, requests), concurrency)
+            results[name] = await run_endpoint(client, path, bodies, requests, concurrency)
+        return results
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def add_stack_arguments(parser):
+    """Options for the fakes and the locally started app (shared with benchmarks.replay)."""
+    parser.add_argument("--bridge-latency-ms", type=float, default=20.0)
+    parser.add_argument("--bridge-429-rate", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--llm-chunk-delay-ms", type=float, default=10.0)
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="Share of completions delayed to --llm-slow-ms")
+    parser.add_argument("--llm-slow-ms", type=float, default=5000.0)
+    parser.add_argument("--llm-fast-latency-ms", type=float, default=100.0, help="Latency of non-reasoning (fast) models")
+    parser.add_argument("--llm-fast-invalid-rate", type=float, default=0.0, help="Share of fast-model answers missing required fields")
+    parser.add_argument("--ifttt-latency-ms", type=float, default=50.0)
+    parser.add_argument("--tv-latency-ms", type=float, default=5.0, help="Fake webOS TV response latency")
+    parser.add_argument("--app-env", nargs="*", default=[], metavar="KEY=VALUE", help="Extra environment for the local app")
+
+
+def start_fakes(args, workdir):
+    """
+    Start the fakes on background threads.
+
+    Returns:
+        tuple: (environment for an app using them, uvicorn servers)
+    """
+    ports = {name: free_port() for name in ("bridge", "openai", "ifttt", "tv")}
+    servers = [
+        serve_in_thread(bridge_app(args.bridge_latency_ms, args.bridge_429_rate), ports["bridge"]),
+        serve_in_thread(openai_app(
+            args.llm_latency_ms,
+            args.llm_chunk_delay_ms,
+            slow_rate=args.llm_slow_rate,
+            slow_latency_ms=args.llm_slow_ms,
+            fast_latency_ms=args.llm_fast_latency_ms,
+            fast_invalid_rate=args.llm_fast_invalid_rate
+        ), ports["openai"]),
+        serve_in_thread(ifttt_app(args.ifttt_latency_ms), ports["ifttt"]),
+        serve_in_thread(webos_app(args.tv_latency_ms), ports["tv"])
+    ]
+    env = {
+        **os.environ,
+        "HUE_BRIDGE_SCHEME": "http",
+        "HUE_BRIDGE_IP": f"127.0.0.1:{ports['bridge']}",
+        "HUE_USERNAME": "bench",
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{ports['openai']}/v1",
+        "IFTTT_BASE_URL": f"http://127.0.0.1:{ports['ifttt']}",
+        "LG_TV_HOST": f"127.0.0.1:{ports['tv']}",
+        "LG_TV_SECURE": "false",
+        "LG_TV_KEY_PATH": os.path.join(workdir, "lg_tv_keys.json"),
+        "CATALOG_SYNC_ENABLED": "false",
+        "HUE_EVENTSTREAM_ENABLED": "false",
+        # Measure the app rather than the bridge rate limits
+        "HUE_GROUP_RATE_PER_SECOND": "1000",
+        "HUE_LIGHT_RATE_PER_SECOND": "1000",
+        "HUE_SCENE_RATE_PER_SECOND": "1000",
+        "IFTTT_QUEUE_PATH": os.path.join(workdir, "ifttt_queue.db"),
+        "AUTOMATIONS_PATH": os.path.join(workdir, "automations.db"),
+        "SCENE_COMPILER_CACHE": os.path.join(workdir, "compiled_scenes.json")
+    }
+    env.update(dict(item.split("=", 1) for item in args.app_env))
+    return env, servers
+
+
+def spawn_app(env, port):
+    """Start the app under uvicorn in a subprocess (not waiting for it to come up)."""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env
+    )
+
+
+def start_local_stack(args, workdir):
+    """Start the fakes on background threads and the app under uvicorn in a subprocess."""
+    env, servers = start_fakes(args, workdir)
+    port = free_port()
+    app = spawn_app(env, port)
+    target = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{target}/parse/stats", timeout=1)
+            break
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    else:
+        app.terminate()
+        raise RuntimeError("App did not start within 30s")
+    return target, app, servers
+
+
+def compare(results, baseline, threshold):
+    """Print the change against a baseline; returns the endpoints that regressed beyond threshold."""
+    regressions = []
+    print(f"\n{'endpoint':<10} {'rps':>18} {'p95 ms':>20} {'p99 ms':>20}")
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        cells = []
+        for key, higher_is_better in (("rps", True), ("p95_ms", False), ("p99_ms", False)):
+            change = (current[key] - before[key]) / before[key] if before[key] else 0.0
+            cells.append(f"{before[key]:>7} -> {current[key]:<7} {change:+.0%}")
+            if (change < -threshold) if higher_is_better else (change > threshold):
+                regressions.append(f"{name} {key}")
+        print(f"{name:<10} " + " ".join(f"{cell:>20}" for cell in cells))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", help="Base URL of a running app; by default one is started against the fakes")
+    parser.add_argument("--endpoints", nargs="*", default=list(WORKLOADS), choices=list(WORKLOADS))
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--save", help="Write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    add_stack_arguments(parser)
+    args = parser.parse_args()
+
+    app = None
+    servers = []
+    with tempfile.TemporaryDirectory() as workdir:
+        target = args.target
+        if not target:
+            target, app, servers = start_local_stack(args, workdir)
+        try:
+            results = asyncio.run(run_load(target, args.endpoints, args.requests, args.concurrency))
+        finally:
+            if app is not None:
+                app.terminate()
+                app.wait()
+            for server in servers:
+                server.should_exit = True
+
+    report(results, args)
+
+
+def report(results, args):
+    """Print the results table, then save and/or compare against a baseline as requested."""
+    print(f"\n{'endpoint':<10} {'requests':>8} {'errors':>7} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, r in results.items():
+        print(f"{name:<10} {r['requests']:>8} {r['errors']:>7} {r['rps']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8} {r['p99_ms']:>8}")
+
+    run = {
+        "config": {key: value for key, value in vars(args).items() if key not in ("save", "compare")},
+        "results": results
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
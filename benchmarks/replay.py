@@ -0,0 +1,132 @@
+"""
+Replay a request capture (CAPTURE_ENABLED=true) against the app and report p50/p95/p99 per endpoint.
+
+Run from the repo root. Without --target the app is started locally against the fake
+bridge, OpenAI and IFTTT servers from benchmarks/fakes.py:
+    python -m benchmarks.replay data/captures/requests.jsonl [--speed 1] [--save baseline.json]
+    python -m benchmarks.replay data/captures/requests.jsonl --speed 0 --concurrency 16
+    python -m benchmarks.replay data/captures/requests.jsonl --compare baseline.json [--threshold 0.15]
+    python -m benchmarks.replay data/captures/requests.jsonl --target http://127.0.0.1:8000
+
+--speed 1 keeps the captured inter-arrival times, 10 replays ten times faster and 0 sends
+as fast as --concurrency allows. Rotated files (requests.jsonl.1, ...) are read oldest first
+when --rotated is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load import add_stack_arguments, report, start_local_stack, summarize
+
+
+def load_capture(path, rotated=False):
+    """Read capture entries (oldest first), skipping lines that aren't valid JSON."""
+    paths = [path]
+    if rotated:
+        i = 1
+        while os.path.exists(f"{path}.{i}"):
+            paths.insert(0, f"{path}.{i}")
+            i += 1
+    entries = []
+    for p in paths:
+        with open(p) as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+    return [e for e in entries if isinstance(e.get("request"), dict) and not e["request"].get("truncated")]
+
+
+def endpoint_name(path):
+    return path.strip("/").replace("/", "_") or "root"
+
+
+async def replay(target, entries, speed, concurrency):
+    """
+    Send each entry's request at its captured offset (divided by speed) and collect
+    latencies, errors and status mismatches per endpoint.
+    """
+    stats = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    first_ts = entries[0].get("ts", 0) if entries else 0
+
+    async with httpx.AsyncClient(base_url=target, timeout=60, limits=limits) as client:
+        start = time.perf_counter()
+
+        async def send(entry):
+            if speed > 0:
+                delay = (entry.get("ts", first_ts) - first_ts) / speed - (time.perf_counter() - start)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            s = stats.setdefault(endpoint_name(entry["path"]), {"latencies": [], "errors": 0, "mismatches": 0})
+            async with semaphore:
+                sent = time.perf_counter()
+                try:
+                    response = await client.request(entry.get("method", "POST"), entry["path"], json=entry["request"])
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = None
+                s["latencies"].append((time.perf_counter() - sent) * 1000)
+            if status is None or status >= 400:
+                s["errors"] += 1
+            if status != entry.get("status"):
+                s["mismatches"] += 1
+
+        await asyncio.gather(*(send(entry) for entry in entries))
+        elapsed = time.perf_counter() - start
+
+    results = {}
+    for name, s in sorted(stats.items()):
+        results[name] = {**summarize(s["latencies"], s["errors"], elapsed), "status_mismatches": s["mismatches"]}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("capture", help="Capture JSONL file written by the app")
+    parser.add_argument("--rotated", action="store_true", help="Also replay the rotated files, oldest first")
+    parser.add_argument("--target", help="Base URL of a running app; by default one is started against the fakes")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pacing multiplier; 0 sends as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--limit", type=int, help="Replay only the first N entries")
+    parser.add_argument("--save", help="Write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    add_stack_arguments(parser)
+    args = parser.parse_args()
+
+    entries = load_capture(args.capture, args.rotated)[:args.limit]
+    if not entries:
+        parser.error(f"No replayable entries in {args.capture}")
+    print(f"Replaying {len(entries)} requests at {'max' if args.speed <= 0 else f'{args.speed:g}x'} speed")
+
+    app = None
+    servers = []
+    with tempfile.TemporaryDirectory() as workdir:
+        target = args.target
+        if not target:
+            target, app, servers = start_local_stack(args, workdir)
+        try:
+            results = asyncio.run(replay(target, entries, args.speed, args.concurrency))
+        finally:
+            if app is not None:
+                app.terminate()
+                app.wait()
+            for server in servers:
+                server.should_exit = True
+
+    report(results, args)
+    mismatches = sum(r["status_mismatches"] for r in results.values())
+    if mismatches:
+        print(f"\n{mismatches} responses had a different status than captured")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark the SceneIndex against the linear fuzzy_match_scene scan.
+
+Run from the repo root:
+    python -m benchmarks.scene_match [--scenes 5000] [--rounds 200]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+
+from main import SCENE_NAME_TO_ID, fuzzy_match_scene
+from scene_index import SceneIndex
+
+SCENES_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scenes.json")
+
+# Voice-transcribed or misspelled queries and the scene they should resolve to
+LABELED_QUERIES = {
+    "sea sesh": "sesh",
+    "whisky": "whiskey",
+    "savannah sunset": "savanna sunset",
+    "stef nite": "stef night",
+    "rosé sake": "rose sake",
+    "tangerine": "tangeriney",
+    "the vibe": "the vibes",
+    "trick or treating": "trick or treat",
+    "glowing grin": "glowing grins",
+    "amber": "amber bloom",
+    "concentration": "concentrate",
+    "reading": "read",
+    "night light": "nightlight",
+    "fire place": "fireplace",
+    "arctic borealis": "arctic aurora",
+    "ruby": "ruby glow",
+    "blood": "blood moon",
+    "dani": "dani calm"
+}
+
+WORDS = [
+    "amber", "arctic", "aurora", "bloom", "blue", "bright", "calm", "candle", "chill", "cozy", "dawn",
+    "deep", "dusk", "ember", "fire", "forest", "glow", "golden", "honey", "ice", "jazz", "lagoon",
+    "lava", "lounge", "midnight", "mist", "moon", "neon", "night", "ocean", "orchid", "party", "peach",
+    "pine", "rose", "ruby", "sake", "sand", "sesh", "sky", "soft", "spring", "storm", "sun", "sunset",
+    "tropic", "velvet", "violet", "warm", "whiskey", "winter", "zen"
+]
+
+
+def load_catalog(size, seed=7):
+    """Real scene names (main.py and scenes.json) padded with synthetic names up to size."""
+    catalog = dict(SCENE_NAME_TO_ID)
+    try:
+        with open(SCENES_JSON) as f:
+            for scene in json.load(f).get("data", []):
+                catalog.setdefault(scene["metadata"]["name"].lower(), scene["id"])
+    except (OSError, ValueError, KeyError):
+        pass
+    rng = random.Random(seed)
+    while len(catalog) < size:
+        name = " ".join(rng.sample(WORDS, rng.randint(1, 3)))
+        catalog.setdefault(name, f"synthetic-{len(catalog)}")
+    return catalog
+
+
+def time_per_query(fn, queries, rounds):
+    samples = []
+    for _ in range(rounds):
+        for query in queries:
+            start = time.perf_counter()
+            fn(query)
+            samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": round(statistics.mean(samples), 1),
+        "p50_us": round(samples[len(samples) // 2], 1),
+        "p99_us": round(samples[int(len(samples) * 0.99) - 1], 1)
+    }
+
+
+def accuracy(fn, catalog):
+    correct = sum(1 for query, expected in LABELED_QUERIES.items() if fn(query) == catalog[expected])
+    return f"{correct}/{len(LABELED_QUERIES)}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenes", type=int, nargs="*", default=[len(SCENE_NAME_TO_ID), 1000, 5000])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    queries = list(LABELED_QUERIES)
+    for size in args.scenes:
+        catalog = load_catalog(size)
+        start = time.perf_counter()
+        index = SceneIndex(catalog)
+        build_ms = (time.perf_counter() - start) * 1e3
+
+        linear = lambda q: fuzzy_match_scene(q, catalog)
+        indexed = index.best_match
+        print(f"\n=== {len(catalog)} scenes (index build {build_ms:.1f} ms) ===")
+        print(f"fuzzy_match_scene: {time_per_query(linear, queries, args.rounds)} accuracy {accuracy(linear, catalog)}")
+        print(f"SceneIndex:        {time_per_query(indexed, queries, args.rounds)} accuracy {accuracy(indexed, catalog)}")
+
+
+if __name__ == "__main__":
+    main()
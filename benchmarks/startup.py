@@ -0,0 +1,135 @@
+"""
+Measure cold starts: time until the app accepts connections and until the first /execute succeeds.
+
+Run from the repo root. Each run starts a fresh app process against the fakes from
+benchmarks/fakes.py, once with FAST_STARTUP=false (eager imports and warm-up before
+serving) and once with FAST_STARTUP=true. It reports the median over --runs of the time
+from process start to the first accepted connection, the first successful /execute of a
+command the local grammar parses, and then of one that needs the LLM:
+    python -m benchmarks.startup [--runs 5] [--local-text "turn on the tv"] [--llm-text "..."]
+    python -m benchmarks.startup --save startup.json
+    python -m benchmarks.startup --compare startup.json [--threshold 0.15]
+"""
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmarks.load import add_stack_arguments, free_port, spawn_app, start_fakes
+
+MODES = {"eager": "false", "fast": "true"}
+
+
+def cold_start(env, texts, timeout=60.0):
+    """
+    Start one app process, wait for it to accept connections, then POST each text to
+    /execute (in order) until it succeeds.
+
+    Returns:
+        dict: bind_ms and <name>_ms for each text, all measured from process start, and
+              the app's /healthz report
+    """
+    port = free_port()
+    target = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    app = spawn_app(env, port)
+    result = {}
+
+    def elapsed_ms():
+        if time.perf_counter() - start > timeout:
+            raise RuntimeError(f"App did not come up within {timeout:.0f}s")
+        return round((time.perf_counter() - start) * 1000, 1)
+
+    try:
+        with httpx.Client(base_url=target, timeout=30) as client:
+            while True:
+                try:
+                    client.get("/healthz")
+                    break
+                except httpx.TransportError:
+                    elapsed_ms()
+                    time.sleep(0.005)
+            result["bind_ms"] = elapsed_ms()
+            for name, text in texts.items():
+                while client.post("/execute", json={"text": text, "stream": False}).status_code != 200:
+                    elapsed_ms()
+                result[f"{name}_ms"] = elapsed_ms()
+            # Let the background warm-up finish so the report is complete
+            while client.get("/healthz").status_code == 503:
+                elapsed_ms()
+                time.sleep(0.05)
+            result["healthz"] = client.get("/healthz").json()
+    finally:
+        app.terminate()
+        app.wait()
+    return result
+
+
+def summarize(runs):
+    summary = {key: round(statistics.median(run[key] for run in runs), 1) for key in runs[0] if key.endswith("_ms")}
+    phases = {}
+    for run in runs:
+        for phase, ms in run["healthz"]["import_ms"].items():
+            phases.setdefault(phase, []).append(ms)
+    summary["import_ms"] = {phase: round(statistics.median(values), 1) for phase, values in phases.items()}
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Cold starts per mode")
+    parser.add_argument("--local-text", default="turn on the tv", help="Command the local grammar parses")
+    parser.add_argument("--llm-text", default="make the bedroom feel like a beach at dusk", help="Command that needs the LLM")
+    parser.add_argument("--save", help="Write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    add_stack_arguments(parser)
+    args = parser.parse_args()
+
+    texts = {"first_local": args.local_text, "first_llm": args.llm_text}
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        env, servers = start_fakes(args, workdir)
+        try:
+            # One unmeasured start so both modes see compiled bytecode and a warm page cache
+            cold_start({**env, "FAST_STARTUP": "true"}, texts)
+            for mode, value in MODES.items():
+                runs = [cold_start({**env, "FAST_STARTUP": value}, texts) for _ in range(args.runs)]
+                results[mode] = summarize(runs)
+        finally:
+            for server in servers:
+                server.should_exit = True
+
+    print(f"\n{'mode':<8} {'bind ms':>9} {'local /execute ms':>18} {'LLM /execute ms':>16}  import phases (ms)")
+    for mode, r in results.items():
+        phases = ", ".join(f"{phase} {ms}" for phase, ms in r["import_ms"].items())
+        print(f"{mode:<8} {r['bind_ms']:>9} {r['first_local_ms']:>18} {r['first_llm_ms']:>16}  {phases}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")}, "results": results}, f, indent=2)
+        print(f"\nSaved baseline to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f).get("results", {})
+        regressions = []
+        for mode, r in results.items():
+            for key in ("bind_ms", "first_local_ms", "first_llm_ms"):
+                before = baseline.get(mode, {}).get(key)
+                if not before:
+                    continue
+                change = (r[key] - before) / before
+                print(f"{mode:<8} {key:<18} {before:>8} -> {r[key]:<8} {change:+.0%}")
+                if change > args.threshold:
+                    regressions.append(f"{mode} {key}")
+        if regressions:
+            print(f"\nRegressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
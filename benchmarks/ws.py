@@ -0,0 +1,123 @@
+"""
+Compare the /ws command channel with a new HTTP request to /execute per command.
+
+Run from the repo root (needs the websockets package). Without --target the app is
+started locally against the fakes from benchmarks/fakes.py. Each of --clients simulated
+voice clients sends --commands commands one after another, the way a voice front end does.
+"http" opens a new connection for every command, "keepalive" reuses one per client,
+and "ws" keeps one WebSocket per client and counts a command as finished at its "done"
+event:
+    python -m benchmarks.ws [--clients 50] [--commands 20] [--save ws.json] [--compare ws.json]
+"""
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+
+import httpx
+from websockets.asyncio.client import connect
+
+from benchmarks.load import add_stack_arguments, report, start_local_stack, summarize, text_bodies
+
+
+async def http_client(target, bodies, commands, latencies, errors):
+    for _ in range(commands):
+        body = next(bodies)
+        start = time.perf_counter()
+        try:
+            # A fresh client (and connection) per command, as the voice front end does today
+            async with httpx.AsyncClient(base_url=target, timeout=60) as client:
+                response = await client.post("/execute", json=body)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def http_keepalive_client(target, bodies, commands, latencies, errors):
+    async with httpx.AsyncClient(base_url=target, timeout=60) as client:
+        for _ in range(commands):
+            body = next(bodies)
+            start = time.perf_counter()
+            try:
+                response = await client.post("/execute", json=body)
+                if response.status_code >= 400:
+                    errors.append(response.status_code)
+            except httpx.HTTPError as e:
+                errors.append(str(e))
+            latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def ws_client(target, bodies, commands, latencies, errors):
+    url = target.replace("http", "ws", 1) + "/ws"
+    async with connect(url) as ws:
+        for number in range(commands):
+            body = next(bodies)
+            start = time.perf_counter()
+            await ws.send(json.dumps({"id": number, **body}))
+            while True:
+                event = json.loads(await ws.recv())
+                if event["id"] != number:
+                    continue
+                if event["event"] == "error":
+                    errors.append(event.get("error"))
+                    break
+                if event["event"] == "done":
+                    if event["status_code"] >= 400:
+                        errors.append(event["status_code"])
+                    break
+            latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run_mode(client, target, bodies, clients, commands):
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    await asyncio.gather(*(client(target, bodies, commands, latencies, errors) for _ in range(clients)))
+    return summarize(latencies, len(errors), time.perf_counter() - start)
+
+
+async def run_all(target, clients, commands):
+    results = {}
+    # One sequence for both modes, so neither is answered from the other's intent cache entries
+    bodies = iter(text_bodies())
+    for name, client in (("http", http_client), ("keepalive", http_keepalive_client), ("ws", ws_client)):
+        # Untimed warm-up so first-call imports and the fakes' start-up aren't measured
+        await run_mode(client, target, bodies, min(clients, 4), 2)
+        results[name] = await run_mode(client, target, bodies, clients, commands)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", help="Base URL of a running app; by default one is started against the fakes")
+    parser.add_argument("--clients", type=int, default=50, help="Concurrent voice clients")
+    parser.add_argument("--commands", type=int, default=20, help="Commands per client")
+    parser.add_argument("--save", help="Write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change counted as a regression")
+    add_stack_arguments(parser)
+    args = parser.parse_args()
+
+    app = None
+    servers = []
+    with tempfile.TemporaryDirectory() as workdir:
+        target = args.target
+        if not target:
+            target, app, servers = start_local_stack(args, workdir)
+        try:
+            results = asyncio.run(run_all(target, args.clients, args.commands))
+        finally:
+            if app is not None:
+                app.terminate()
+                app.wait()
+            for server in servers:
+                server.should_exit = True
+
+    report(results, args)
+
+
+if __name__ == "__main__":
+    main()
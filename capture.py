@@ -0,0 +1,210 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from metrics import current_timings
+
+DEFAULT_CAPTURE_PATH = os.path.join("data", "captures", "requests.jsonl")
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+DEFAULT_FLUSH_SECONDS = 1.0
+# Entries held in memory between flushes; beyond this new entries are dropped, not awaited
+DEFAULT_MAX_BUFFER = 10000
+# Request/response bodies larger than this are stored truncated
+MAX_BODY_BYTES = 16 * 1024
+
+CAPTURED_PATHS = ("/control", "/parse", "/execute")
+
+# Extra fields for the current request's capture entry (e.g. the parsed intent in /execute)
+_annotations = ContextVar("capture_annotations", default=None)
+
+
+def annotate(**fields):
+    """Add fields to the current request's capture entry; a no-op when it isn't being captured."""
+    entry = _annotations.get()
+    if entry is not None:
+        entry.update(fields)
+
+
+def add_dispatch(action, status_code):
+    """Record an action dispatched while handling the current request (no-op when not captured)."""
+    entry = _annotations.get()
+    if entry is not None:
+        entry.setdefault("dispatched", []).append({"action": action, "status": status_code})
+
+
+def _decode_body(body):
+    if len(body) > MAX_BODY_BYTES:
+        return {"truncated": True, "text": body[:MAX_BODY_BYTES].decode(errors="replace")}
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return {"text": body.decode(errors="replace")}
+
+
+class CaptureWriter:
+    """
+    Buffered JSONL writer with sampling and size-based rotation.
+
+    record() only appends to an in-memory buffer, so it never blocks a request; a
+    background task writes the buffer every flush_seconds on a worker thread. When the file
+    would grow past max_bytes it is rotated to path.1 ... path.<backups>.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_CAPTURE_PATH,
+        max_bytes=DEFAULT_MAX_BYTES,
+        backups=DEFAULT_BACKUPS,
+        sample_rate=1.0,
+        flush_seconds=DEFAULT_FLUSH_SECONDS,
+        max_buffer=DEFAULT_MAX_BUFFER
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.sample_rate = sample_rate
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max_buffer
+        self.recorded = 0
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._buffer = deque()
+        self._task = None
+
+    def sampled(self):
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def record(self, entry):
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append(entry)
+        self.recorded += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        lines = []
+        while self._buffer:
+            lines.append(json.dumps(self._buffer.popleft(), separators=(",", ":"), default=str))
+        data = "\n".join(lines) + "\n"
+        try:
+            await asyncio.to_thread(self._write, data)
+            self.written += len(lines)
+        except OSError as e:
+            self.dropped += len(lines)
+            logging.warning(f"Failed to write request capture: {e}")
+
+    def _write(self, data):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            size = 0
+        if size and size + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a") as f:
+            f.write(data)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.rotations += 1
+
+    async def close(self):
+        """Stop the flush task and write whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "buffered": len(self._buffer),
+            "recorded": self.recorded,
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations
+        }
+
+
+class CaptureMiddleware:
+    """
+    ASGI middleware that records sampled /control, /parse and /execute requests: the request
+    body, response status and body, per-stage timings (when inside MetricsMiddleware) and
+    any fields handlers add with annotate(), such as the parsed intent and parse path.
+    """
+
+    def __init__(self, app, writer, paths=CAPTURED_PATHS):
+        self.app = app
+        self.writer = writer
+        self.paths = paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths or not self.writer.sampled():
+            await self.app(scope, receive, send)
+            return
+        request_body = bytearray()
+        response_body = bytearray()
+        status = [500]
+        annotations = {}
+        token = _annotations.set(annotations)
+        started_at = time.time()
+        start = time.perf_counter()
+
+        async def receive_and_copy():
+            message = await receive()
+            if message["type"] == "http.request" and len(request_body) <= MAX_BODY_BYTES:
+                request_body.extend(message.get("body", b""))
+            return message
+
+        async def send_and_copy(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            elif message["type"] == "http.response.body" and len(response_body) <= MAX_BODY_BYTES:
+                response_body.extend(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_and_copy, send_and_copy)
+        finally:
+            _annotations.reset(token)
+            timings = current_timings() or []
+            self.writer.record({
+                "ts": started_at,
+                "method": scope["method"],
+                "path": scope["path"],
+                "request": _decode_body(bytes(request_body)),
+                "status": status[0],
+                "response": _decode_body(bytes(response_body)),
+                "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                "timings_ms": [[name, round(seconds * 1000, 1)] for name, seconds in timings],
+                **annotations
+            })
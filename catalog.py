@@ -0,0 +1,173 @@
+import hashlib
+import json
+import time
+from types import MappingProxyType
+
+from intent_cache import catalog_version
+from scene_index import SceneIndex
+from scene_recommender import SceneRecommender
+
+# Name prefix of scenes created by the scene compiler; they are kept out of the catalog
+COMPILED_SCENE_PREFIX = "jarvis:"
+
+
+def scene_looks_version(raw_scenes):
+    """
+    Short hash of every scene's light actions.
+
+    Changes when a scene is re-saved with a different look in the Hue app, which the
+    name -> ID catalog version doesn't notice. Other scene fields (e.g. which scene is
+    active) are left out so recalls don't count as changes.
+    """
+    looks = sorted((scene.get("id") or "", scene.get("actions", [])) for scene in raw_scenes)
+    payload = json.dumps(looks, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+def location_key(name):
+    """Turn a Hue room/zone name into a location key ("Living Room" -> "living_room")."""
+    return "_".join(name.lower().split())
+
+
+class Catalog:
+    """
+    Immutable snapshot of the scene and location catalog.
+
+    A new Catalog is built whenever the bridge reports different scenes or rooms and
+    swapped in as a whole, so request handlers can read the current one without
+    locking. Treat instances as read-only; the mappings are exposed as read-only proxies.
+
+    Attributes:
+        scenes: Scene name (lowercase) -> scene ID
+        locations: Location key -> grouped_light ID
+        version: Short hash of scenes and locations (used as the intent cache version)
+        looks_version: Short hash of the raw scenes' light actions (see scene_looks_version)
+        scene_index: SceneIndex over scenes for fuzzy lookup
+        recommender: SceneRecommender over the raw scenes' looks, for mood/colour requests
+        source: Where the catalog came from ("builtin", "snapshot" or "bridge")
+    """
+
+    def __init__(self, scenes, locations, scene_locations=None, source="builtin", raw_scenes=(), raw_rooms=()):
+        self.scenes = MappingProxyType(dict(scenes))
+        self.locations = MappingProxyType(dict(locations))
+        self.version = catalog_version(self.scenes, self.locations)
+        self.scene_index = SceneIndex(self.scenes)
+        self.source = source
+        self.loaded_at = time.time()
+        # (scene name, location) -> scene ID, for names that exist in several rooms
+        self._scene_locations = MappingProxyType(dict(scene_locations or {}))
+        # Raw bridge resources, kept for persisting snapshots
+        self.raw_scenes = tuple(raw_scenes)
+        self.raw_rooms = tuple(raw_rooms)
+        self.looks_version = scene_looks_version(self.raw_scenes)
+        names = {scene_id: name for name, scene_id in self.scenes.items()}
+        names.update({scene_id: name for (name, _), scene_id in self._scene_locations.items()})
+        scene_rooms = {scene_id: location for (_, location), scene_id in self._scene_locations.items()}
+        self.recommender = SceneRecommender(self.raw_scenes, names, scene_rooms)
+
+    def scene_id(self, name, location=None):
+        """Return the ID for an exact scene name, preferring the scene in location if given."""
+        name = name.lower()
+        if location:
+            scene_id = self._scene_locations.get((name, location_key(location)))
+            if scene_id:
+                return scene_id
+        return self.scenes.get(name)
+
+    def group_id(self, location):
+        return self.locations.get(location_key(location))
+
+    def summary(self):
+        return {
+            "version": self.version,
+            "looks_version": self.looks_version,
+            "source": self.source,
+            "scenes": len(self.scenes),
+            "locations": sorted(self.locations),
+            "loaded_at": self.loaded_at
+        }
+
+
+def build_catalog(raw_scenes, raw_rooms=(), fallback_locations=None, source="bridge", aliases=None):
+    """
+    Build a Catalog from raw CLIP v2 scene and room/zone resources.
+
+    Args:
+        raw_scenes: "data" list from /clip/v2/resource/scene (the scenes.json format)
+        raw_rooms: "data" lists from /clip/v2/resource/room and /zone
+        fallback_locations: Locations to use when no rooms are known (e.g. LOCATION_TO_GROUP_ID)
+        source: Label for where the data came from
+        aliases: Curated scene name -> scene ID (e.g. SCENE_NAME_TO_ID). These win over the
+            bridge's names for scenes that still exist, so "stefan" keeps pointing at the
+            scene it was chosen for even if another room has a scene called Stefan
+    """
+    room_locations = {}
+    locations = {}
+    for room in raw_rooms:
+        name = room.get("metadata", {}).get("name")
+        grouped_light = next(
+            (s.get("rid") for s in room.get("services", []) if s.get("rtype") == "grouped_light"),
+            None
+        )
+        if not name or not grouped_light:
+            continue
+        key = location_key(name)
+        room_locations[room.get("id")] = key
+        locations.setdefault(key, grouped_light)
+    if not locations and fallback_locations:
+        locations = dict(fallback_locations)
+
+    scenes = {}
+    scene_locations = {}
+    scene_rooms = {}
+    for scene in raw_scenes:
+        name = scene.get("metadata", {}).get("name", "").lower()
+        scene_id = scene.get("id")
+        if not name or not scene_id or name.startswith(COMPILED_SCENE_PREFIX):
+            continue
+        scenes.setdefault(name, scene_id)
+        location = room_locations.get(scene.get("group", {}).get("rid"))
+        scene_rooms[scene_id] = location
+        if location:
+            scene_locations.setdefault((name, location), scene_id)
+
+    for name, scene_id in (aliases or {}).items():
+        if scene_id not in scene_rooms:
+            continue
+        name = name.lower()
+        scenes[name] = scene_id
+        if scene_rooms[scene_id]:
+            scene_locations[(name, scene_rooms[scene_id])] = scene_id
+
+    return Catalog(
+        scenes,
+        locations,
+        scene_locations=scene_locations,
+        source=source,
+        raw_scenes=raw_scenes,
+        raw_rooms=raw_rooms
+    )
+
+
+def diff_catalogs(old, new):
+    """
+    Return the scene and location names added, removed or re-pointed between two catalogs,
+    and the names of scenes whose light actions changed.
+    """
+    diff = {}
+    for field in ("scenes", "locations"):
+        before, after = getattr(old, field), getattr(new, field)
+        diff[field] = {
+            "added": sorted(set(after) - set(before)),
+            "removed": sorted(set(before) - set(after)),
+            "changed": sorted(k for k in set(before) & set(after) if before[k] != after[k])
+        }
+    before = {scene.get("id"): scene.get("actions", []) for scene in old.raw_scenes}
+    diff["looks"] = {
+        "changed": sorted(
+            scene.get("metadata", {}).get("name", "").lower()
+            for scene in new.raw_scenes
+            if scene.get("id") in before and before[scene.get("id")] != scene.get("actions", [])
+        )
+    }
+    return diff
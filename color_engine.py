@@ -0,0 +1,344 @@
+import os
+from functools import lru_cache
+
+# NumPy is imported on the first batch conversion rather than at startup; stays None
+# (pure-Python fallback below) when it isn't installed
+np = None
+_numpy_checked = False
+
+# Colour gamuts of Hue lamps as (red, green, blue) corners in CIE xy.
+# A: LivingColors/older lamps, B: first generation bulbs, C: current bulbs and strips.
+GAMUTS = {
+    "A": ((0.704, 0.296), (0.2151, 0.7106), (0.138, 0.08)),
+    "B": ((0.675, 0.322), (0.409, 0.518), (0.167, 0.04)),
+    "C": ((0.6915, 0.3083), (0.17, 0.7), (0.1532, 0.0475))
+}
+DEFAULT_GAMUT = os.getenv("HUE_GAMUT", "C").upper()
+
+# sRGB (D65) linear RGB -> XYZ
+_RGB_TO_XYZ = (
+    (0.4124564, 0.3575761, 0.1804375),
+    (0.2126729, 0.7151522, 0.0721750),
+    (0.0193339, 0.1191920, 0.9503041)
+)
+
+# Define base colors (Hue scale 0-65535, Sat 0-254)
+BASE_COLORS = {
+    "red": (0, 254),
+    "warm red": (2000, 230), # Shifted slightly towards orange
+    "orange": (5461, 254),
+    "yellow": (10922, 254),
+    "lime": (16384, 254),
+    "green": (21845, 254),
+    "spring green": (27306, 254),
+    "cyan": (32768, 254),
+    "sky blue": (38000, 200),
+    "blue": (43690, 254),
+    "purple": (49151, 254),
+    "magenta": (52000, 254),
+    "pink": (54613, 254),
+    "light pink": (56000, 180),
+    "white": (0, 0), # Saturation 0 means white regardless of hue
+    "warm white": (7000, 100), # Example: Use low sat, adjust hue towards orange/yellow
+    "cool white": (38000, 50) # Example: Use low sat, adjust hue towards blue
+}
+
+# Softer variants used for calming/relaxing moods, keyed by the colour word they replace
+CALM_MOOD_COLORS = {
+    "red": (3000, 180), # Shift hue towards orange, reduce saturation
+    "orange": (5461, 200), # Warm orange for napping
+    "blue": (40000, 160), # Shift hue slightly towards cyan, lower saturation
+    "green": (24000, 170) # Less vibrant green, lower saturation
+}
+CALM_MOOD_DEFAULT = (5461, 200) # Default warm orange for nap/chill if no color specified
+CALM_MOODS = ("calming", "relaxing", "sleepy", "chill", "nap", "napping")
+
+
+def map_color_description_to_hue_sat(color_desc, mood_desc=None):
+    if not color_desc:
+        return BASE_COLORS["white"] # Default to white if no color specified
+
+    color_desc = color_desc.lower()
+    mood_desc = mood_desc.lower() if mood_desc else None
+
+    # --- Handle specific mood/color combinations first ---
+    if mood_desc in CALM_MOODS:
+        for word, hue_sat in CALM_MOOD_COLORS.items():
+            if word in color_desc:
+                return hue_sat
+        return CALM_MOOD_DEFAULT
+
+    # --- Fallback to base color lookup and generic mood adjustment ---
+    hue, sat = BASE_COLORS.get(color_desc, BASE_COLORS["warm white"])
+
+    # Generic mood adjustments (if no specific combination was matched)
+    if mood_desc:
+        if mood_desc in ["calming", "relaxing", "sleepy", "soft", "chill", "nap", "napping"]:
+            sat = 254  # Lock saturation to 100%
+        elif mood_desc in ["energizing", "vibrant", "bright"]:
+            sat = 254  # Lock saturation to 100%
+        # Add more generic mood adjustments if needed
+
+    return hue, sat
+
+
+def map_brightness_description_to_bri(brightness_desc):
+    # Brightness map (0-254 scale)
+    brightness_map = {
+        "off": 0, # Technically handled by 'on:false', but good to have
+        "minimum": 1,
+        "very dim": 25,
+        "dim": 60, # Adjusted from 50
+        "sleepy": 40, # Added
+        "soft": 100, # Added
+        "normal": 150,
+        "bright": 220, # Adjusted from 254
+        "full": 254,
+        "max": 254,
+        "maximum": 254
+    }
+    if not brightness_desc:
+        return brightness_map["normal"] # Default brightness
+
+    return brightness_map.get(brightness_desc.lower(), brightness_map["normal"])
+
+
+def light_gamut(light):
+    """
+    Return the gamut triangle of a CLIP v2 light resource, falling back to DEFAULT_GAMUT.
+    """
+    color = (light or {}).get("color") or {}
+    gamut = color.get("gamut")
+    if gamut and all(corner in gamut for corner in ("red", "green", "blue")):
+        return tuple((gamut[c]["x"], gamut[c]["y"]) for c in ("red", "green", "blue"))
+    return GAMUTS.get(color.get("gamut_type"), GAMUTS[DEFAULT_GAMUT])
+
+
+def _resolve_gamut(gamut):
+    if gamut is None:
+        return GAMUTS[DEFAULT_GAMUT]
+    if isinstance(gamut, str):
+        return GAMUTS[gamut.upper()]
+    return gamut
+
+
+def _hsb_to_rgb(hue, saturation, brightness):
+    h = (float(hue) % 65536) / 65536.0 * 6.0
+    s = float(saturation) / 254.0
+    v = float(brightness) / 254.0
+    if s == 0:
+        return v, v, v
+    i = int(h)
+    f = h - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    return ((v, t, p), (q, v, p), (p, v, t), (p, q, v), (t, p, v), (v, p, q))[i % 6]
+
+
+def _linearize(c):
+    # Inverse sRGB gamma
+    return pow((c + 0.055) / 1.055, 2.4) if c > 0.04045 else c / 12.92
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def _closest_on_segment(p, a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    t = ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / (dx * dx + dy * dy)
+    t = min(1.0, max(0.0, t))
+    return a[0] + t * dx, a[1] + t * dy
+
+
+def clamp_to_gamut(x, y, gamut=None):
+    """
+    Move an xy point that lies outside the lamp's gamut triangle to the nearest point on it.
+
+    The bridge clips out-of-gamut colours itself, but not necessarily to the closest
+    reproducible colour; clamping first keeps the hue the user asked for.
+    """
+    red, green, blue = _resolve_gamut(gamut)
+    p = (x, y)
+    d1, d2, d3 = _cross(red, green, p), _cross(green, blue, p), _cross(blue, red, p)
+    if (d1 >= 0 and d2 >= 0 and d3 >= 0) or (d1 <= 0 and d2 <= 0 and d3 <= 0):
+        return x, y
+    candidates = [_closest_on_segment(p, a, b) for a, b in ((red, green), (green, blue), (blue, red))]
+    return min(candidates, key=lambda c: (c[0] - x) ** 2 + (c[1] - y) ** 2)
+
+
+def rgb_to_xy(r, g, b, gamut=None):
+    """
+    Convert sRGB (0-1 floats) to CIE xy clamped to the gamut.
+
+    Returns:
+        tuple: (x, y) rounded to 4 decimals
+    """
+    r, g, b = _linearize(r), _linearize(g), _linearize(b)
+    X, Y, Z = (row[0] * r + row[1] * g + row[2] * b for row in _RGB_TO_XYZ)
+    total = X + Y + Z
+    if total == 0:
+        # Black has no chromaticity; use the white point so the lamp doesn't jump colour
+        x, y = 0.3127, 0.3290
+    else:
+        x, y = X / total, Y / total
+    x, y = clamp_to_gamut(x, y, gamut)
+    return round(x, 4), round(y, 4)
+
+
+def hsb_to_xy(hue, saturation, brightness, gamut=None):
+    """
+    Convert Philips Hue HSB values to CIE xy color space.
+
+    Args:
+        hue: 0-65535 (Hue API range)
+        saturation: 0-254 (Hue API range)
+        brightness: 0-254 (Hue API range)
+        gamut: Gamut letter ("A", "B", "C") or corner triangle; defaults to DEFAULT_GAMUT
+
+    Returns:
+        tuple: (x, y) coordinates in CIE color space
+    """
+    return rgb_to_xy(*_hsb_to_rgb(hue, saturation, brightness), gamut=gamut)
+
+
+def mirek_to_xy(mirek):
+    """
+    Approximate xy of a colour temperature on the Planckian locus (Kim et al. cubic fit).
+
+    Args:
+        mirek: Colour temperature in mirek (Hue lamps take 153-500, i.e. 6500K-2000K)
+
+    Returns:
+        tuple: (x, y) coordinates in CIE color space
+    """
+    kelvin = min(25000.0, max(1667.0, 1e6 / mirek))
+    if kelvin <= 4000:
+        x = -0.2661239e9 / kelvin ** 3 - 0.2343589e6 / kelvin ** 2 + 0.8776956e3 / kelvin + 0.179910
+    else:
+        x = -3.0258469e9 / kelvin ** 3 + 2.1070379e6 / kelvin ** 2 + 0.2226347e3 / kelvin + 0.240390
+    if kelvin <= 2222:
+        y = -1.1063814 * x ** 3 - 1.34811020 * x ** 2 + 2.18555832 * x - 0.20219683
+    elif kelvin <= 4000:
+        y = -0.9549476 * x ** 3 - 1.37418593 * x ** 2 + 2.09137015 * x - 0.16748867
+    else:
+        y = 3.0817580 * x ** 3 - 5.87338670 * x ** 2 + 3.75112997 * x - 0.37001483
+    return round(x, 4), round(y, 4)
+
+
+@lru_cache(maxsize=4096)
+def cached_hsb_to_xy(hue, saturation, brightness=254, gamut=None):
+    """hsb_to_xy memoized per (hue, sat, bri, gamut); gamut must be a letter or a tuple."""
+    return hsb_to_xy(hue, saturation, brightness, gamut)
+
+
+def _numpy():
+    global np, _numpy_checked
+    if not _numpy_checked:
+        _numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+    return np
+
+
+def _clamp_batch_numpy(x, y, gamut):
+    corners = np.array(gamut)
+    p = np.stack([x, y], axis=1)
+    red, green, blue = corners
+    def cross(o, a):
+        return (a[0] - o[0]) * (p[:, 1] - o[1]) - (a[1] - o[1]) * (p[:, 0] - o[0])
+    d1, d2, d3 = cross(red, green), cross(green, blue), cross(blue, red)
+    inside = ((d1 >= 0) & (d2 >= 0) & (d3 >= 0)) | ((d1 <= 0) & (d2 <= 0) & (d3 <= 0))
+    best = p.copy()
+    best_dist = np.full(len(p), np.inf)
+    for a, b in ((red, green), (green, blue), (blue, red)):
+        edge = b - a
+        t = np.clip(((p - a) @ edge) / (edge @ edge), 0.0, 1.0)
+        closest = a + t[:, None] * edge
+        dist = ((closest - p) ** 2).sum(axis=1)
+        closer = dist < best_dist
+        best[closer] = closest[closer]
+        best_dist[closer] = dist[closer]
+    return np.where(inside[:, None], p, best)
+
+
+def _rgb_batch_numpy(rgb, gamut):
+    rgb = np.asarray(rgb, dtype=float).reshape(-1, 3)
+    linear = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = linear @ np.array(_RGB_TO_XYZ).T
+    total = xyz.sum(axis=1)
+    safe = np.where(total == 0, 1.0, total)
+    x = np.where(total == 0, 0.3127, xyz[:, 0] / safe)
+    y = np.where(total == 0, 0.3290, xyz[:, 1] / safe)
+    return np.round(_clamp_batch_numpy(x, y, gamut), 4)
+
+
+def _hsb_batch_numpy(hsb, gamut):
+    hsb = np.asarray(hsb, dtype=float).reshape(-1, 3)
+    h = (hsb[:, 0] % 65536) / 65536.0 * 6.0
+    s = hsb[:, 1] / 254.0
+    v = hsb[:, 2] / 254.0
+    i = np.floor(h).astype(int) % 6
+    f = h - np.floor(h)
+    p, q, t = v * (1 - s), v * (1 - s * f), v * (1 - s * (1 - f))
+    sectors = [i == n for n in range(6)]
+    r = np.select(sectors, [v, q, p, p, t, v])
+    g = np.select(sectors, [t, v, v, q, p, p])
+    b = np.select(sectors, [p, p, t, v, v, q])
+    return _rgb_batch_numpy(np.stack([r, g, b], axis=1), gamut)
+
+
+def hsb_batch_to_xy(hsb, gamut=None):
+    """
+    Convert many (hue, sat, bri) triples at once.
+
+    Uses NumPy when it is installed and a loop over hsb_to_xy otherwise.
+
+    Returns:
+        list: (x, y) tuples in input order
+    """
+    gamut = _resolve_gamut(gamut)
+    if not len(hsb) or _numpy() is None:
+        return [hsb_to_xy(h, s, b, gamut) for h, s, b in hsb]
+    return [tuple(xy) for xy in _hsb_batch_numpy(hsb, gamut).tolist()]
+
+
+def rgb_batch_to_xy(rgb, gamut=None):
+    """
+    Convert many sRGB (0-1 floats) triples at once. See hsb_batch_to_xy.
+    """
+    gamut = _resolve_gamut(gamut)
+    if not len(rgb) or _numpy() is None:
+        return [rgb_to_xy(r, g, b, gamut) for r, g, b in rgb]
+    return [tuple(xy) for xy in _rgb_batch_numpy(rgb, gamut).tolist()]
+
+
+def _precompute():
+    named = dict(BASE_COLORS)
+    named.update({f"calm {word}": hue_sat for word, hue_sat in CALM_MOOD_COLORS.items()})
+    named["calm"] = CALM_MOOD_DEFAULT
+    names = list(named)
+    hsb = [(hue, sat, 254) for hue, sat in named.values()]
+    # A few dozen colours: the plain loop is quick and keeps NumPy off the import path
+    return {letter: {name: hsb_to_xy(*values, corners) for name, values in zip(names, hsb)} for letter, corners in GAMUTS.items()}
+
+
+# xy of every named colour and calm-mood variant, per gamut letter
+NAMED_COLOR_XY = _precompute()
+
+
+def named_color_xy(name, gamut=None):
+    """
+    Return the precomputed xy for a named colour ("blue", "calm blue", ...), or None.
+    """
+    letter = gamut.upper() if isinstance(gamut, str) else DEFAULT_GAMUT
+    return NAMED_COLOR_XY.get(letter, NAMED_COLOR_XY[DEFAULT_GAMUT]).get(name.lower())
+
+
+def names_batch_to_xy(names, gamut=None):
+    """Look up many named colours at once; unknown names map to None."""
+    return [named_color_xy(name, gamut) for name in names]
@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from urllib.parse import parse_qs
+
+from metrics import HOME_REQUEST_SECONDS, outcome_for_status
+
+DEFAULT_HOME_ID = "default"
+# Requests one home may have running at once, and waiting for a slot before it gets 429s
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_WAITING = 64
+HOME_HEADER = b"x-home-id"
+
+# Home IDs name per-home data directories, so keep them to safe path characters
+_HOME_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+# The Home serving the current request (set by HomeMiddleware); unset outside requests
+current_home = ContextVar("current_home", default=None)
+
+
+class HomeBusy(Exception):
+    """The home already has max_concurrency requests running and max_waiting queued."""
+
+
+class Home:
+    """
+    One household served by the process.
+
+    Holds everything that used to be process-global: the bridge client (with its own
+    connection pool), catalog sync, state mirror and event stream, bridge command
+    scheduler, scene compiler, intent cache, IFTTT key and LG TVs. The app builds the
+    components (main.build_home); Home starts and stops them and bounds how many of the
+    home's requests run at once, so one busy household can't starve the others.
+
+    Args:
+        home_id: Routing key (X-Home-Id header or ?home=)
+        ifttt_key: IFTTT webhook key (None disables IFTTT for the home)
+        tvs: {location: WebOSClient}
+        sync_catalog: Run the background catalog sync
+        eventstream: Mirror bridge state from the event stream
+        max_concurrency: Requests running at once
+        max_waiting: Requests queued for a slot before further ones are rejected
+    """
+
+    def __init__(
+        self,
+        home_id,
+        hue_client,
+        catalog_sync,
+        state_mirror,
+        hue_events,
+        hue_scheduler,
+        scene_compiler,
+        intent_cache,
+        ifttt_key=None,
+        tvs=None,
+        sync_catalog=False,
+        eventstream=False,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        max_waiting=DEFAULT_MAX_WAITING
+    ):
+        self.id = home_id
+        self.hue_client = hue_client
+        self.catalog_sync = catalog_sync
+        self.state_mirror = state_mirror
+        self.hue_events = hue_events
+        self.hue_scheduler = hue_scheduler
+        self.scene_compiler = scene_compiler
+        self.intent_cache = intent_cache
+        self.ifttt_key = ifttt_key
+        self.tvs = tvs or {}
+        self.sync_catalog = sync_catalog
+        self.eventstream = eventstream
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.latencies = deque(maxlen=500)
+        self._slots = None
+
+    @property
+    def catalog(self):
+        return self.catalog_sync.current
+
+    def start(self):
+        if self.hue_client.bridge_ip:
+            self.hue_client.open()
+        if self.sync_catalog:
+            self.catalog_sync.start()
+        if self.eventstream:
+            self.hue_events.start()
+        for tv in self.tvs.values():
+            tv.start()
+
+    async def stop(self):
+        for tv in self.tvs.values():
+            await tv.stop()
+        await self.hue_events.stop()
+        await self.catalog_sync.stop()
+        await self.hue_client.aclose()
+
+    @asynccontextmanager
+    async def admit(self):
+        """
+        Hold one of the home's request slots for the duration of the block.
+
+        Raises:
+            HomeBusy: If every slot is taken and max_waiting requests are already queued
+        """
+        if self._slots is None:
+            # Created lazily so it binds to the running loop
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        if self._slots.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise HomeBusy(f"Too many requests for home {self.id}")
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def record(self, status_code, seconds):
+        self.requests += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.latencies.append(seconds)
+        HOME_REQUEST_SECONDS.observe(seconds, self.id, outcome_for_status(status_code))
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def ms(fraction):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 1)
+
+        catalog = self.catalog
+        return {
+            "bridge": self.hue_client.bridge_ip,
+            "catalog": {"version": catalog.version, "source": catalog.source, "scenes": len(catalog.scenes), "locations": len(catalog.locations)},
+            "ifttt": self.ifttt_key is not None,
+            "tvs": sorted(self.tvs),
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "latency_ms": {"p50": ms(0.5), "p99": ms(0.99)}
+        }
+
+
+class HomeRegistry:
+    """
+    The homes one process serves, by ID.
+
+    A plain dict, so routing a request is one lookup however many homes there are.
+    Requests that name no home go to default_id.
+    """
+
+    def __init__(self, default_id=DEFAULT_HOME_ID):
+        self.default_id = default_id
+        self.homes = {}
+
+    def add(self, home):
+        self.homes[home.id] = home
+        return home
+
+    def get(self, home_id=None):
+        """The home with home_id (the default home if None), or None if there is no such home."""
+        return self.homes.get(home_id or self.default_id)
+
+    @property
+    def default(self):
+        return self.homes.get(self.default_id)
+
+    def __iter__(self):
+        return iter(self.homes.values())
+
+    def __len__(self):
+        return len(self.homes)
+
+    def start(self):
+        for home in self.homes.values():
+            home.start()
+
+    async def stop(self):
+        await asyncio.gather(*(home.stop() for home in self.homes.values()))
+
+    def stats(self):
+        return {home_id: home.stats() for home_id, home in self.homes.items()}
+
+
+def _expand(value):
+    if isinstance(value, str):
+        return os.path.expandvars(value)
+    if isinstance(value, dict):
+        return {key: _expand(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_expand(item) for item in value]
+    return value
+
+
+def load_homes_config(path):
+    """
+    Read the home registry config.
+
+    The file is JSON: {"homes": {"<home id>": {"bridge_ip": ..., "username": ...,
+    "ifttt_key": ..., ...}}}. "${VAR}" in a value is replaced with the environment
+    variable, so credentials can stay out of the file.
+
+    Returns:
+        dict: home id -> config dict
+
+    Raises:
+        ValueError: If the file is malformed, a home ID isn't [A-Za-z0-9_-] or a home has no bridge_ip
+    """
+    with open(path) as f:
+        data = json.load(f)
+    homes = data.get("homes") if isinstance(data, dict) else None
+    if not isinstance(homes, dict):
+        raise ValueError(f"{path}: expected {{\"homes\": {{\"<home id>\": {{...}}}}}}")
+    configs = {}
+    for home_id, config in homes.items():
+        if not _HOME_ID.match(home_id):
+            raise ValueError(f"{path}: invalid home id {home_id!r}")
+        if not isinstance(config, dict) or not config.get("bridge_ip"):
+            raise ValueError(f"{path}: home {home_id!r} needs a bridge_ip")
+        configs[home_id] = _expand(config)
+    logging.info(f"Loaded {len(configs)} homes from {path}")
+    return configs
+
+
+def home_id_for(scope):
+    """The home ID a request names in its X-Home-Id header or ?home= parameter, or None."""
+    for name, value in scope.get("headers") or ():
+        if name == HOME_HEADER:
+            return value.decode().strip() or None
+    query = scope.get("query_string") or b""
+    if b"home=" in query:
+        values = parse_qs(query.decode()).get("home")
+        if values:
+            return values[0]
+    return None
+
+
+async def _send_json(send, status, body):
+    content = json.dumps(body).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(content)).encode())]
+    })
+    await send({"type": "http.response.body", "body": content})
+
+
+class HomeMiddleware:
+    """
+    ASGI middleware that routes each request to its home (see home_id_for).
+
+    Sets current_home for the request (or the WebSocket connection) and runs HTTP
+    requests inside the home's admit() slot, recording per-home latency. Unknown homes
+    get a 404, and a home that is over its limits gets a 429, without touching the app.
+    """
+
+    def __init__(self, app, registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        home_id = home_id_for(scope)
+        home = self.registry.get(home_id)
+        if home is None:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 4404, "reason": f"Unknown home: {home_id}"})
+            else:
+                await _send_json(send, 404, {"error": f"Unknown home: {home_id}"})
+            return
+        token = current_home.set(home)
+        try:
+            if scope["type"] == "websocket":
+                # Commands on the connection take a slot each (see main.run_ws_command)
+                await self.app(scope, receive, send)
+                return
+            start = time.perf_counter()
+            status = [500]
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    status[0] = message["status"]
+                await send(message)
+
+            try:
+                async with home.admit():
+                    await self.app(scope, receive, send_with_status)
+            except HomeBusy as e:
+                status[0] = 429
+                await _send_json(send, 429, {"error": str(e)})
+            finally:
+                home.record(status[0], time.perf_counter() - start)
+        finally:
+            current_home.reset(token)
@@ -0,0 +1,118 @@
+import httpx
+
+# Per-call timeout for bridge requests (seconds)
+DEFAULT_TIMEOUT = 5.0
+
+# The bridge only accepts a handful of concurrent connections
+DEFAULT_MAX_CONNECTIONS = 6
+DEFAULT_MAX_KEEPALIVE = 6
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+
+class HueClient:
+    """
+    Shared async client for the Hue bridge CLIP v2 API.
+
+    Holds one pooled keep-alive connection set to the bridge so requests don't pay a
+    fresh TLS handshake each time and never block the event loop. Create one instance
+    for the app lifecycle and close it on shutdown with aclose(). The underlying
+    connection pool is opened lazily on first use, so the client also works outside
+    the FastAPI app (e.g. scene_sync.py or the CLI simulation).
+    """
+
+    def __init__(
+        self,
+        bridge_ip,
+        application_key,
+        timeout=DEFAULT_TIMEOUT,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        max_keepalive=DEFAULT_MAX_KEEPALIVE,
+        transport=None,
+        scheme="https"
+    ):
+        self.bridge_ip = bridge_ip
+        self.scheme = scheme
+        self.application_key = application_key
+        self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY
+        )
+        self.transport = transport
+        self._client = None
+
+    @property
+    def base_url(self):
+        return f"{self.scheme}://{self.bridge_ip}"
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "hue-application-key": self.application_key or "",
+                    "Content-Type": "application/json"
+                },
+                verify=False,  # The bridge uses a self-signed certificate
+                timeout=self.timeout,
+                limits=self.limits,
+                transport=self.transport
+            )
+        return self._client
+
+    def open(self):
+        """Open the connection pool ahead of the first request (called on app startup)."""
+        self._get_client()
+
+    async def request(self, method, path, json=None, timeout=None):
+        """
+        Send a request to the bridge and return the httpx.Response.
+
+        Raises:
+            httpx.HTTPError: On connection errors, timeouts and 4XX/5XX responses
+        """
+        kwargs = {"json": json}
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        response = await self._get_client().request(method, path, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def stream(self, method, path, headers=None, read_timeout=None):
+        """
+        Open a streaming request (e.g. the /eventstream/clip/v2 event stream).
+        Use as `async with hue.stream("GET", path) as response:`; no read timeout by default.
+        """
+        return self._get_client().stream(
+            method,
+            path,
+            headers=headers,
+            timeout=httpx.Timeout(self.timeout, read=read_timeout)
+        )
+
+    async def get_resource(self, rtype, rid=None, timeout=None):
+        """Return the "data" list for /clip/v2/resource/{rtype}[/{rid}]."""
+        path = f"/clip/v2/resource/{rtype}" + (f"/{rid}" if rid else "")
+        response = await self.request("GET", path, timeout=timeout)
+        return response.json().get("data", [])
+
+    async def put_resource(self, rtype, rid, payload, timeout=None):
+        """PUT payload to /clip/v2/resource/{rtype}/{rid} and return the decoded bridge response."""
+        response = await self.request("PUT", f"/clip/v2/resource/{rtype}/{rid}", json=payload, timeout=timeout)
+        return response.json()
+
+    async def post_resource(self, rtype, payload, timeout=None):
+        """POST payload to /clip/v2/resource/{rtype} to create a resource; returns the decoded response."""
+        response = await self.request("POST", f"/clip/v2/resource/{rtype}", json=payload, timeout=timeout)
+        return response.json()
+
+    async def delete_resource(self, rtype, rid, timeout=None):
+        """DELETE /clip/v2/resource/{rtype}/{rid} and return the decoded bridge response."""
+        response = await self.request("DELETE", f"/clip/v2/resource/{rtype}/{rid}", timeout=timeout)
+        return response.json()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from collections import deque
+
+# Bridge rate limits per resource type: (commands per second, burst)
+# Hue recommends at most ~1 grouped_light and ~10 light commands per second.
+DEFAULT_RATES = {
+    "grouped_light": (1.0, 2),
+    "light": (10.0, 10),
+    "scene": (1.0, 2)
+}
+
+
+class TokenBucket:
+    """Token bucket limiter; acquire() waits until a token is available (FIFO among waiters)."""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.waited = 0.0
+        self._lock = None
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        if self._lock is None:
+            # Created lazily so it binds to the running loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            self._refill()
+            while self.tokens < 1:
+                delay = (1 - self.tokens) / self.rate
+                self.waited += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self.tokens -= 1
+
+
+class _Pending:
+    __slots__ = ("rtype", "rid", "payload", "coalesce", "futures", "queued_at")
+
+    def __init__(self, rtype, rid, payload, coalesce, future):
+        self.rtype = rtype
+        self.rid = rid
+        self.payload = payload
+        self.coalesce = coalesce
+        self.futures = [future]
+        self.queued_at = time.monotonic()
+
+
+class HueScheduler:
+    """
+    Orders, coalesces and rate-limits commands between the intent handlers and the bridge.
+
+    Each target (a group_id) has its own FIFO queue drained by one worker, so commands
+    for a room are sent strictly in order while different rooms proceed in parallel.
+    A command that is still waiting in the queue is merged with a newer command for the
+    same resource (last write wins per field), and both callers receive the result of
+    the single PUT that is sent. Every send takes a token from the bucket for its
+    resource type.
+
+    Args:
+        send: async callable (rtype, rid, payload) -> result, performing the actual PUT
+        rates: {rtype: (per second, burst)} overriding DEFAULT_RATES
+    """
+
+    def __init__(self, send, rates=None):
+        self.send = send
+        self.buckets = {rtype: TokenBucket(rate, burst) for rtype, (rate, burst) in {**DEFAULT_RATES, **(rates or {})}.items()}
+        self.queues = {}
+        self.workers = {}
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+    async def submit(self, target, rtype, rid, payload, coalesce=True):
+        """
+        Queue a PUT of payload to rtype/rid behind earlier commands for target and wait for it.
+
+        Returns:
+            The result of send() for the PUT that carried this payload
+        """
+        future = asyncio.get_running_loop().create_future()
+        queue = self.queues.setdefault(target, deque())
+        self.submitted += 1
+        tail = queue[-1] if queue else None
+        if coalesce and tail and tail.coalesce and tail.rtype == rtype and tail.rid == rid:
+            tail.payload = {**tail.payload, **payload}
+            if "dynamics" not in payload:
+                # The newer command is immediate; don't let it inherit the older one's fade
+                tail.payload.pop("dynamics", None)
+            tail.futures.append(future)
+            self.coalesced += 1
+        else:
+            queue.append(_Pending(rtype, rid, payload, coalesce, future))
+            self.max_depth = max(self.max_depth, len(queue))
+        if target not in self.workers:
+            self.workers[target] = asyncio.create_task(self._drain(target))
+        return await future
+
+    async def throttle(self, rtype):
+        """
+        Wait for a token from rtype's bucket, for bridge calls made outside the queues
+        (e.g. the scene compiler creating and deleting scenes).
+        """
+        bucket = self.buckets.get(rtype)
+        if bucket:
+            await bucket.acquire()
+
+    async def _drain(self, target):
+        queue = self.queues[target]
+        try:
+            while queue:
+                pending = queue[0]
+                bucket = self.buckets.get(pending.rtype)
+                if bucket:
+                    await bucket.acquire()
+                # Once popped the entry is in flight and can no longer be coalesced into
+                queue.popleft()
+                try:
+                    result = await self.send(pending.rtype, pending.rid, pending.payload)
+                    self.sent += 1
+                    for future in pending.futures:
+                        if not future.done():
+                            future.set_result(result)
+                except Exception as e:
+                    self.failed += 1
+                    for future in pending.futures:
+                        if not future.done():
+                            future.set_exception(e)
+        finally:
+            del self.workers[target]
+            if not queue:
+                self.queues.pop(target, None)
+
+    def stats(self):
+        return {
+            "queue_depth": sum(len(q) for q in self.queues.values()),
+            "queues": {target: len(q) for target, q in self.queues.items() if q},
+            "max_depth": self.max_depth,
+            "submitted": self.submitted,
+            "sent": self.sent,
+            "failed": self.failed,
+            "coalesced_drops": self.coalesced,
+            "rate_limit_wait_seconds": {rtype: round(b.waited, 3) for rtype, b in self.buckets.items()}
+        }
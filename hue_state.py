@@ -0,0 +1,245 @@
+import asyncio
+import json
+import logging
+import random
+import time
+
+# Resource types mirrored from the bridge
+TRACKED_TYPES = ("grouped_light", "light", "scene")
+
+# How close the current state must be for a PUT field to count as a no-op
+XY_TOLERANCE = 0.003
+BRIGHTNESS_TOLERANCE = 1.0  # percent
+
+# PUT fields the event stream reports back for each type, so the mirror can be trusted
+# for them. grouped_light events carry on/dimming but never colour, so a group's colour
+# is always sent
+CONFIRMED_FIELDS = {
+    "grouped_light": ("on", "dimming"),
+    "light": ("on", "dimming", "color")
+}
+
+EVENTSTREAM_PATH = "/eventstream/clip/v2"
+
+
+def _merge(target, update):
+    """Recursively merge a partial resource update into target."""
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+class StateMirror:
+    """
+    In-memory mirror of bridge state for grouped_light, light and scene resources.
+
+    Loaded from a full GET of each resource type and kept current from the CLIP v2
+    event stream. Only trusted for no-op suppression while `live` is True, i.e. the
+    snapshot is loaded and the event stream is connected.
+    """
+
+    def __init__(self, tracked_types=TRACKED_TYPES):
+        self.resources = {rtype: {} for rtype in tracked_types}
+        self.live = False
+        self.loaded_at = None
+        self.last_event_at = None
+        self.events = 0
+        self.suppressed = 0
+        self.shrunk = 0
+
+    def load(self, rtype, items):
+        self.resources[rtype] = {item["id"]: item for item in items if item.get("id")}
+        self.loaded_at = time.time()
+
+    def apply_event(self, event):
+        """
+        Apply one event stream event ({"type": "update"|"add"|"delete", "data": [...]}).
+
+        Returns:
+            list: (event type, resource type, resource id) for every resource touched,
+                  including types that aren't mirrored
+        """
+        kind = event.get("type")
+        touched = []
+        for item in event.get("data", []):
+            rtype, rid = item.get("type"), item.get("id")
+            touched.append((kind, rtype, rid))
+            resources = self.resources.get(rtype)
+            if resources is None or not rid:
+                continue
+            if kind == "delete":
+                resources.pop(rid, None)
+            elif kind == "add" or rid not in resources:
+                resources[rid] = item
+            else:
+                _merge(resources[rid], item)
+        self.events += 1
+        self.last_event_at = time.time()
+        return touched
+
+    def apply_put(self, rtype, rid, payload):
+        """
+        Optimistically record a successful PUT so quick retries are recognised as no-ops.
+
+        Only fields the event stream confirms are recorded. Recalling a scene drops the
+        mirrored state of its room's grouped_light, which the recall changes in ways the
+        payload doesn't say, until the bridge's events bring it back.
+        """
+        if rtype == "scene" and "recall" in payload:
+            self.forget_group_of_scene(rid)
+            return
+        resource = self.resources.get(rtype, {}).get(rid)
+        confirmed = {key: value for key, value in payload.items() if key in CONFIRMED_FIELDS.get(rtype, ())}
+        if resource is not None and confirmed:
+            _merge(resource, json.loads(json.dumps(confirmed)))
+
+    def forget_group_of_scene(self, scene_id):
+        """Drop the mirrored grouped_light(s) owned by the room or zone scene_id belongs to."""
+        scene = self.get("scene", scene_id)
+        owner = (scene or {}).get("group", {}).get("rid")
+        if not owner:
+            return
+        groups = self.resources.get("grouped_light", {})
+        for rid in [rid for rid, group in groups.items() if group.get("owner", {}).get("rid") == owner]:
+            del groups[rid]
+
+    def get(self, rtype, rid):
+        return self.resources.get(rtype, {}).get(rid)
+
+    def shrink_payload(self, rtype, rid, payload):
+        """
+        Drop the fields of a PUT payload that already match the mirrored state.
+
+        Only fields in CONFIRMED_FIELDS for rtype are ever dropped.
+
+        Returns:
+            dict: The fields that still need sending (empty if the PUT would be a no-op).
+                  The payload is returned unchanged when the mirror isn't live.
+        """
+        current = self.get(rtype, rid) if self.live else None
+        if not current:
+            return payload
+        remaining = {}
+        confirmed = CONFIRMED_FIELDS.get(rtype, ())
+        for key, value in payload.items():
+            if key not in confirmed or not self._matches(key, value, current):
+                remaining[key] = value
+        if set(remaining) == {"dynamics"}:
+            # Only says how to reach a state that is already current
+            remaining = {}
+        if not remaining:
+            self.suppressed += 1
+        elif len(remaining) < len(payload):
+            self.shrunk += 1
+        return remaining
+
+    @staticmethod
+    def _matches(key, value, current):
+        state = current.get(key)
+        if not isinstance(state, dict) or not isinstance(value, dict):
+            return False
+        if key == "on":
+            return state.get("on") == value.get("on")
+        if key == "dimming":
+            brightness = state.get("brightness")
+            return brightness is not None and abs(brightness - value.get("brightness", -1)) <= BRIGHTNESS_TOLERANCE
+        if key == "color":
+            xy, wanted = state.get("xy") or {}, value.get("xy") or {}
+            if "x" not in xy or "x" not in wanted:
+                return False
+            return abs(xy["x"] - wanted["x"]) <= XY_TOLERANCE and abs(xy["y"] - wanted["y"]) <= XY_TOLERANCE
+        return False
+
+    def snapshot(self, rtype=None):
+        types = [rtype] if rtype else list(self.resources)
+        return {
+            "live": self.live,
+            "loaded_at": self.loaded_at,
+            "last_event_at": self.last_event_at,
+            "events": self.events,
+            "suppressed_puts": self.suppressed,
+            "shrunk_puts": self.shrunk,
+            "resources": {t: self.resources.get(t, {}) for t in types}
+        }
+
+
+class HueEventStream:
+    """
+    Background consumer of the bridge's CLIP v2 event stream feeding a StateMirror.
+
+    On (re)connect it reloads a full snapshot of each mirrored resource type, then applies
+    events as they arrive. on_event(kind, rtype, rid) is called for every touched resource
+    so other components (e.g. the catalog sync) can react to adds and deletes.
+    """
+
+    def __init__(self, hue, mirror, on_event=None):
+        self.hue = hue
+        self.mirror = mirror
+        self.on_event = on_event
+        self.connects = 0
+        self.last_error = None
+        self._task = None
+
+    async def load_snapshot(self):
+        results = await asyncio.gather(*(self.hue.get_resource(rtype) for rtype in self.mirror.resources))
+        for rtype, items in zip(self.mirror.resources, results):
+            self.mirror.load(rtype, items)
+
+    def handle_data(self, data):
+        try:
+            events = json.loads(data)
+        except json.JSONDecodeError:
+            logging.warning(f"Ignoring malformed Hue event: {data[:200]}")
+            return
+        for event in events if isinstance(events, list) else [events]:
+            for kind, rtype, rid in self.mirror.apply_event(event):
+                if self.on_event:
+                    self.on_event(kind, rtype, rid)
+
+    async def consume(self):
+        """Connect once, load the snapshot and apply events until the stream ends."""
+        async with self.hue.stream("GET", EVENTSTREAM_PATH, headers={"Accept": "text/event-stream"}) as response:
+            response.raise_for_status()
+            await self.load_snapshot()
+            self.mirror.live = True
+            self.connects += 1
+            data_lines = []
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    data_lines.append(line[5:].strip())
+                elif not line and data_lines:
+                    # A blank line ends one server-sent event
+                    self.handle_data("\n".join(data_lines))
+                    data_lines = []
+
+    async def run(self):
+        backoff = 1.0
+        while True:
+            try:
+                await self.consume()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logging.warning(f"Hue event stream disconnected: {e}")
+            finally:
+                self.mirror.live = False
+            await asyncio.sleep(backoff * random.uniform(0.8, 1.2))
+            backoff = min(backoff * 2, 60.0)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+from collections import deque
+
+import httpx
+
+from metrics import STAGE_SECONDS
+
+DEFAULT_QUEUE_PATH = os.path.join("data", "ifttt_queue.db")
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 5
+# A webhook submitted again with the same dedup key within this window is sent once
+DEFAULT_DEDUP_SECONDS = 10 * 60.0
+DEFAULT_TIMEOUT = 5.0
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+# Outcomes kept for watch() calls made after a webhook has finished
+MAX_OUTCOMES = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhooks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    event TEXT NOT NULL,
+    url TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL
+)
+"""
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class IftttDispatcher:
+    """
+    Durable delivery of IFTTT webhooks.
+
+    submit() writes the webhook to a small SQLite queue and returns immediately; a bounded
+    pool of workers delivers it over one shared pooled httpx client, retrying connection
+    errors, timeouts, 429s, 5XXs and unexpected errors with jittered exponential backoff.
+    A row is deleted once delivered (or given up on), so whatever is still in the queue on
+    shutdown or a crash is replayed by start(). A webhook submitted with the same
+    dedup_key as one within the last dedup_seconds (e.g. a retry of a request with the
+    same Idempotency-Key) is only sent once; without a key every submit is sent, so a command
+    said twice runs twice. watch() lets a caller wait for a queued webhook's outcome.
+
+    SQLite calls are made on the event loop; each is a single-row write on a local file.
+    """
+
+    def __init__(
+        self,
+        path=DEFAULT_QUEUE_PATH,
+        workers=DEFAULT_WORKERS,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        dedup_seconds=DEFAULT_DEDUP_SECONDS,
+        timeout=DEFAULT_TIMEOUT,
+        transport=None
+    ):
+        self.path = path
+        self.worker_count = workers
+        self.max_attempts = max_attempts
+        self.dedup_seconds = dedup_seconds
+        self.timeout = timeout
+        self.transport = transport
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.deduplicated = 0
+        self.replayed = 0
+        self.in_flight = 0
+        self.latencies = deque(maxlen=200)
+        self.recent_failures = deque(maxlen=20)
+        self._recent = {}
+        self._outcomes = {}
+        self._watchers = {}
+        self._db = None
+        self._client = None
+        self._queue = None
+        self._workers = []
+
+    def _conn(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, isolation_level=None)
+            self._db.execute(_SCHEMA)
+        return self._db
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.worker_count, max_keepalive_connections=self.worker_count),
+                transport=self.transport
+            )
+        return self._client
+
+    def start(self):
+        """Start the workers (if not running) and queue everything left in the database."""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue()
+        rows = self._conn().execute("SELECT id FROM webhooks ORDER BY id").fetchall()
+        for (row_id,) in rows:
+            self._queue.put_nowait(row_id)
+        if rows:
+            self.replayed += len(rows)
+            logging.info(f"Replaying {len(rows)} queued IFTTT webhooks")
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        """Stop the workers; undelivered webhooks stay in the database for the next start()."""
+        for worker in self._workers:
+            worker.cancel()
+        for worker in self._workers:
+            try:
+                await worker
+            except asyncio.CancelledError:
+                pass
+        self._workers = []
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def submit(self, event, url, payload, dedup_key=None):
+        """
+        Queue a webhook for delivery.
+
+        Args:
+            dedup_key: Identifies a retry of the same submit (e.g. the request's
+                       Idempotency-Key); None never deduplicates
+
+        Returns:
+            tuple: (queue id, deduplicated). deduplicated is True when the same webhook was
+                   submitted with dedup_key within dedup_seconds and this one was dropped.
+        """
+        self.start()
+        body = json.dumps(payload, sort_keys=True)
+        now = time.time()
+        # The URL carries the IFTTT key, so the same command from two homes is not a duplicate
+        key = (url, body, dedup_key)
+        recent = self._recent.get(key) if dedup_key is not None else None
+        if recent and now - recent[1] < self.dedup_seconds:
+            self.deduplicated += 1
+            return recent[0], True
+        cursor = self._conn().execute(
+            "INSERT INTO webhooks (event, url, payload, created) VALUES (?, ?, ?, ?)",
+            (event, url, body, now)
+        )
+        row_id = cursor.lastrowid
+        self._recent = {k: v for k, v in self._recent.items() if now - v[1] < self.dedup_seconds}
+        if dedup_key is not None:
+            self._recent[key] = (row_id, now)
+        self._queue.put_nowait(row_id)
+        return row_id, False
+
+    def watch(self, row_id):
+        """
+        Future for the outcome of a queued webhook.
+
+        Returns:
+            asyncio.Future: Resolves to {"delivered": bool, "attempts": n} (plus "error" if
+                            it was given up on), or {"delivered": None} if the webhook is
+                            unknown (finished too long ago to remember)
+        """
+        future = asyncio.get_running_loop().create_future()
+        if row_id in self._outcomes:
+            future.set_result(self._outcomes[row_id])
+        elif self._conn().execute("SELECT 1 FROM webhooks WHERE id = ?", (row_id,)).fetchone() is None:
+            future.set_result({"delivered": None})
+        else:
+            self._watchers.setdefault(row_id, []).append(future)
+        return future
+
+    def _finish(self, row_id, outcome):
+        self._outcomes[row_id] = outcome
+        if len(self._outcomes) > MAX_OUTCOMES:
+            del self._outcomes[next(iter(self._outcomes))]
+        for future in self._watchers.pop(row_id, ()):
+            if not future.done():
+                future.set_result(outcome)
+
+    async def _work(self):
+        while True:
+            row_id = await self._queue.get()
+            self.in_flight += 1
+            try:
+                await self._deliver(row_id)
+            except Exception as e:
+                # E.g. the queue database failing; the row (if still there) is replayed on
+                # the next start, but nobody should be left waiting on it
+                logging.error(f"IFTTT worker error for webhook {row_id}: {e}")
+                self.failed += 1
+                self._finish(row_id, {"delivered": False, "attempts": None, "error": str(e)})
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+
+    async def _deliver(self, row_id):
+        row = self._conn().execute(
+            "SELECT event, url, payload, attempts, created FROM webhooks WHERE id = ?", (row_id,)
+        ).fetchone()
+        if row is None:
+            return
+        event, url, payload, attempts, created = row
+        attempts += 1
+        start = time.perf_counter()
+        try:
+            response = await self._get_client().post(url, json=json.loads(payload))
+            response.raise_for_status()
+        except Exception as e:
+            # Anything but a 4XX may go through on another try, unexpected errors included
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            retryable = status is None or status == 429 or status >= 500
+            will_retry = retryable and attempts < self.max_attempts
+            # Observed directly: delivery runs outside any request, so there is no Server-Timing
+            STAGE_SECONDS.observe(time.perf_counter() - start, "webhook", "trigger_ifttt", "", "retry" if will_retry else "error")
+            if will_retry:
+                self._conn().execute("UPDATE webhooks SET attempts = ? WHERE id = ?", (attempts, row_id))
+                self.retries += 1
+                delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** (attempts - 1)) * random.uniform(0.5, 1.5)
+                logging.warning(f"IFTTT {event} failed ({e}), retry {attempts}/{self.max_attempts - 1} in {delay:.1f}s")
+                asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, row_id)
+                return
+            self._conn().execute("DELETE FROM webhooks WHERE id = ?", (row_id,))
+            self.failed += 1
+            self.recent_failures.append({"event": event, "attempts": attempts, "error": str(e), "at": time.time()})
+            logging.error(f"Giving up on IFTTT {event} after {attempts} attempts: {e}")
+            self._finish(row_id, {"delivered": False, "attempts": attempts, "error": str(e)})
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - start, "webhook", "trigger_ifttt", "", "ok")
+        self._conn().execute("DELETE FROM webhooks WHERE id = ?", (row_id,))
+        self.delivered += 1
+        self.latencies.append(time.time() - created)
+        self._finish(row_id, {"delivered": True, "attempts": attempts})
+
+    def queue_depth(self):
+        return self._conn().execute("SELECT COUNT(*) FROM webhooks").fetchone()[0]
+
+    def stats(self):
+        latencies = list(self.latencies)
+        return {
+            "queue_depth": self.queue_depth(),
+            "in_flight": self.in_flight,
+            "workers": len(self._workers),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+            "deduplicated": self.deduplicated,
+            "replayed": self.replayed,
+            "latency_ms": {
+                "p50": None if not latencies else round(_percentile(latencies, 0.5) * 1000, 1),
+                "p95": None if not latencies else round(_percentile(latencies, 0.95) * 1000, 1),
+                "max": None if not latencies else round(max(latencies) * 1000, 1)
+            },
+            "recent_failures": list(self.recent_failures)
+        }
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Defaults for the parsed-intent cache
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL_SECONDS = 6 * 60 * 60
+
+
+def normalize_text(text):
+    """
+    Normalize a natural language command so trivially different phrasings share a cache key.
+
+    Lowercases, strips punctuation and collapses whitespace, so "Turn on the AC!" and
+    "turn on the  ac" map to the same entry.
+    """
+    text = text.lower()
+    text = re.sub(r"[^\w\s']", " ", text)
+    return " ".join(text.split())
+
+
+def catalog_version(scene_name_to_id, location_to_group_id):
+    """
+    Compute a short, stable version string for the scene/location catalog.
+
+    The LLM prompt is built from these dictionaries, so any change to them must produce
+    a new version and invalidate previously cached intents.
+    """
+    payload = json.dumps(
+        [sorted(scene_name_to_id.items()), sorted(location_to_group_id.items())],
+        separators=(",", ":")
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()[:12]
+
+
+class IntentCache:
+    """
+    LRU + TTL cache of parsed intents, keyed on normalized text and catalog version.
+
+    Entries are evicted least-recently-used once max_entries is reached, and expire
+    after ttl_seconds. Changing the catalog version clears the whole cache.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl_seconds=DEFAULT_TTL_SECONDS, version=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, text):
+        return (self.version, normalize_text(text))
+
+    def get(self, text):
+        """Return a copy of the cached intent for text, or None on a miss."""
+        key = self._key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, parsed = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return json.loads(parsed)
+
+    def put(self, text, parsed):
+        """Store a parsed intent for text. Values are stored serialized so callers can't mutate them."""
+        key = self._key(text)
+        value = json.dumps(parsed)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_version(self, version):
+        """Switch to a new catalog version, dropping every entry cached under the old one."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "catalog_version": self.version,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
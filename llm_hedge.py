@@ -0,0 +1,180 @@
+import asyncio
+import time
+from collections import deque
+
+DEFAULT_DEADLINE = 10.0
+DEFAULT_MAX_ATTEMPTS = 3
+# A second request goes out once the first has run longer than this percentile of recent calls
+DEFAULT_HEDGE_PERCENTILE = 0.9
+# Hedge delay used until enough calls have been seen to learn it
+DEFAULT_HEDGE_DELAY = 3.0
+MIN_HEDGE_DELAY = 0.25
+MIN_SAMPLES = 20
+WINDOW = 200
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class DeadlineExceeded(Exception):
+    """No attempt produced a result within the deadline."""
+
+
+class HedgedRequester:
+    """
+    Run an LLM call with hedging, retries and one overall deadline.
+
+    call() starts one attempt. If it hasn't finished after the hedge delay (the
+    hedge_percentile latency of recent successful attempts), an identical second attempt
+    is started; whichever succeeds first wins and the other is cancelled. A failed attempt
+    is replaced straight away. At most two attempts run at once and max_attempts are made
+    in total; all of them share the deadline, and each is given only the time left as its
+    timeout.
+
+    Args:
+        deadline: Overall budget in seconds for one call()
+        max_attempts: Attempts per call, hedges and retries included
+        hedge_percentile: Latency percentile after which a hedge is sent (None disables hedging)
+        default_delay: Hedge delay until MIN_SAMPLES latencies have been recorded
+    """
+
+    def __init__(
+        self,
+        deadline=DEFAULT_DEADLINE,
+        max_attempts=DEFAULT_MAX_ATTEMPTS,
+        hedge_percentile=DEFAULT_HEDGE_PERCENTILE,
+        default_delay=DEFAULT_HEDGE_DELAY
+    ):
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.hedge_percentile = hedge_percentile
+        self.default_delay = default_delay
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.retries = 0
+        self.failed = 0
+        self.deadline_exceeded = 0
+        # Successful attempt latencies (what the hedge delay is learned from)
+        self.attempt_latencies = deque(maxlen=WINDOW)
+        # Latency of each call as seen by the caller
+        self.call_latencies = deque(maxlen=WINDOW)
+        # Latency of the first attempt alone: what the caller would have waited without
+        # hedging. A lower bound when it lost and was cancelled
+        self.primary_latencies = deque(maxlen=WINDOW)
+
+    def hedge_delay(self):
+        if self.hedge_percentile is None:
+            return None
+        if len(self.attempt_latencies) < MIN_SAMPLES:
+            return self.default_delay
+        return max(MIN_HEDGE_DELAY, _percentile(self.attempt_latencies, self.hedge_percentile))
+
+    async def call(self, attempt, deadline=None):
+        """
+        Run attempt(timeout) until one succeeds, hedging slow attempts.
+
+        Args:
+            attempt: async callable taking the seconds left as its timeout
+            deadline: Budget in seconds for this call (defaults to self.deadline)
+
+        Returns:
+            The first successful attempt's result
+
+        Raises:
+            DeadlineExceeded: If nothing succeeded within the deadline
+            Exception: The last attempt's error, if every attempt failed
+        """
+        self.calls += 1
+        start = time.perf_counter()
+        ends_at = start + (deadline or self.deadline)
+        delay = self.hedge_delay()
+        running = {}
+        made = 0
+        last_error = None
+        primary_recorded = False
+
+        def launch():
+            nonlocal made
+            made += 1
+            timeout = max(0.001, ends_at - time.perf_counter())
+            task = asyncio.create_task(attempt(timeout))
+            running[task] = (made, time.perf_counter())
+
+        launch()
+        try:
+            while running:
+                now = time.perf_counter()
+                if now >= ends_at:
+                    break
+                wait = ends_at - now
+                can_hedge = delay is not None and made == 1 and len(running) == 1 and made < self.max_attempts
+                if can_hedge:
+                    wait = min(wait, max(0.0, start + delay - now))
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge and time.perf_counter() < ends_at:
+                        self.hedged += 1
+                        launch()
+                    continue
+                for task in done:
+                    number, started = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        finished = time.perf_counter()
+                        self.attempt_latencies.append(finished - started)
+                        self.call_latencies.append(finished - start)
+                        if not primary_recorded:
+                            self.primary_latencies.append(finished - start)
+                        if number > 1:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = error
+                    if number == 1:
+                        primary_recorded = True
+                        self.primary_latencies.append(time.perf_counter() - start)
+                    if made < self.max_attempts and time.perf_counter() < ends_at:
+                        self.retries += 1
+                        launch()
+        finally:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.wait(running)
+                for task in running:
+                    # Retrieve the losers' errors so they aren't logged as never retrieved
+                    if not task.cancelled():
+                        task.exception()
+
+        if last_error is not None and time.perf_counter() < ends_at:
+            self.failed += 1
+            raise last_error
+        self.deadline_exceeded += 1
+        self.call_latencies.append(time.perf_counter() - start)
+        if not primary_recorded:
+            self.primary_latencies.append(time.perf_counter() - start)
+        raise DeadlineExceeded(f"No completion within {deadline or self.deadline:g}s") from last_error
+
+    def stats(self):
+        def ms(values, fraction):
+            value = _percentile(values, fraction)
+            return None if value is None else round(value * 1000, 1)
+
+        delay = self.hedge_delay()
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.calls, 4) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "retries": self.retries,
+            "failed": self.failed,
+            "deadline_exceeded": self.deadline_exceeded,
+            "deadline_s": self.deadline,
+            "hedge_delay_ms": None if delay is None else round(delay * 1000, 1),
+            "latency_ms": {"p50": ms(self.call_latencies, 0.5), "p99": ms(self.call_latencies, 0.99)},
+            "unhedged_latency_ms": {"p50": ms(self.primary_latencies, 0.5), "p99": ms(self.primary_latencies, 0.99)}
+        }
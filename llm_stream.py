@@ -0,0 +1,137 @@
+import json
+
+# Fields each intent handler needs before it can act, as alternative field sets: once any
+# one of them is present in a streamed completion the intent can be dispatched without
+# waiting for the rest. set_color takes exact values or a description to map.
+REQUIRED_FIELDS = {
+    "set_color": (("location", "hue", "sat", "bri"), ("location", "color_description")),
+    "trigger_scene": (("scene_name", "location"),),
+    "trigger_ifttt": (("device", "command"),),
+    "lg_tv_control": (("command",),)
+}
+
+class IncrementalJSONObject:
+    """
+    Incrementally parse a JSON object that arrives in chunks (e.g. a streamed completion).
+
+    Top-level fields become available in `fields` as soon as their value is complete,
+    before the closing brace of the object has arrived. Objects inside a top-level array
+    (e.g. each entry of "actions") are appended to `items` as soon as each one closes.
+    Other nested values are only decoded once the whole value has been received.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self.items = []
+        self.complete = False
+        self._pos = 0
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._segment_start = None
+        self._item_start = None
+
+    def feed(self, chunk):
+        """
+        Add a chunk of text and return the list of top-level keys completed by it.
+        """
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+            if c == '"':
+                self._in_string = True
+            elif c in "{[":
+                if self._stack == ["{", "["] and c == "{":
+                    self._item_start = i
+                self._stack.append(c)
+                if len(self._stack) == 1:
+                    self._segment_start = i + 1
+            elif c in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._stack == ["{", "["] and self._item_start is not None:
+                    self._close_item(i)
+                if not self._stack:
+                    completed += self._close_segment(i)
+                    self.complete = True
+            elif c == "," and len(self._stack) == 1:
+                completed += self._close_segment(i)
+                self._segment_start = i + 1
+        self._pos = len(text)
+        return completed
+
+    def _close_item(self, end):
+        try:
+            item = json.loads(self.text[self._item_start:end + 1])
+        except json.JSONDecodeError:
+            item = None
+        if isinstance(item, dict):
+            self.items.append(item)
+        self._item_start = None
+
+    def _close_segment(self, end):
+        if self._segment_start is None:
+            return []
+        segment = self.text[self._segment_start:end].strip()
+        if not segment:
+            return []
+        try:
+            pair = json.loads("{" + segment + "}")
+        except json.JSONDecodeError:
+            # Leave malformed fields to the defensive full-text parse
+            return []
+        self.fields.update(pair)
+        return list(pair)
+
+
+def missing_fields(fields):
+    """
+    Return the fields still missing before the handler for fields' intent can act.
+
+    Returns:
+        list: Missing field names, alternatives joined as "hue/sat/bri or color_description"
+              (empty once any of the intent's field sets is complete), or None for an
+              unknown intent
+    """
+    required = REQUIRED_FIELDS.get(fields.get("intent"))
+    if required is None:
+        return None
+    missing = [[key for key in alternative if fields.get(key) is None] for alternative in required]
+    if not all(missing):
+        return []
+    common = [key for key in missing[0] if all(key in other for other in missing)]
+    rest = [[key for key in other if key not in common] for other in missing]
+    if not all(rest):
+        return common
+    return common + [" or ".join("/".join(other) for other in rest)]
+
+
+def ready_intent(fields, complete=True):
+    """
+    Return the intent name if every field it requires is present in fields, otherwise None.
+
+    Args:
+        complete: False while the object is still streaming. Only an intent's first field
+                  set counts then: the others (color_description) are mapped together with
+                  optional fields (brightness_description) that may still be on their way.
+    """
+    intent = fields.get("intent")
+    required = REQUIRED_FIELDS.get(intent)
+    if not required:
+        return None
+    if not complete:
+        required = required[:1]
+    if any(all(fields.get(key) is not None for key in alternative) for alternative in required):
+        return intent
+    return None
@@ -0,0 +1,140 @@
+from intent_cache import normalize_text
+
+# Confidence at or above which the local result is used instead of calling OpenAI
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+# Confidence lost for every word the grammar could not account for
+UNMATCHED_WORD_PENALTY = 0.25
+
+DEVICE_CONFIDENCE = 0.95
+SCENE_WITH_LOCATION_CONFIDENCE = 0.9
+SCENE_WITHOUT_LOCATION_CONFIDENCE = 0.6
+
+# Spoken names for the IFTTT devices described in SYSTEM_PROMPT_CONTEXT
+DEVICE_ALIASES = {
+    "tv": "tv",
+    "television": "tv",
+    "ac": "ac",
+    "a c": "ac",
+    "aircon": "ac",
+    "air con": "ac",
+    "air conditioning": "ac",
+    "air conditioner": "ac",
+    "curtain": "curtains",
+    "curtains": "curtains"
+}
+
+# Words that carry no meaning for the intent once device/scene/location are found
+FILLER_WORDS = {
+    "a", "an", "the", "please", "can", "could", "would", "will", "you", "jarvis", "hey",
+    "turn", "switch", "power", "set", "put", "make", "start", "activate", "change", "go",
+    "lights", "light", "lighting", "scene", "to", "in", "into", "for", "of", "my", "me",
+    "up", "now", "it", "room", "at"
+}
+
+
+def _phrase_spans(tokens, max_words):
+    """Yield (start, end, phrase) for every contiguous run of up to max_words tokens."""
+    for start in range(len(tokens)):
+        for end in range(start + 1, min(len(tokens), start + max_words) + 1):
+            yield start, end, " ".join(tokens[start:end])
+
+
+def _longest_match(tokens, phrases, max_words):
+    """Return (start, end, phrase) of the longest phrase from phrases found in tokens, or None."""
+    best = None
+    for start, end, phrase in _phrase_spans(tokens, max_words):
+        if phrase in phrases and (best is None or end - start > best[1] - best[0]):
+            best = (start, end, phrase)
+    return best
+
+
+def _confidence(base, tokens, used):
+    unmatched = [t for i, t in enumerate(tokens) if i not in used and t not in FILLER_WORDS]
+    return max(0.0, round(base - UNMATCHED_WORD_PENALTY * len(unmatched), 2))
+
+
+def _parse_device(tokens):
+    match = _longest_match(tokens, DEVICE_ALIASES, 2)
+    if not match:
+        return None, 0.0
+    start, end, phrase = match
+    device = DEVICE_ALIASES[phrase]
+    used = set(range(start, end))
+
+    commands = {i: t for i, t in enumerate(tokens) if t in ("on", "off", "open")}
+    if device == "curtains":
+        # Curtains only support "open"
+        wanted = {i for i, t in commands.items() if t == "open"}
+        command = "open" if wanted else None
+    else:
+        wanted = {i for i, t in commands.items() if t in ("on", "off")}
+        values = {commands[i] for i in wanted}
+        command = values.pop() if len(values) == 1 else None
+    if not command:
+        return None, 0.0
+    used |= wanted
+
+    parsed = {"intent": "trigger_ifttt", "device": device, "command": command}
+    return parsed, _confidence(DEVICE_CONFIDENCE, tokens, used)
+
+
+def _parse_scene(tokens, scene_names, locations):
+    scene_phrases = {name.lower(): name for name in scene_names}
+    max_words = max((len(p.split()) for p in scene_phrases), default=0)
+    match = _longest_match(tokens, scene_phrases, max_words)
+    if not match:
+        return None, 0.0
+    start, end, phrase = match
+    used = set(range(start, end))
+
+    # Locations are keyed like "living_room" but spoken as "living room"
+    location_phrases = {loc.lower().replace("_", " "): loc for loc in locations}
+    remaining = [t if i not in used else "" for i, t in enumerate(tokens)]
+    location_match = _longest_match(remaining, location_phrases, 3)
+
+    parsed = {"intent": "trigger_scene", "scene_name": scene_phrases[phrase]}
+    if location_match:
+        loc_start, loc_end, loc_phrase = location_match
+        used |= set(range(loc_start, loc_end))
+        parsed["location"] = location_phrases[loc_phrase]
+        base = SCENE_WITH_LOCATION_CONFIDENCE
+    else:
+        base = SCENE_WITHOUT_LOCATION_CONFIDENCE
+    return parsed, _confidence(base, tokens, used)
+
+
+def parse_locally(text, scene_names, locations):
+    """
+    Parse simple device and scene commands without calling the LLM.
+
+    Recognizes the IFTTT device commands (tv/ac on/off, curtains open) and exact scene
+    names with an optional location. Words the grammar can't account for lower the
+    confidence, so anything more descriptive is left to OpenAI.
+
+    Args:
+        text: Natural language command
+        scene_names: Iterable of known scene names (e.g. SCENE_NAME_TO_ID keys)
+        locations: Iterable of known locations (e.g. LOCATION_TO_GROUP_ID keys)
+
+    Returns:
+        tuple: (parsed intent dict or None, confidence between 0 and 1)
+    """
+    tokens = normalize_text(text).split()
+    if not tokens:
+        return None, 0.0
+
+    device_parsed, device_confidence = _parse_device(tokens)
+    scene_parsed, scene_confidence = _parse_scene(tokens, scene_names, locations)
+    if device_parsed and scene_parsed:
+        # A scene can share a name with a device ("TV"); only trust a clear winner
+        if min(device_confidence, scene_confidence) >= DEFAULT_MIN_CONFIDENCE:
+            return None, 0.0
+        if scene_confidence > device_confidence:
+            return scene_parsed, scene_confidence
+        return device_parsed, device_confidence
+    if device_parsed:
+        return device_parsed, device_confidence
+    if scene_parsed:
+        return scene_parsed, scene_confidence
+    return None, 0.0
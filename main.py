@@ -1,10 +1,46 @@
-from fastapi import FastAPI, Request, BackgroundTasks
-from fastapi.responses import JSONResponse
-import requests
+import time
+# Created first so /healthz can break the cold start down by import phase
+from startup import StartupTracker
+startup = StartupTracker()
+
+from fastapi import FastAPI, Request, BackgroundTasks, WebSocket
+from fastapi.responses import JSONResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 import os
 import httpx
 import asyncio
+import importlib
+import json
+import logging
 from dotenv import load_dotenv
+startup.mark("fastapi")
+from hue_client import HueClient
+from intent_cache import IntentCache, normalize_text
+from local_parser import DEFAULT_MIN_CONFIDENCE, parse_locally
+from llm_stream import REQUIRED_FIELDS, IncrementalJSONObject, ready_intent
+from llm_hedge import DeadlineExceeded, HedgedRequester
+from model_router import DEFAULT_FAST_MODEL, DEFAULT_STRONG_MODEL, ModelRouter
+from catalog import Catalog, location_key
+from scene_sync import DEFAULT_ROOMS_SNAPSHOT, DEFAULT_SCENES_SNAPSHOT, CatalogSync, load_snapshot
+from hue_state import HueEventStream, StateMirror
+from hue_scheduler import HueScheduler
+from ifttt_dispatcher import DEFAULT_QUEUE_PATH, IftttDispatcher
+from webos_client import DEFAULT_KEY_PATH, POWER_ON_COMMANDS, KeyStore, WebOSClient, WebOSError, resolve_command
+from capture import DEFAULT_CAPTURE_PATH, CaptureMiddleware, CaptureWriter, add_dispatch, annotate
+from metrics import MetricsMiddleware, StageTimer, outcome_for_status, render_metrics
+from scene_compiler import DEFAULT_CACHE_PATH, SceneCompiler, group_for_grouped_light, group_lights, light_actions
+from actions import ActionDispatcher, current_action_index, split_actions
+from ws_channel import CommandChannels
+from single_flight import IdempotencyConflict, IdempotencyStore, SingleFlight, current_idempotency_key, request_fingerprint
+from homes import DEFAULT_HOME_ID, DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_WAITING, Home, HomeBusy, HomeMiddleware, HomeRegistry, current_home, load_homes_config
+from automations import DEFAULT_AUTOMATIONS_PATH, AutomationScheduler, build_steps, parse_when
+from pipeline import ActionResult, ParseError, ParseResult, failure, parse_problems, success, to_response, validate_action
+from color_engine import (
+    DEFAULT_GAMUT,
+    cached_hsb_to_xy,
+    map_brightness_description_to_bri,
+    map_color_description_to_hue_sat
+)
 
 # Test command for simulating smart control flow
 test_command = "Turn on the TV"
@@ -32,15 +68,185 @@ For IFTTT commands, ensure that the output JSON contains exactly the keys "devic
 """
 
 load_dotenv()
+startup.mark("modules")
+
+# Defer the OpenAI SDK import to first use and warm the OpenAI and Hue connections in the
+# background once the app is serving, instead of before (for cold starts on the free plan)
+FAST_STARTUP = os.getenv("FAST_STARTUP", "true").lower() in ("1", "true", "yes")
+if not FAST_STARTUP:
+    import openai
+    startup.mark("openai")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # One pooled bridge client per home for the whole app lifecycle, plus each home's
+    # catalog sync, event stream and TV sessions
+    homes.start()
+    # Replays webhooks left in the queue by the previous run
+    ifttt_dispatcher.start()
+    # Reloads the jobs stored by the previous run
+    automation_scheduler.start()
+    warmers = {"openai": warm_openai, "hue": warm_hue}
+    warm_task = None
+    if FAST_STARTUP:
+        # Runs while uvicorn binds the socket and serves the first requests
+        warm_task = asyncio.create_task(startup.warm_up(warmers))
+    else:
+        await startup.warm_up(warmers)
+    startup.mark("lifespan")
+    yield
+    if warm_task is not None:
+        warm_task.cancel()
+    await automation_scheduler.stop()
+    await ifttt_dispatcher.stop()
+    await capture_writer.close()
+    await homes.stop()
+    if openai_client is not None:
+        await openai_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# Households served by this process (filled in below). Requests pick theirs with the
+# X-Home-Id header or ?home=; added first so it runs inside the capture and metrics middleware
+homes = HomeRegistry(os.getenv("DEFAULT_HOME_ID", DEFAULT_HOME_ID))
+app.add_middleware(HomeMiddleware, registry=homes)
+
+# Sampled request/response capture (JSONL) for building a replayable corpus of real commands
+CAPTURE_ENABLED = os.getenv("CAPTURE_ENABLED", "false").lower() in ("1", "true", "yes")
+capture_writer = CaptureWriter(
+    path=os.getenv("CAPTURE_PATH", DEFAULT_CAPTURE_PATH),
+    max_bytes=int(os.getenv("CAPTURE_MAX_BYTES", str(10 * 1024 * 1024))),
+    backups=int(os.getenv("CAPTURE_BACKUPS", "5")),
+    sample_rate=float(os.getenv("CAPTURE_SAMPLE_RATE", "1.0"))
+)
+if CAPTURE_ENABLED:
+    # Added before MetricsMiddleware so it runs inside it and sees the stage timings
+    app.add_middleware(CaptureMiddleware, writer=capture_writer)
+# Per-stage timings: Server-Timing header on every response, histograms on /metrics
+app.add_middleware(MetricsMiddleware, on_request=startup.record_request)
 
 # Load from .env
 HUE_BRIDGE_IP = os.getenv("HUE_BRIDGE_IP")
 HUE_USERNAME = os.getenv("HUE_USERNAME")  # Hue API token
 IFTTT_KEY = os.getenv("IFTTT_KEY")
+# Overridable so benchmarks can send webhooks to a local sink
+IFTTT_BASE_URL = os.getenv("IFTTT_BASE_URL", "https://maker.ifttt.com").rstrip("/")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# Bridge client settings, shared by every home's client
+HUE_TIMEOUT_SECONDS = float(os.getenv("HUE_TIMEOUT_SECONDS", "5"))
+# "http" lets benchmarks point HUE_BRIDGE_IP at the local fake bridge (host:port)
+HUE_BRIDGE_SCHEME = os.getenv("HUE_BRIDGE_SCHEME", "https")
+
+# Durable IFTTT webhook queue with a shared client, retries and deduplication
+ifttt_dispatcher = IftttDispatcher(
+    path=os.getenv("IFTTT_QUEUE_PATH", DEFAULT_QUEUE_PATH),
+    workers=int(os.getenv("IFTTT_WORKERS", "4")),
+    max_attempts=int(os.getenv("IFTTT_MAX_ATTEMPTS", "5")),
+    dedup_seconds=float(os.getenv("IFTTT_DEDUP_SECONDS", str(10 * 60)))
+)
+
+
+
+def named_values(value, default_name="tv"):
+    """Parse "host" or "room=host,room=host" into {name: value}."""
+    entries = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        name, _, item = entry.rpartition("=")
+        entries[name.strip() or default_name] = item.strip()
+    return entries
+
+
+# Direct LG webOS control: a persistent session per TV, paired once (keys cached on disk)
+lg_tv_keys = KeyStore(os.getenv("LG_TV_KEY_PATH", DEFAULT_KEY_PATH))
+
+
+def lg_tv_clients(hosts, macs=""):
+    """WebOSClients for "host" or "room=host,room=host" (and LG_TV_MAC-style macs), by location."""
+    macs = named_values(macs)
+    return {
+        name: WebOSClient(
+            host,
+            lg_tv_keys,
+            secure=os.getenv("LG_TV_SECURE", "true").lower() in ("1", "true", "yes"),
+            mac=macs.get(name),
+            timeout=float(os.getenv("LG_TV_TIMEOUT_SECONDS", "5")),
+            keepalive=float(os.getenv("LG_TV_KEEPALIVE_SECONDS", "20"))
+        )
+        for name, host in named_values(hosts).items()
+    }
+
+
+def lg_tv_for(location):
+    """The current home's TV in location, or its only/first TV; None if it has none."""
+    tvs = home().tvs
+    if location in tvs:
+        return tvs[location]
+    return next(iter(tvs.values()), None)
+
+
+# Stream /execute completions and dispatch as soon as the intent's fields are complete
+PARSE_STREAMING = os.getenv("PARSE_STREAMING", "true").lower() in ("1", "true", "yes")
+
+# Long-lived OpenAI client shared by every request (created on first use)
+openai_client = None
+
+# Hedged, deadline-bound OpenAI calls for /parse: a second request goes out when the first
+# is slower than the LLM_HEDGE_PERCENTILE latency of recent calls to the same model
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "10"))
+llm_requesters = {}
+
+# Short catalog-like commands go to a fast model first; an answer that fails validation is
+# escalated to the strong model within what is left of LLM_DEADLINE_SECONDS
+LLM_ROUTING_ENABLED = os.getenv("LLM_ROUTING_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_STRONG_MODEL = os.getenv("LLM_STRONG_MODEL", DEFAULT_STRONG_MODEL)
+# Budget of the fast model's attempt, so a slow one still leaves time to escalate
+LLM_FAST_DEADLINE_SECONDS = float(os.getenv("LLM_FAST_DEADLINE_SECONDS", "3"))
+model_router = ModelRouter(
+    fast_model=os.getenv("LLM_FAST_MODEL", DEFAULT_FAST_MODEL) if LLM_ROUTING_ENABLED else LLM_STRONG_MODEL,
+    strong_model=LLM_STRONG_MODEL,
+    max_words=int(os.getenv("LLM_ROUTER_MAX_WORDS", "8")),
+    target_failure_rate=float(os.getenv("LLM_ROUTER_TARGET_FAILURE_RATE", "0.1"))
+)
+
+
+def requester_for(model):
+    """The HedgedRequester for model, so each model's hedge delay is learned from its own latencies."""
+    requester = llm_requesters.get(model)
+    if requester is None:
+        requester = llm_requesters[model] = HedgedRequester(
+            deadline=LLM_DEADLINE_SECONDS,
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.9")) if LLM_HEDGING_ENABLED else None,
+            default_delay=float(os.getenv("LLM_HEDGE_DEFAULT_DELAY_SECONDS", "3"))
+        )
+    return requester
+
+
+def get_openai_client():
+    global openai_client
+    if openai_client is None:
+        # Imported here rather than at the top: the SDK and its types take ~0.5s to import
+        from openai import AsyncOpenAI
+        openai_client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return openai_client
+
+
+async def warm_openai():
+    # The import runs on a worker thread so the event loop keeps serving meanwhile
+    await asyncio.to_thread(importlib.import_module, "openai")
+    # Any authenticated call opens the pooled TLS connection for the first completion
+    await get_openai_client().models.list(timeout=5)
+
+
+async def warm_hue():
+    # Other homes' pools open on their first request
+    if homes.default.hue_client.bridge_ip:
+        await homes.default.hue_client.get_resource("bridge", timeout=5)
+
 # Dictionary mapping locations to their group IDs
 LOCATION_TO_GROUP_ID = {
     "bedroom": "fc8b3e68-4a00-409d-a279-6ec19c6e74e6",
@@ -83,168 +289,452 @@ SCENE_NAME_TO_ID = {
     "sesh": "15b7bf23-b5a3-44c2-9a6b-86f001eefcbd"
 }
 
+# Live catalog: synced from the bridge in the background and persisted in the scenes.json
+# format. Startup uses the last snapshot, then the scenes.json shipped with the repo (read
+# only), then the built-in dictionaries above.
+CATALOG_SCENES_SNAPSHOT = os.getenv("CATALOG_SCENES_SNAPSHOT", DEFAULT_SCENES_SNAPSHOT)
+CATALOG_ROOMS_SNAPSHOT = os.getenv("CATALOG_ROOMS_SNAPSHOT", DEFAULT_ROOMS_SNAPSHOT)
+CATALOG_SEED_SCENES = os.getenv("CATALOG_SEED_SCENES", "scenes.json")
+CATALOG_SYNC_ENABLED = os.getenv("CATALOG_SYNC_ENABLED", "true").lower() in ("1", "true", "yes")
 
-@app.post("/control")
-async def control(request: Request):
+# Mirror of bridge light/scene state, kept current from the CLIP v2 event stream
+HUE_EVENTSTREAM_ENABLED = os.getenv("HUE_EVENTSTREAM_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Per-resource-type bridge rate limits: (commands per second, burst)
+HUE_RATES = {
+    "grouped_light": (float(os.getenv("HUE_GROUP_RATE_PER_SECOND", "1")), 2),
+    "light": (float(os.getenv("HUE_LIGHT_RATE_PER_SECOND", "10")), 10),
+    "scene": (float(os.getenv("HUE_SCENE_RATE_PER_SECOND", "1")), 2)
+}
+
+# Looks requested repeatedly are compiled into bridge scenes and recalled with one call
+SCENE_COMPILER_ENABLED = os.getenv("SCENE_COMPILER_ENABLED", "true").lower() in ("1", "true", "yes")
+SCENE_COMPILER_CACHE = os.getenv("SCENE_COMPILER_CACHE", DEFAULT_CACHE_PATH)
+
+# More homes (one bridge each) from a JSON registry; see homes.load_homes_config
+HOMES_CONFIG = os.getenv("HOMES_CONFIG")
+HOMES_DATA_DIR = os.getenv("HOMES_DATA_DIR", "homes")
+HOME_MAX_CONCURRENCY = int(os.getenv("HOME_MAX_CONCURRENCY", str(DEFAULT_MAX_CONCURRENCY)))
+HOME_MAX_WAITING = int(os.getenv("HOME_MAX_WAITING", str(DEFAULT_MAX_WAITING)))
+
+
+def build_home(home_id, config, data_dir=None):
+    """
+    Build a Home for one bridge: its own pooled HueClient and the catalog sync, state
+    mirror, event stream, command scheduler, scene compiler, intent cache and TVs that
+    go with it.
+
+    Args:
+        home_id: The home's ID
+        config: {"bridge_ip", "username", "scheme", "ifttt_key", "scenes", "locations",
+                 "lg_tv_host", "lg_tv_mac", "sync_catalog", "eventstream",
+                 "max_concurrency", "max_waiting"}; only bridge_ip is required
+        data_dir: Directory for the home's catalog snapshot and compiled scenes (None uses
+                  CATALOG_SCENES_SNAPSHOT, CATALOG_ROOMS_SNAPSHOT and SCENE_COMPILER_CACHE)
+
+    Returns:
+        Home
+    """
+    bridge_ip = config.get("bridge_ip")
+    hue_client = HueClient(bridge_ip, config.get("username"), timeout=HUE_TIMEOUT_SECONDS, scheme=config.get("scheme", HUE_BRIDGE_SCHEME))
+    seed_path = None
+    if data_dir:
+        os.makedirs(data_dir, exist_ok=True)
+        scenes_path = os.path.join(data_dir, "scenes.json")
+        rooms_path = os.path.join(data_dir, "rooms.json")
+        compiled_path = os.path.join(data_dir, "compiled_scenes.json")
+    else:
+        scenes_path, rooms_path, compiled_path = CATALOG_SCENES_SNAPSHOT, CATALOG_ROOMS_SNAPSHOT, SCENE_COMPILER_CACHE
+        seed_path = CATALOG_SEED_SCENES
+    locations = config.get("locations") or {}
+    state_mirror = StateMirror()
+
+    async def send_hue_command(rtype, rid, payload):
+        """
+        Send one scheduled PUT to the bridge, first dropping fields the mirrored state
+        already matches (e.g. a retried voice command).
+
+        Returns:
+            dict: The bridge response, or None if the PUT was skipped as a no-op
+        """
+        payload = state_mirror.shrink_payload(rtype, rid, payload)
+        if not payload:
+            return None
+        res = await hue_client.put_resource(rtype, rid, payload)
+        state_mirror.apply_put(rtype, rid, payload)
+        return res
+
+    # Orders, coalesces and rate-limits bridge commands per group
+    hue_scheduler = HueScheduler(send_hue_command, rates=HUE_RATES)
+    scene_compiler = SceneCompiler(
+        hue_client,
+        max_scenes=int(os.getenv("SCENE_COMPILER_MAX_SCENES", "20")),
+        idle_seconds=float(os.getenv("SCENE_COMPILER_IDLE_SECONDS", str(7 * 24 * 60 * 60))),
+        compile_after=int(os.getenv("SCENE_COMPILER_COMPILE_AFTER", "2")),
+        cache_path=compiled_path,
+        throttle=hue_scheduler.throttle
+    )
+
+    def on_catalog_change(old, new):
+        # Cached intents were produced against the old catalog
+        intent_cache.set_version(new.version)
+        if SCENE_COMPILER_ENABLED and new.source == "bridge":
+            asyncio.create_task(scene_compiler.prune(new.raw_scenes))
+
+    # The configured scene names are curated aliases: they stay on top of the bridge's names
+    aliases = config.get("scenes") or {}
+    catalog_sync = CatalogSync(
+        hue_client,
+        load_snapshot(scenes_path, rooms_path, fallback_locations=locations, aliases=aliases)
+        or (seed_path and load_snapshot(seed_path, rooms_path, fallback_locations=locations, aliases=aliases))
+        or Catalog(aliases, locations),
+        interval=float(os.getenv("CATALOG_SYNC_INTERVAL_SECONDS", "300")),
+        scenes_path=scenes_path,
+        rooms_path=rooms_path,
+        fallback_locations=locations,
+        on_change=on_catalog_change,
+        aliases=aliases
+    )
+
+    # Cache of parsed intents so repeated commands skip the OpenAI round trip
+    intent_cache = IntentCache(
+        max_entries=int(os.getenv("INTENT_CACHE_MAX_ENTRIES", "512")),
+        ttl_seconds=float(os.getenv("INTENT_CACHE_TTL_SECONDS", str(6 * 60 * 60))),
+        version=catalog_sync.current.version
+    )
+
+    def on_hue_event(kind, rtype, rid):
+        # Scenes or rooms added/removed in the Hue app: refresh the catalog now
+        if kind in ("add", "delete") and rtype in ("scene", "room", "zone"):
+            catalog_sync.request_sync()
+        if kind == "delete" and rtype == "scene":
+            scene_compiler.forget(rid)
+
+    return Home(
+        home_id,
+        hue_client,
+        catalog_sync,
+        state_mirror,
+        HueEventStream(hue_client, state_mirror, on_event=on_hue_event),
+        hue_scheduler,
+        scene_compiler,
+        intent_cache,
+        ifttt_key=config.get("ifttt_key"),
+        tvs=lg_tv_clients(config.get("lg_tv_host", ""), config.get("lg_tv_mac", "")),
+        sync_catalog=bool(bridge_ip) and config.get("sync_catalog", CATALOG_SYNC_ENABLED),
+        eventstream=bool(bridge_ip) and config.get("eventstream", HUE_EVENTSTREAM_ENABLED),
+        max_concurrency=int(config.get("max_concurrency", HOME_MAX_CONCURRENCY)),
+        max_waiting=int(config.get("max_waiting", HOME_MAX_WAITING))
+    )
+
+
+home_configs = load_homes_config(HOMES_CONFIG) if HOMES_CONFIG else {}
+for home_id, config in home_configs.items():
+    homes.add(build_home(home_id, config, data_dir=os.path.join(HOMES_DATA_DIR, home_id)))
+if homes.default_id not in home_configs:
+    # The single-household setup from .env
+    homes.add(build_home(homes.default_id, {
+        "bridge_ip": HUE_BRIDGE_IP,
+        "username": HUE_USERNAME,
+        # The key the webhooks were sent with before IFTTT_KEY was read
+        "ifttt_key": IFTTT_KEY or "kCQ-0Z6Eqoas4hL5lXU3T2sv3YDoS4iL6GQ0wXx5X2r",
+        "scenes": SCENE_NAME_TO_ID,
+        "locations": LOCATION_TO_GROUP_ID,
+        "lg_tv_host": os.getenv("LG_TV_HOST", ""),
+        "lg_tv_mac": os.getenv("LG_TV_MAC", "")
+    }))
+
+
+def home():
+    """The Home serving the current request (the default home outside a request)."""
+    return current_home.get() or homes.default
+
+
+def current_catalog():
+    """Return the current home's immutable Catalog (swapped atomically by its sync task)."""
+    return home().catalog
+
+
+def location_label(location):
+    """
+    Metrics label for a location from a client or the LLM: its catalog key, or "other"
+    if the catalog doesn't know it, so a misspelled room can't add a series.
+    """
+    if not location:
+        return None
+    key = location_key(location)
+    return key if key in current_catalog().locations else "other"
+
+
+def intent_label(intent):
+    """Metrics label for an intent from the LLM or the cache: the intent if known, else "other"."""
+    if not intent:
+        return None
+    return intent if intent in REQUIRED_FIELDS else "other"
+
+
+async def compiled_scene_for(group_id, hue, sat, bri):
+    """
+    Return a compiled scene ID for this colour in the group, or None to send it directly
+    (compiler disabled, lights of the group unknown, look not repeated yet, or bridge error).
+    """
+    if not SCENE_COMPILER_ENABLED:
+        return None
+    current = home()
+    catalog = current.catalog
+    group = group_for_grouped_light(group_id, catalog.raw_rooms)
+    if not group:
+        return None
+    lights = group_lights(group, catalog.raw_rooms, current.state_mirror.resources.get("light", {}).values(), catalog.raw_scenes)
+    if not lights:
+        return None
     try:
-        data = await request.json()
-        intent = data.get("intent")
-
-        # Inject system prompt context for lighting moods and scenes
-        if "mood_description" in data:
-            data["system_prompt_context"] = SYSTEM_PROMPT_CONTEXT
-
-        if intent == "set_color":
-            return await handle_set_color(data)
-        elif intent == "trigger_scene":
-            return handle_trigger_scene(data)
-        elif intent == "trigger_ifttt":
-            return await handle_ifttt_trigger(data)
-        elif intent == "lg_tv_control":
-            return await handle_lg_tv_control(data)
-        else:
-            return JSONResponse(content={"error": "Unknown intent"}, status_code=400)
+        # Labelled with the location key, not the room's UUID
+        location = next((key for key, rid in catalog.locations.items() if rid == group_id), "other")
+        with StageTimer("scene_compile", "set_color", location) as timer:
+            scene_id = await current.scene_compiler.scene_for(group, light_actions(lights, hue, sat, bri))
+            timer.outcome = "compiled" if scene_id else "direct"
+        return scene_id
+    except httpx.HTTPError as e:
+        logging.warning(f"Scene compile failed, sending colour directly: {e}")
+        return None
 
-    except Exception as e:
-        return JSONResponse(content={"error": str(e)}, status_code=500)
 
-def hsb_to_xy(hue, saturation, brightness):
+# Local parses below this confidence fall through to the cache and OpenAI
+LOCAL_PARSE_MIN_CONFIDENCE = float(os.getenv("LOCAL_PARSE_MIN_CONFIDENCE", str(DEFAULT_MIN_CONFIDENCE)))
+
+# Mood/colour requests ("something warm and dim in the bedroom") answered with the
+# nearest-looking scene; less confident recommendations fall through to OpenAI
+SCENE_RECOMMEND_ENABLED = os.getenv("SCENE_RECOMMEND_ENABLED", "true").lower() in ("1", "true", "yes")
+SCENE_RECOMMEND_MIN_CONFIDENCE = float(os.getenv("SCENE_RECOMMEND_MIN_CONFIDENCE", "0.7"))
+
+# How many requests were answered by each path: local grammar, intent cache, scene
+# recommender, OpenAI, or a streamed OpenAI completion dispatched early by /execute
+PARSE_PATH_COUNTS = {"local": 0, "cache": 0, "recommend": 0, "llm": 0, "llm_stream": 0}
+
+
+def parse_without_llm(text):
     """
-    Convert Philips Hue HSB values to CIE xy color space.
-    
+    Try the local grammar, the intent cache and then the scene recommender.
+
+    Returns:
+        tuple: (parsed intent, parse path, confidence) or None if OpenAI is needed
+    """
+    with StageTimer("fast_parse") as timer:
+        catalog = current_catalog()
+        local_parsed, confidence = parse_locally(text, catalog.scenes.keys(), catalog.locations.keys())
+        if local_parsed and confidence >= LOCAL_PARSE_MIN_CONFIDENCE:
+            timer.outcome, timer.intent = "local", local_parsed.get("intent")
+            return local_parsed, "local", confidence
+
+        cached = home().intent_cache.get(text)
+        if cached is not None:
+            timer.outcome, timer.intent = "cache", intent_label(cached.get("intent"))
+            return cached, "cache", None
+
+        if SCENE_RECOMMEND_ENABLED:
+            recommendation = catalog.recommender.recommend(text, catalog.locations.keys())
+            if recommendation and recommendation["confidence"] >= SCENE_RECOMMEND_MIN_CONFIDENCE:
+                parsed = {
+                    "intent": "trigger_scene",
+                    "scene_name": recommendation["scene_name"],
+                    "location": recommendation["location"],
+                    "recommendation": {"distance": recommendation["distance"], "confidence": recommendation["confidence"]}
+                }
+                timer.outcome, timer.intent = "recommend", "trigger_scene"
+                return parsed, "recommend", recommendation["confidence"]
+        timer.outcome = "miss"
+        return None
+
+
+def record_parse(result):
+    """Count the ParseResult's parse path and add the parsed intent to the request capture."""
+    PARSE_PATH_COUNTS[result.parse_path] += 1
+    annotate(parse_path=result.parse_path, parsed=result.parsed)
+    return result
+
+
+# Identical /execute and /control requests in flight (or just finished) share one run, and
+# retries with the same Idempotency-Key get the stored result instead of running again
+single_flight = SingleFlight(linger=float(os.getenv("SINGLE_FLIGHT_LINGER_SECONDS", "1")))
+idempotency_store = IdempotencyStore(
+    ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(10 * 60))),
+    max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+)
+
+
+async def run_deduplicated(request, data, key, call):
+    """
+    Run one command request at most once.
+
+    Identical requests (same home and key) share a single call() while it runs and for
+    SINGLE_FLIGHT_LINGER_SECONDS after, so a voice assistant firing the same command twice
+    parses and dispatches it once. With an Idempotency-Key header, a retry within
+    IDEMPOTENCY_TTL_SECONDS gets the original result (marked Idempotent-Replayed); results
+    with a 5XX status are not kept, so those retries run again.
+
     Args:
-        hue: 0-65535 (Hue API range)
-        saturation: 0-254 (Hue API range)
-        brightness: 0-254 (Hue API range)
-        
+        request: The HTTP request (for the Idempotency-Key header and path)
+        data: The request body, fingerprinted to detect a reused Idempotency-Key
+        key: Single-flight key of the command
+        call: async callable returning (ActionResult, parse path or None)
+
     Returns:
-        tuple: (x, y) coordinates in CIE color space
+        Response
     """
-    # Normalize values to 0-1 range
-    h = float(hue) / 65535.0
-    s = float(saturation) / 254.0
-    b = float(brightness) / 254.0
-    
-    # Convert to RGB
-    if s == 0:
-        r = g = b = b
+    async def run_once():
+        return await single_flight.run((home().id, request.url.path, key), call)
+
+    idempotency_key = request.headers.get("idempotency-key")
+    replayed = False
+    if idempotency_key:
+        # A retry of a failed (unstored) attempt runs again; the IFTTT queue uses this to
+        # skip webhooks the earlier attempt already queued
+        token = current_idempotency_key.set(f"{request.url.path} {idempotency_key}")
+        try:
+            (outcome, shared), replayed = await idempotency_store.run(
+                (home().id, request.url.path, idempotency_key),
+                request_fingerprint(request.url.path, data),
+                run_once,
+                keep=lambda value: value[0][0].status_code < 500
+            )
+        except IdempotencyConflict as e:
+            return to_response(failure(str(e), 422))
+        finally:
+            current_idempotency_key.reset(token)
     else:
-        h = h * 6.0
+        outcome, shared = await run_once()
+    result, parse_path = outcome
+    response = to_response(result, parse_path)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    elif shared:
+        response.headers["X-Single-Flight"] = "shared"
+    return response
+
 
-async def handle_ifttt_trigger(data):
+async def control_action(data):
+    if "actions" in data:
+        return await execute_actions(data), None
+    result = await call_intent_handler(data)
+    if result is None:
+        return failure("Unknown intent"), None
+    return result, None
+
+
+@app.post("/control")
+async def control(request: Request):
+    try:
+        data = await request.json()
+        key = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        return await run_deduplicated(request, data, key, lambda: control_action(data))
+
+    except Exception as e:
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+async def handle_ifttt_trigger(action):
     """
     Handle the trigger_ifttt intent for TV, AC, and curtains control via IFTTT webhook.
-    Expects data to contain "device" and optional "command" ("on" or "off" for TV/AC, "open" for curtains).
+    Expects the action to have "device" and optional "command" ("on" or "off" for TV/AC, "open" for curtains).
     """
-    device = data.get("device")
-    command = data.get("command", "on").lower()
+    device = action.device
+    command = (action.command or "on").lower()
 
     if not device or device not in ("tv", "ac", "curtains"):
-        return JSONResponse(content={"error": "Missing or unsupported 'device'. Please include a valid device in your command (e.g., 'TV', 'AC', or 'curtains')."}, status_code=400)
+        return failure("Missing or unsupported 'device'. Please include a valid device in your command (e.g., 'TV', 'AC', or 'curtains').")
 
     if device in ("tv", "ac"):
         if command not in ("on", "off"):
-            return JSONResponse(content={"error": "Invalid command for device control, must be 'on' or 'off'"}, status_code=400)
+            return failure("Invalid command for device control, must be 'on' or 'off'")
     elif device == "curtains":
         if command != "open":
-            return JSONResponse(content={"error": "Invalid command for curtains control, must be 'open'"}, status_code=400)
+            return failure("Invalid command for curtains control, must be 'open'")
 
+    ifttt_key = home().ifttt_key
     if device == "tv":
-        ifttt_url = "https://maker.ifttt.com/trigger/TV_power/json/with/key/kCQ-0Z6Eqoas4hL5lXU3T2sv3YDoS4iL6GQ0wXx5X2r"
+        tv = lg_tv_for(action.location)
+        if tv is not None and tv.connected:
+            # The TV is on and its session is open: switch it over the LAN rather than the
+            # IFTTT cloud round trip, falling back to the webhook if that fails
+            result = await handle_lg_tv_control(action.model_copy(update={"command": command}))
+            if result.status_code < 400:
+                return result
+            logging.warning(f"LG TV {command} over webOS failed, using IFTTT: {result.body.get('error')}")
+        event = "TV_power"
     elif device == "ac":
-        ifttt_url = "https://maker.ifttt.com/trigger/ac_power/json/with/key/kCQ-0Z6Eqoas4hL5lXU3T2sv3YDoS4iL6GQ0wXx5X2r"
+        event = "ac_power"
     else:  # curtains
-        ifttt_url = "https://maker.ifttt.com/trigger/Open_curtains/json/with/key/kCQ-0Z6Eqoas4hL5lXU3T2sv3YDoS4iL6GQ0wXx5X2r"
+        event = "Open_curtains"
         command = "open"  # force command to open for curtains
+    if not ifttt_key:
+        return failure("IFTTT is not configured for this home", 503)
+    ifttt_url = f"{IFTTT_BASE_URL}/trigger/{event}/json/with/key/{ifttt_key}"
 
     payload = {"value1": command}
 
-    try:
-        asyncio.create_task(send_ifttt_request(ifttt_url, payload))
-        return {"status": "success", "message": f"{device.upper()} command '{command}' queued to IFTTT."}
-    except Exception as e:
-        return JSONResponse(content={"error": f"Failed to queue IFTTT webhook: {str(e)}"}, status_code=500)
+    # A retried request's webhooks are sent once each; "AC on, AC off, AC on" in one
+    # request is three webhooks, so the action's index is part of the key
+    idempotency_key = current_idempotency_key.get()
+    dedup_key = None if idempotency_key is None else f"{idempotency_key} #{current_action_index.get()}"
 
-async def send_ifttt_request(ifttt_url, payload):
     try:
-        async with httpx.AsyncClient(timeout=5) as client:
-            response = await client.post(ifttt_url, json=payload)
-        response.raise_for_status()
-    except httpx.RequestError as e:
-        print(f"Error sending IFTTT webhook: {str(e)}")
+        # Persisted before returning; delivered (with retries) by the dispatcher's workers
+        queue_id, deduplicated = ifttt_dispatcher.submit(event, ifttt_url, payload, dedup_key=dedup_key)
+        if deduplicated:
+            return success(status="success", message=f"{device.upper()} command '{command}' already queued to IFTTT.", queue_id=queue_id)
+        return success(status="success", message=f"{device.upper()} command '{command}' queued to IFTTT.", queue_id=queue_id)
+    except Exception as e:
+        return failure(f"Failed to queue IFTTT webhook: {str(e)}", 500)
 
-async def handle_lg_tv_control(data):
+async def handle_lg_tv_control(action):
     """
     Handle the lg_tv_control intent for direct LG TV control via webOS API.
-    Expects data to contain "command" field with the action to perform.
-    This is a stub implementation; actual communication with LG TV requires network access and webOS protocol.
+    Expects the action to have a "command" field with the action to perform
+    (see webos_client.resolve_command), and optionally the "location" of the TV.
     """
-    command = data.get("command")
+    command = action.command
     if not command:
-        return JSONResponse(content={"error": "Missing command for LG TV control"}, status_code=400)
-
-    # TODO: Implement actual LG webOS TV control logic here.
-    # This may involve sending requests to the TV's webOS service endpoints,
-    # possibly via websockets or REST API if available.
-    # For now, just simulate success.
+        return failure("Missing command for LG TV control")
 
-    return {"status": "success", "message": f"LG TV command '{command}' received (stub implementation)."}
+    tv = lg_tv_for(action.location)
+    if tv is None:
+        return failure("LG TV control is not configured (set LG_TV_HOST)", 503)
 
-    i = int(h)
-    f = h - i
-    p = b * (1.0 - s)
-    q = b * (1.0 - s * f)
-    t = b * (1.0 - s * (1.0 - f))
-    
-    if i == 0:
-        r, g, b = b, t, p
-    elif i == 1:
-        r, g, b = q, b, p
-    elif i == 2:
-        r, g, b = p, b, t
-    elif i == 3:
-        r, g, b = p, q, b
-    elif i == 4:
-        r, g, b = t, p, b
-    else:
-        r, g, b = b, p, q
-
-    # Apply inverse gamma correction (sRGB to linear RGB)
-    r = pow((r + 0.055) / 1.055, 2.4) if r > 0.04045 else r / 12.92
-    g = pow((g + 0.055) / 1.055, 2.4) if g > 0.04045 else g / 12.92
-    b = pow((b + 0.055) / 1.055, 2.4) if b > 0.04045 else b / 12.92
+    if command.lower().strip() in POWER_ON_COMMANDS:
+        if tv.connected:
+            return success(status="success", message="LG TV is already on.")
+        try:
+            await tv.power_on()
+        except (WebOSError, OSError, ValueError) as e:
+            return failure(f"Failed to turn on LG TV: {str(e)}", 503)
+        return success(status="success", message="Wake-on-LAN packet sent to the LG TV.")
 
-    # Convert linear RGB to XYZ using standard matrix for sRGB D65 illuminant
-    X = r * 0.4124564 + g * 0.3575761 + b * 0.1804375
-    Y = r * 0.2126729 + g * 0.7151522 + b * 0.0721750
-    Z = r * 0.0193339 + g * 0.1191920 + b * 0.9503041
-    
-    # Calculate xy values
+    request = resolve_command(command)
+    if request is None:
+        return failure(f"Unsupported LG TV command '{command}'")
+    uri, payload = request
     try:
-        x = X / (X + Y + Z)
-        y = Y / (X + Y + Z)
-    except ZeroDivisionError:
-        x, y = 0.0, 0.0
-    
-    return round(x, 4), round(y, 4)
+        # One frame on the TV's open session
+        with StageTimer("tv", "lg_tv_control", location_label(action.location)):
+            response = await tv.request(uri, payload)
+    except WebOSError as e:
+        return failure(f"Failed to control LG TV: {str(e)}", 502)
+    return success(status="success", message=f"LG TV command '{command}' sent.", uri=uri, response=response)
 
-async def handle_set_color(data):
-    location = data.get("location")
-    hue = data.get("hue")
-    sat = data.get("sat")
-    bri = data.get("bri")
+async def handle_set_color(action):
+    location = action.location
+    hue = action.hue
+    sat = action.sat
+    bri = action.bri
     
     # If any parameter is missing, try to parse descriptive color/brightness strings
     if location is None or hue is None or sat is None or bri is None:
-        color_desc = data.get("color_description")
-        brightness_desc = data.get("brightness_description")
-        mood_desc = data.get("mood_description")
+        color_desc = action.color_description
+        brightness_desc = action.brightness_description
+        mood_desc = action.mood_description
         # Accept location even if missing color_description if hue/sat/bri are present
         if not location or (not color_desc and (hue is None or sat is None or bri is None)):
-            return JSONResponse(
-                content={"error": "Missing required parameters: location and color_description or hue/sat/bri"},
-                status_code=400
-            )
+            return failure("Missing required parameters: location and color_description or hue/sat/bri")
         # Map descriptive strings to numerical values if hue/sat/bri missing
         if hue is None or sat is None or bri is None:
             hue, sat = map_color_description_to_hue_sat(color_desc, mood_desc)
@@ -260,8 +750,8 @@ async def handle_set_color(data):
         # Lock saturation to 100% regardless of input
         sat = 254
     
-    # Convert HSB to xy color space
-    x, y = hsb_to_xy(hue, sat, bri)
+    # Convert HSB to xy color space, clamped to the lamps' gamut
+    x, y = cached_hsb_to_xy(int(hue), int(sat), int(bri), DEFAULT_GAMUT)
     
     # Convert brightness from 0-254 to 0-100 range for API v2
     brightness_percent = min(100.0, max(0.0, (float(bri) / 254.0) * 100.0))
@@ -269,172 +759,104 @@ async def handle_set_color(data):
     # Get group ID from location
     group_id = get_group_id_from_location(location)
     if not group_id:
-        return JSONResponse(content={"error": "Invalid location"}, status_code=400)
-    
-    url = f"https://{HUE_BRIDGE_IP}/clip/v2/resource/grouped_light/{group_id}"
-    headers = {
-        "hue-application-key": HUE_USERNAME,
-        "Content-Type": "application/json"
-    }
+        return failure("Invalid location")
     
     payload = {
         "on": {"on": True},
         "dimming": {"brightness": brightness_percent},
         "color": {"xy": {"x": x, "y": y}}
     }
+    recall = {"action": "active"}
+    if action.transition_seconds:
+        # The bridge fades to the new state itself: one call instead of a frame per step
+        duration_ms = int(action.transition_seconds * 1000)
+        payload["dynamics"] = {"duration": duration_ms}
+        recall["duration"] = duration_ms
     
-    try:
-        res = requests.put(url, json=payload, headers=headers, verify=False)
-        res.raise_for_status()  # Raise exception for 4XX/5XX responses
-        return JSONResponse(content={"status": "Hue command sent", "response": res.json()})
-    except requests.exceptions.RequestException as e:
-        return JSONResponse(
-            content={"error": f"Failed to communicate with Hue Bridge: {str(e)}"},
-            status_code=500
-        )
-
-# Helper functions to map descriptive strings to numerical values
-
-# Define base colors (Hue scale 0-65535, Sat 0-254)
-BASE_COLORS = {
-    "red": (0, 254),
-    "warm red": (2000, 230), # Shifted slightly towards orange
-    "orange": (5461, 254),
-    "yellow": (10922, 254),
-    "lime": (16384, 254),
-    "green": (21845, 254),
-    "spring green": (27306, 254),
-    "cyan": (32768, 254),
-    "sky blue": (38000, 200),
-    "blue": (43690, 254),
-    "purple": (49151, 254),
-    "magenta": (52000, 254),
-    "pink": (54613, 254),
-    "light pink": (56000, 180),
-    "white": (0, 0), # Saturation 0 means white regardless of hue
-    "warm white": (7000, 100), # Example: Use low sat, adjust hue towards orange/yellow
-    "cool white": (38000, 50) # Example: Use low sat, adjust hue towards blue
-}
-
-def map_color_description_to_hue_sat(color_desc, mood_desc=None):
-    if not color_desc:
-        return BASE_COLORS["white"] # Default to white if no color specified
-
-    color_desc = color_desc.lower()
-    mood_desc = mood_desc.lower() if mood_desc else None
-
-    # --- Handle specific mood/color combinations first ---
-    if mood_desc in ["calming", "relaxing", "sleepy", "chill", "nap", "napping"]:
-        if "red" in color_desc:
-            # Calm/Relaxing Red: Warmer hue, lower saturation
-            return (3000, 180) # Shift hue towards orange, reduce saturation
-        elif "orange" in color_desc:
-            # Warm orange for napping
-            return (5461, 200)
-        elif "blue" in color_desc:
-            # Calm/Relaxing Blue: Shift hue slightly towards cyan, lower saturation
-            return (40000, 160)
-        elif "green" in color_desc:
-             # Calm/Relaxing Green: Less vibrant green, lower saturation
-            return (24000, 170)
-        else:
-            # Default warm orange for nap/chill if no color specified
-            return (5461, 200)
-
-    # --- Fallback to base color lookup and generic mood adjustment ---
-    hue, sat = BASE_COLORS.get(color_desc, BASE_COLORS["warm white"])
-
-    # Generic mood adjustments (if no specific combination was matched)
-    if mood_desc:
-        if mood_desc in ["calming", "relaxing", "sleepy", "soft", "chill", "nap", "napping"]:
-            sat = 254  # Lock saturation to 100%
-        elif mood_desc in ["energizing", "vibrant", "bright"]:
-            sat = 254  # Lock saturation to 100%
-        # Add more generic mood adjustments if needed
-
-    return hue, sat
-
-def map_brightness_description_to_bri(brightness_desc):
-    # Brightness map (0-254 scale)
-    brightness_map = {
-        "off": 0, # Technically handled by 'on:false', but good to have
-        "minimum": 1,
-        "very dim": 25,
-        "dim": 60, # Adjusted from 50
-        "sleepy": 40, # Added
-        "soft": 100, # Added
-        "normal": 150,
-        "bright": 220, # Adjusted from 254
-        "full": 254,
-        "max": 254,
-        "maximum": 254
-    }
-    if not brightness_desc:
-        return brightness_map["normal"] # Default brightness
-
-    return brightness_map.get(brightness_desc.lower(), brightness_map["normal"])
+    scene_id = await compiled_scene_for(group_id, hue, sat, bri)
+    if scene_id:
+        try:
+            with StageTimer("bridge", "set_color", location_label(location)):
+                res = await home().hue_scheduler.submit(group_id, "scene", scene_id, {"recall": recall})
+            return success(status="Compiled scene activated", scene_id=scene_id, response=res)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                return failure(f"Failed to activate scene: {str(e)}", 500)
+            # Deleted on the bridge behind our back: forget it and send the colour directly
+            home().scene_compiler.forget(scene_id)
+        except httpx.HTTPError as e:
+            return failure(f"Failed to activate scene: {str(e)}", 500)
 
+    try:
+        # Queued behind earlier commands for this group; bursts collapse to the latest colour.
+        # Raises for connection errors, timeouts and 4XX/5XX responses
+        with StageTimer("bridge", "set_color", location_label(location)) as timer:
+            res = await home().hue_scheduler.submit(group_id, "grouped_light", group_id, payload)
+            if res is None:
+                timer.outcome = "skipped"
+        if res is None:
+            return success(status="Hue command skipped", reason="Lights already match the requested state", requested=payload)
+        return success(status="Hue command sent", response=res)
+    except httpx.HTTPError as e:
+        return failure(f"Failed to communicate with Hue Bridge: {str(e)}", 500)
 
-def handle_trigger_scene(data):
-    scene_name = data.get("scene_name")
+async def handle_trigger_scene(action):
+    scene_name = action.scene_name
     if not scene_name:
-        return JSONResponse(content={"error": "Missing scene_name"}, status_code=400)
+        return failure("Missing scene_name")
     
     # Normalize scene name to lowercase
     scene_name = scene_name.lower()
     
-    # Get scene ID from the dictionary
-    scene_id = SCENE_NAME_TO_ID.get(scene_name)
+    # Get scene ID from the current catalog, preferring the scene in the requested room
+    catalog = current_catalog()
+    scene_id = catalog.scene_id(scene_name, action.location)
     
-    # If scene not found directly, try fuzzy matching
-    if not scene_id and SCENE_NAME_TO_ID:
-        scene_id = fuzzy_match_scene(scene_name, SCENE_NAME_TO_ID)
+    # If scene not found directly, try the fuzzy scene index
+    if not scene_id:
+        scene_id = catalog.scene_index.best_match(scene_name)
     
     if not scene_id:
-        return JSONResponse(
-            content={"error": f"Unknown scene: {scene_name}"},
-            status_code=400
-        )
+        return failure(f"Unknown scene: {scene_name}")
     
     # Get location/group from data or use default
-    location = data.get("location", "living_room")
+    location = action.location or "living_room"
     group_id = get_group_id_from_location(location)
     
     if not group_id:
-        return JSONResponse(content={"error": "Invalid location"}, status_code=400)
+        return failure("Invalid location")
     
-    # Call Hue v2 API to recall the scene via group action endpoint
-    url = f"https://{HUE_BRIDGE_IP}/clip/v2/resource/scene/{scene_id}" # Revert to scene endpoint
-    headers = {
-        "hue-application-key": HUE_USERNAME,
-        "Content-Type": "application/json"
-    }
-    
-    # Try payload for recalling scene via its own endpoint
+    # Call Hue v2 API to recall the scene via its own scene endpoint
     payload = {
         "recall": {
             "action": "active"
         }
     }
+    if action.transition_seconds:
+        payload["recall"]["duration"] = int(action.transition_seconds * 1000)
     
     try:
-        res = requests.put(
-            url,
-            json=payload,
-            headers=headers,
-            verify=False
-        )
-        res.raise_for_status()
-        return JSONResponse(content={"status": "Scene activated", "response": res.json()})
-    except requests.exceptions.RequestException as e:
-        return JSONResponse(
-            content={"error": f"Failed to activate scene: {str(e)}"},
-            status_code=500
-        )
+        # Ordered with other commands for the same group
+        with StageTimer("bridge", "trigger_scene", location_label(location)):
+            res = await home().hue_scheduler.submit(group_id, "scene", scene_id, payload)
+        return success(status="Scene activated", response=res)
+    except httpx.HTTPError as e:
+        return failure(f"Failed to activate scene: {str(e)}", 500)
+
+INTENT_HANDLERS = {
+    "set_color": handle_set_color,
+    "trigger_scene": handle_trigger_scene,
+    "trigger_ifttt": handle_ifttt_trigger,
+    "lg_tv_control": handle_lg_tv_control
+}
+
 
 def fuzzy_match_scene(query, scene_dict):
     """
     Find the closest matching scene name using simple fuzzy matching.
+
+    Linear scan kept as the baseline for benchmarks/scene_match.py;
+    handle_trigger_scene uses the SceneIndex instead.
     
     Args:
         query: The scene name to search for
@@ -471,266 +893,516 @@ def fuzzy_match_scene(query, scene_dict):
 
 
 def get_group_id_from_location(location):
-    return LOCATION_TO_GROUP_ID.get(location.lower())
+    return current_catalog().group_id(location)
 
 
 
-from openai import OpenAI
-import json
+def defensive_json_loads(content):
+    """
+    Parse JSON content after fixing common LLM output issues (single quotes, missing braces).
 
-@app.post("/parse")
-async def parse(request: Request):
-    import logging
-    try:
-        data = await request.json()
-        logging.info(f"Received /parse request data: {data}")
-        text = data.get("text")
-        if not text:
-            return JSONResponse(content={"error": "Missing 'text' field"}, status_code=400)
+    Raises:
+        json.JSONDecodeError: If the content still isn't valid JSON
+    """
+    clean_content = content.replace("'", '"')  # Replace single quotes with double quotes
+    clean_content = clean_content.strip()
 
-        # Get valid scene names and locations
-        scene_name_options = ", ".join([f'"{name}"' for name in SCENE_NAME_TO_ID.keys()])
-        location_options = ", ".join([f'"{loc}"' for loc in LOCATION_TO_GROUP_ID.keys()])
-        
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        system_prompt = (
-            "You are a smart home controller. "
-            "Interpret the user's natural language request and extract structured information. "
-            "Return the output as a JSON object. "
-            "Determine if the request matches a known lighting scene, a device control command, or describes a color. "
-            "If it matches a scene name, set intent to 'trigger_scene' "
-            "and include 'scene_name' and 'location' fields. "
-            f"scene_name must be one of: {scene_name_options}. "
-            f"location must be one of: {location_options}. "
-            "If it is a command to control devices via IFTTT (e.g., 'Turn on the AC'), set intent to 'trigger_ifttt' and include 'device' and 'command' fields, where 'command' is either 'on' or 'off'. "
-            "If it describes a color (e.g., 'warm orange', 'deep blue'), set intent to 'set_color' and include "
-            "'location', 'hue' (0-360), 'sat' (0-254), and 'bri' (0-254) fields. "
-            "If it is a command to control devices via IFTTT (e.g., 'Turn on the AC'), set intent to 'trigger_ifttt' and include 'device' and 'command' fields, where 'command' is either 'on' or 'off'. "
-            "Always normalize scene names to lowercase."
-            + "\n\n" + SYSTEM_PROMPT_CONTEXT
-        )
-        user_prompt = f"Request: {text}"
+    # Ensure it starts and ends with braces
+    if not clean_content.startswith('{'):
+        clean_content = '{' + clean_content
+    if not clean_content.endswith('}'):
+        clean_content = clean_content + '}'
 
-        # Configure retry logic for better reliability in cloud environments
-        max_retries = 2
-        retry_count = 0
-        last_exception = None
-        
-        while retry_count <= max_retries:
+    return json.loads(clean_content)
+
+
+# Lets one completion carry several actions ("turn on the AC and open the curtains")
+MULTI_ACTION_PROMPT = (
+    "If the request asks for more than one action, return {\"actions\": [...]} with one object per "
+    "action, in the order requested, each using the same fields as a single action. "
+    "Otherwise return a single action object."
+)
+
+
+def decode_llm_json(content):
+    """
+    Decode a JSON completion, falling back to defensive_json_loads (timed as the json_decode stage).
+
+    Raises:
+        json.JSONDecodeError: From the strict parse, if the defensive repair fails too
+    """
+    with StageTimer("json_decode") as timer:
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError as json_err:
+            logging.error(f"Failed to parse JSON from OpenAI response: {str(json_err)}")
             try:
-                # Use response_format to ensure we get valid JSON
-                # This is more reliable than parsing from content directly
-                response = client.chat.completions.create(
-                    model="o4-mini-2025-04-16",  # Pinned to specific snapshot for consistency
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    response_format={"type": "json_object"},  # Explicitly request JSON output
-                    temperature=1,  # Lower temperature for more predictable responses
-                    timeout=15  # Explicit timeout for cloud environments
-                )
-                
-                # Log full raw response for debugging
-                logging.info(f"Full OpenAI response: {response}")
-                
-                # Check if we have a valid response with content
-                if not response.choices or len(response.choices) == 0:
-                    error_msg = "OpenAI API returned empty choices"
-                    logging.error(error_msg)
-                    return JSONResponse(content={"error": error_msg, "raw_response": str(response)}, status_code=500)
-                
-                # Check if message exists and has content
-                message = response.choices[0].message
-                if not hasattr(message, 'content') or message.content is None:
-                    error_msg = "OpenAI API response missing content field"
-                    logging.error(error_msg)
-                    return JSONResponse(content={"error": error_msg, "raw_response": str(response)}, status_code=500)
-                
-                content = message.content.strip()
-                logging.info(f"OpenAI response content: {content}")
-                
-                if not content:
-                    error_msg = "OpenAI API returned empty content"
-                    logging.error(error_msg)
-                    return JSONResponse(content={"error": error_msg, "raw_response": str(response)}, status_code=500)
-                
-                # Validate JSON response - this should be more reliable now with response_format
-                try:
-                    parsed = json.loads(content)
-                    # Success - return the parsed data
-                    return JSONResponse(content=parsed)
-                except json.JSONDecodeError as json_err:
-                    # Still failed to parse JSON despite response_format
-                    error_msg = f"Failed to parse JSON from OpenAI response: {str(json_err)}"
-                    logging.error(error_msg)
-                    
-                    # Final attempt - do a defensive JSON string fix
-                    try:
-                        # Try to fix common JSON issues
-                        clean_content = content.replace("'", '"')  # Replace single quotes with double quotes
-                        clean_content = clean_content.strip()
-                        
-                        # Ensure it starts and ends with braces
-                        if not clean_content.startswith('{'):
-                            clean_content = '{' + clean_content
-                        if not clean_content.endswith('}'):
-                            clean_content = clean_content + '}'
-                            
-                        fixed_parsed = json.loads(clean_content)
-                        logging.warning(f"JSON was fixed with defensive parsing: {clean_content}")
-                        return JSONResponse(content=fixed_parsed)
-                    except json.JSONDecodeError:
-                        # If we're on the last retry, return the error
-                        if retry_count == max_retries:
-                            return JSONResponse(
-                                content={
-                                    "error": error_msg,
-                                    "raw_content": content
-                                },
-                                status_code=500
-                            )
-                        # Otherwise, increment retry counter and try again
-                        retry_count += 1
-                        continue
-                    
-            except Exception as e:
-                last_exception = e
-                # If we're on the last retry, raise the exception
-                if retry_count == max_retries:
-                    raise
-                # Otherwise, increment retry counter and try again
-                retry_count += 1
-                logging.warning(f"Retry {retry_count}/{max_retries} after error: {str(e)}")
-                continue
-                
-        # We should never get here, but just in case
-        return JSONResponse(
-            content={"error": f"Failed after {max_retries} retries. Last error: {str(last_exception)}"},
-            status_code=500
-        )
-    except Exception as e:
-        logging.error(f"Exception in /parse endpoint: {e}")
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+                parsed = defensive_json_loads(content)
+            except json.JSONDecodeError:
+                raise json_err
+            timer.outcome = "repaired"
+            logging.warning(f"JSON was fixed with defensive parsing: {content}")
+        if isinstance(parsed, dict):
+            timer.intent = intent_label(parsed.get("intent"))
+        return parsed
 
 
-async def run_smart_control_from_text(text):
+def normalize_parsed(parsed):
     """
-    Simulate the full smart control flow using natural language input.
-    
-    Args:
-        text: Natural language command (e.g., "Make the bedroom a warm orange")
-        
-    Returns:
-        Result of the control operation
+    Return a parse result in its canonical shape: a single action object, or
+    {"actions": [...]} when there are several actions.
     """
-    print(f"Processing command: '{text}'")
-    
-    # Initialize OpenAI client
-    client = OpenAI(api_key=OPENAI_API_KEY)
-    
+    actions = split_actions(parsed)
+    if len(actions) == 1:
+        return actions[0]
+    return {"actions": actions}
 
 
+def build_parse_system_prompt():
+    """
+    Build the /parse system prompt from the current scene and location catalog.
+    """
     # Get valid scene names and locations
-    scene_name_options = ", ".join([f'"{name}"' for name in SCENE_NAME_TO_ID.keys()])
-    location_options = ", ".join([f'"{loc}"' for loc in LOCATION_TO_GROUP_ID.keys()])
-    
-    # Define prompts
-    system_prompt = (
+    catalog = current_catalog()
+    scene_name_options = ", ".join([f'"{name}"' for name in catalog.scenes.keys()])
+    location_options = ", ".join([f'"{loc}"' for loc in catalog.locations.keys()])
+    return (
         "You are a smart home controller. "
-        "Interpret the user's natural language request and return ONLY a valid JSON object. "
-        "Determine if the request matches a known lighting scene OR describes a color. "
+        "Interpret the user's natural language request and extract structured information. "
+        "Return the output as a JSON object. "
+        "Determine if the request matches a known lighting scene, a device control command, or describes a color. "
         "If it matches a scene name, set intent to 'trigger_scene' "
         "and include 'scene_name' and 'location' fields. "
         f"scene_name must be one of: {scene_name_options}. "
         f"location must be one of: {location_options}. "
+        "If it is a command to control devices via IFTTT (e.g., 'Turn on the AC'), set intent to 'trigger_ifttt' and include 'device' and 'command' fields, where 'command' is either 'on' or 'off'. "
         "If it describes a color (e.g., 'warm orange', 'deep blue'), set intent to 'set_color' and include "
         "'location', 'hue' (0-360), 'sat' (0-254), and 'bri' (0-254) fields. "
+        "If it is a command to control devices via IFTTT (e.g., 'Turn on the AC'), set intent to 'trigger_ifttt' and include 'device' and 'command' fields, where 'command' is either 'on' or 'off'. "
         "Always normalize scene names to lowercase. "
-        "Do not include any explanation or extra text, only return valid JSON.\n\n"
-        + SYSTEM_PROMPT_CONTEXT
+        + MULTI_ACTION_PROMPT
+        + "\n\n" + SYSTEM_PROMPT_CONTEXT
     )
-    user_prompt = f"Request: {text}"
-    
-    # Call OpenAI API
-    try:
-        # Use response_format to ensure we get valid JSON
-        response = client.chat.completions.create(
-            model="o4-mini-2025-04-16",  # Pinned to specific snapshot for consistency
+
+async def complete_intent(client, model, system_prompt, user_prompt, timeout):
+    """
+    One OpenAI completion attempt for parse_text, decoded into an intent object.
+
+    Raises:
+        ParseError: If the completion has no usable content or isn't a JSON object
+    """
+    # Use response_format to ensure we get valid JSON
+    # This is more reliable than parsing from content directly
+    with StageTimer("llm"):
+        response = await client.chat.completions.create(
+            model=model,  # Pinned snapshots (LLM_STRONG_MODEL / LLM_FAST_MODEL) for consistency
             messages=[
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_prompt}
             ],
             response_format={"type": "json_object"},  # Explicitly request JSON output
             temperature=1,  # Lower temperature for more predictable responses
-            timeout=15  # Explicit timeout for cloud environments
+            timeout=timeout  # The time left of the request's deadline
         )
+    
+    # Log full raw response for debugging
+    logging.info(f"Full OpenAI response: {response}")
+    
+    # Check if we have a valid response with content
+    if not response.choices or len(response.choices) == 0:
+        error_msg = "OpenAI API returned empty choices"
+        logging.error(error_msg)
+        raise ParseError(error_msg, raw_response=str(response))
+    
+    # Check if message exists and has content
+    message = response.choices[0].message
+    if not hasattr(message, 'content') or message.content is None:
+        error_msg = "OpenAI API response missing content field"
+        logging.error(error_msg)
+        raise ParseError(error_msg, raw_response=str(response))
+    
+    content = message.content.strip()
+    logging.info(f"OpenAI response content: {content}")
+    
+    if not content:
+        error_msg = "OpenAI API returned empty content"
+        logging.error(error_msg)
+        raise ParseError(error_msg, raw_response=str(response))
+    
+    # Validate JSON response - this should be more reliable now with response_format,
+    # with a defensive JSON string fix as the final attempt
+    try:
+        parsed = decode_llm_json(content)
+    except json.JSONDecodeError as json_err:
+        raise ParseError(f"Failed to parse JSON from OpenAI response: {str(json_err)}", raw_content=content)
+    if not isinstance(parsed, dict):
+        raise ParseError("OpenAI API returned a non-object JSON value", raw_content=content)
+    return parsed
+
+
+# Words of the current scene and location names, for ModelRouter.choose()
+_catalog_words = (None, frozenset())
+
+
+def catalog_words():
+    global _catalog_words
+    catalog = current_catalog()
+    if _catalog_words[0] != catalog.version:
+        names = list(catalog.scenes.keys()) + list(catalog.locations.keys())
+        _catalog_words = (catalog.version, frozenset(word for name in names for word in normalize_text(name).split()))
+    return _catalog_words[1]
+
+
+def choose_model(text):
+    model = model_router.choose(text, catalog_words())
+    annotate(model=model)
+    return model
+
+
+async def llm_parse(text, model, deadline):
+    """
+    One hedged, non-streamed OpenAI parse with model, reported to the model router.
+
+    Returns:
+        tuple: (parsed, problems) where problems lists why the answer fails validation
+
+    Raises:
+        DeadlineExceeded: If no attempt succeeded within deadline seconds
+        ParseError: If every attempt returned no usable JSON object
+    """
+    # Retries and hedges are made by the model's requester, within the deadline
+    client = get_openai_client().with_options(max_retries=0)
+    system_prompt = build_parse_system_prompt()
+    user_prompt = f"Request: {text}"
+    start = time.perf_counter()
+    try:
+        parsed = await requester_for(model).call(
+            lambda timeout: complete_intent(client, model, system_prompt, user_prompt, timeout),
+            deadline=max(0.001, deadline)
+        )
+    except Exception:
+        model_router.record(model, time.perf_counter() - start, valid=False)
+        raise
+    if parsed:
+        parsed = normalize_parsed(parsed)
+    problems = parse_problems(parsed)
+    model_router.record(model, time.perf_counter() - start, valid=not problems)
+    return parsed, problems
+
+
+async def parse_text(text):
+    """
+    Parse text into intents: the local grammar, then the intent cache, then OpenAI.
+
+    OpenAI calls go through a HedgedRequester: a slow completion is hedged with a second
+    identical request, failed ones (errors, invalid JSON) are retried, and all attempts
+    share the LLM_DEADLINE_SECONDS budget. Short catalog-like requests are tried on the
+    fast model first (see model_router) and escalated to the strong model if its answer
+    fails validation.
+
+    Args:
+        text: Natural language command
+
+    Returns:
+        ParseResult: The parsed intent(s) and the path that produced them
+
+    Raises:
+        ParseError: If OpenAI returns no usable JSON object within the deadline
+    """
+    # Simple device and scene commands are parsed locally or served from the cache
+    fast = parse_without_llm(text)
+    if fast:
+        parsed, parse_path, confidence = fast
+        logging.info(f"Parsed via {parse_path} without OpenAI: {text}")
+        return record_parse(ParseResult(parsed=parsed, parse_path=parse_path, confidence=confidence))
+
+    ends_at = time.perf_counter() + LLM_DEADLINE_SECONDS
+    model = choose_model(text)
+    try:
+        if model != model_router.strong_model:
+            try:
+                parsed, problems = await llm_parse(text, model, min(LLM_FAST_DEADLINE_SECONDS, LLM_DEADLINE_SECONDS))
+            except (DeadlineExceeded, ParseError) as e:
+                problems = [str(e)]
+            except Exception as e:
+                logging.warning(f"{model} completion failed: {e}")
+                problems = [str(e)]
+            if problems:
+                logging.info(f"Escalating to {model_router.strong_model}, {model} answer failed validation: {'; '.join(problems)}")
+                model = model_router.strong_model
+                annotate(model=model, escalated=True)
+        if model == model_router.strong_model:
+            parsed, problems = await llm_parse(text, model, ends_at - time.perf_counter())
+    except DeadlineExceeded as e:
+        raise ParseError(f"OpenAI did not return a usable completion in time: {e}", 504)
+
+    # Only answers that validate are cached
+    if parsed and not problems:
+        home().intent_cache.put(text, parsed)
+    return record_parse(ParseResult(parsed=parsed, parse_path="llm"))
+
+
+@app.post("/parse")
+async def parse(request: Request):
+    try:
+        data = await request.json()
+        logging.info(f"Received /parse request data: {data}")
+        text = data.get("text")
+        if not text:
+            return to_response(failure("Missing 'text' field"))
+        return to_response(await parse_text(text))
+    except ParseError as e:
+        return to_response(e.result)
+    except Exception as e:
+        logging.error(f"Exception in /parse endpoint: {e}")
+        return JSONResponse(content={"error": str(e)}, status_code=500)
+
+
+async def run_smart_control_from_text(text):
+    """
+    Simulate the full smart control flow using natural language input, through the same
+    parse and dispatch pipeline as /execute.
+    
+    Args:
+        text: Natural language command (e.g., "Make the bedroom a warm orange")
         
-        # Check if we have a valid response with content
-        if not response.choices or len(response.choices) == 0:
-            error_msg = "OpenAI API returned empty choices"
-            print(f"Error: {error_msg}")
-            return JSONResponse(content={"error": error_msg, "raw_response": str(response)}, status_code=500)
-            
-        # Check if message exists and has content
-        message = response.choices[0].message
-        if not hasattr(message, 'content') or message.content is None:
-            error_msg = "OpenAI API response missing content field"
-            print(f"Error: {error_msg}")
-            return JSONResponse(content={"error": error_msg, "raw_response": str(response)}, status_code=500)
-            
-        content = message.content.strip()
-        
-        if not content:
-            error_msg = "OpenAI API returned empty content"
-            print(f"Error: {error_msg}")
-            return JSONResponse(content={"error": error_msg, "raw_response": str(response)}, status_code=500)
-        
-        # Extract and parse response
-        try:
-            parsed_data = json.loads(content)
-            print("Parsed command data:")
-            print(json.dumps(parsed_data, indent=2))
-            
-            # Handle the intent
-            intent = parsed_data.get("intent")
-            if intent == "set_color":
-                result = await handle_set_color(parsed_data)
-                print("Result of set_color operation:")
-                print(result.body.decode())
-                return result
-            elif intent == "trigger_scene":
-                result = handle_trigger_scene(parsed_data)
-                print("Result of trigger_scene operation:")
-                print(result.body.decode())
-                return result
-            elif intent == "trigger_ifttt":
-                result = await handle_ifttt_trigger(parsed_data)
-                print("Result of trigger_ifttt operation:")
-                print(result)
-                return result
-            elif intent == "lg_tv_control":
-                result = await handle_lg_tv_control(parsed_data)
-                print("Result of lg_tv_control operation:")
-                print(result)
-                return result
-            else:
-                print(f"Unknown intent: {intent}")
-                return JSONResponse(content={"error": "Unknown intent"}, status_code=400)
-        except json.JSONDecodeError as json_err:
-            error_msg = f"Failed to parse JSON from OpenAI response: {str(json_err)}"
-            print(f"Error: {error_msg}")
-            print(f"Raw response: {content}")
-            return JSONResponse(
-                content={
-                    "error": error_msg,
-                    "raw_content": content
-                },
-                status_code=500
-            )
+    Returns:
+        ActionResult: Result of the control operation
+    """
+    print(f"Processing command: '{text}'")
+    try:
+        parsed = await parse_text(text)
+    except ParseError as e:
+        print(f"Error: {e}")
+        return e.result
     except Exception as e:
         print(f"Error processing command: {str(e)}")
-        return JSONResponse(content={"error": str(e)}, status_code=500)
+        return failure(str(e), 500)
+
+    print(f"Parsed via {parsed.parse_path}:")
+    print(json.dumps(parsed.parsed, indent=2))
+    result = await execute_actions(parsed.parsed)
+    print(f"Result ({result.status_code}):")
+    print(json.dumps(result.body, indent=2))
+    return result
+
+
+async def stream_parse_intent(text, on_action=None, model=None, deadline=None):
+    """
+    Parse text with a streamed OpenAI completion, returning as soon as the fields
+    required by the detected intent's handler are complete.
+
+    The stream is closed early once a single intent is dispatchable, so the caller doesn't
+    wait on the tail of the completion. For a multi-action completion the whole object is
+    read, but on_action(index, action) is called as each action closes so it can start
+    while later actions are still being generated.
+
+    Args:
+        text: Natural language command
+        on_action: Optional callable (index, action) invoked once per dispatchable action
+        model: OpenAI model (defaults to the router's strong model)
+        deadline: Seconds the whole stream may take, from the request to the last chunk
+                  read (defaults to LLM_DEADLINE_SECONDS)
+
+    Returns:
+        tuple: (parsed, complete) where parsed is the intent or {"actions": [...]} for
+               several actions, and complete is False if the stream was closed early and
+               parsed holds only the fields read so far
+
+    Raises:
+        DeadlineExceeded: If the stream isn't done within deadline
+        ValueError: If the completion is empty or not valid JSON
+    """
+    deadline = max(0.001, deadline or LLM_DEADLINE_SECONDS)
+    parser = IncrementalJSONObject()
+    emitted = 0
+    # A single attempt: the SDK's own retries would each get the full timeout
+    client = get_openai_client().with_options(max_retries=0)
+
+    async def read_stream():
+        nonlocal emitted
+        stream = await client.chat.completions.create(
+            model=model or model_router.strong_model,
+            messages=[
+                {"role": "system", "content": build_parse_system_prompt()},
+                {"role": "user", "content": f"Request: {text}"}
+            ],
+            response_format={"type": "json_object"},
+            temperature=1,
+            timeout=deadline,
+            stream=True
+        )
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                parser.feed(delta)
+                # Hand over completed actions in order; one that isn't dispatchable yet holds
+                # back the ones after it so actions on the same target keep their order
+                while emitted < len(parser.items) and ready_intent(parser.items[emitted]):
+                    if on_action:
+                        on_action(emitted, parser.items[emitted])
+                    emitted += 1
+                if "actions" not in parser.fields and ready_intent(parser.fields, complete=False):
+                    logging.info(f"Intent fields complete, dispatching early: {parser.fields}")
+                    timer.outcome = "early"
+                    if on_action:
+                        on_action(0, dict(parser.fields))
+                    return
+                if parser.complete:
+                    return
+        finally:
+            await stream.close()
+
+    with StageTimer("llm") as timer:
+        # The timeout above bounds each read; this bounds the stream as a whole
+        try:
+            await asyncio.wait_for(read_stream(), deadline)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"stream not finished within {deadline:.1f}s")
+
+    complete = parser.complete
+    if not complete and "actions" not in parser.fields and ready_intent(parser.fields, complete=False):
+        parsed = dict(parser.fields)
+    else:
+        content = parser.text.strip()
+        if not content:
+            raise ValueError("OpenAI API returned empty content")
+        parsed = decode_llm_json(content)
+    if not isinstance(parsed, dict):
+        raise ValueError(f"OpenAI API returned a non-object JSON value: {parser.text}")
+    if parsed:
+        parsed = normalize_parsed(parsed)
+    return parsed, complete
+
+
+async def stream_llm_parse(text, dispatcher):
+    """
+    Parse text with a streamed completion from the routed model, dispatching actions to
+    dispatcher as they complete.
+
+    The stream gets LLM_DEADLINE_SECONDS in all (LLM_FAST_DEADLINE_SECONDS for the fast
+    model). A fast-model answer that fails validation or misses its deadline before
+    anything was dispatched is escalated to a (non-streamed, hedged) strong-model parse
+    within the rest of the deadline.
+
+    Only a stream read to the end whose object validates is cached; a single intent
+    dispatched from the fields read before the stream was closed early is not.
+
+    Returns:
+        ParseResult: The parsed intent(s), path "llm_stream" (or "llm" if escalated)
+
+    Raises:
+        ParseError: If the stream fails (with the results of any actions it had already
+                    dispatched, once they have finished)
+    """
+    ends_at = time.perf_counter() + LLM_DEADLINE_SECONDS
+    model = choose_model(text)
+    start = time.perf_counter()
+    try:
+        deadline = ends_at - time.perf_counter()
+        if model != model_router.strong_model:
+            deadline = min(LLM_FAST_DEADLINE_SECONDS, deadline)
+        parsed, complete = await stream_parse_intent(text, on_action=dispatcher.dispatch, model=model, deadline=deadline)
+        problems = parse_problems(parsed)
+    except Exception as e:
+        model_router.record(model, time.perf_counter() - start, valid=False)
+        if len(dispatcher):
+            # Actions from the partial completion are already running: report them with the error
+            results = await dispatcher.results()
+            raise ParseError(f"OpenAI stream failed after {len(results)} action(s) were dispatched: {e}", 502, results=results)
+        if isinstance(e, DeadlineExceeded) and model == model_router.strong_model:
+            raise ParseError(f"OpenAI did not return a usable completion in time: {e}", 504)
+        if model == model_router.strong_model:
+            raise ParseError(f"OpenAI stream failed: {e}", 502)
+        parsed, problems, complete = None, [str(e)], False
+    else:
+        model_router.record(model, time.perf_counter() - start, valid=not problems)
+
+    if problems and model != model_router.strong_model and not len(dispatcher):
+        logging.info(f"Escalating to {model_router.strong_model}, {model} answer failed validation: {'; '.join(problems)}")
+        annotate(model=model_router.strong_model, escalated=True)
+        try:
+            parsed, problems = await llm_parse(text, model_router.strong_model, ends_at - time.perf_counter())
+        except DeadlineExceeded as e:
+            raise ParseError(f"OpenAI did not return a usable completion in time: {e}", 504)
+        if parsed and not problems:
+            home().intent_cache.put(text, parsed)
+        return ParseResult(parsed=parsed, parse_path="llm")
+
+    if parsed and not problems and complete:
+        home().intent_cache.put(text, parsed)
+    return ParseResult(parsed=parsed, parse_path="llm_stream")
+
+
+async def call_intent_handler(data):
+    """
+    Validate one parsed action and run its intent's handler, timed as the dispatch stage.
+
+    Returns:
+        ActionResult: The handler's result (a 400 if the action is invalid), or None for an unknown intent
+    """
+    action, invalid = validate_action(data)
+    if invalid:
+        return invalid
+    handler = INTENT_HANDLERS.get(action.intent)
+    if handler is None:
+        return None
+    with StageTimer("dispatch", action.intent, location_label(action.location)) as timer:
+        result = await handler(action)
+        timer.outcome = outcome_for_status(result.status_code)
+    add_dispatch(data, result.status_code)
+    return result
+
+
+async def execute_parsed_intent(parsed_data):
+    """
+    Dispatch a parsed intent to its handler.
+    """
+    # Now execute the command based on the intent.
+    let_intent = parsed_data.get("intent")
+    if not let_intent or (isinstance(let_intent, str) and let_intent.strip() == ""):
+        if parsed_data.get("device") and parsed_data.get("command"):
+            parsed_data["intent"] = "trigger_ifttt"
+    result = await call_intent_handler(parsed_data)
+    if result is not None:
+        return result
+    else:
+        return failure("Unknown intent. Ensure the command specifies a valid intent (e.g., 'set_color', 'trigger_scene', 'trigger_ifttt', or 'lg_tv_control'). If you intended to trigger IFTTT, also include a valid 'device' and 'command'.", 400, parsed_data=parsed_data)
+
+
+async def run_action(action):
+    result = await execute_parsed_intent(dict(action))
+    return result.status_code, result.body
+
+
+async def execute_actions(parsed_data, dispatcher=None):
+    """
+    Execute every action in a parse result, concurrently across targets and in order per target.
+
+    Args:
+        parsed_data: A single intent or {"actions": [...]}
+        dispatcher: ActionDispatcher that may already be running some of the actions
+
+    Returns:
+        ActionResult: A single action's result unchanged, or for several actions
+                      {"results": [...], "total_ms": ...} with each action's status, body and timing
+    """
+    actions = split_actions(parsed_data)
+    if not actions:
+        return await execute_parsed_intent(parsed_data or {})
+    if dispatcher is None:
+        dispatcher = ActionDispatcher(run_action)
+    for index, action in enumerate(actions):
+        dispatcher.dispatch(index, action)
+    results = await dispatcher.results()
+    if len(results) == 1:
+        return ActionResult(status_code=results[0]["status_code"], body=results[0]["result"])
+    total_ms = round((time.perf_counter() - dispatcher.started_at) * 1000, 1)
+    return success(results=results, total_ms=total_ms)
 
 
 @app.post("/execute")
@@ -739,51 +1411,376 @@ async def execute_command(request: Request):
     Combined endpoint that parses natural language and executes the command.
     This endpoint first parses the text to structured data, then calls the appropriate
     handler to execute the command.
+
+    With streaming enabled ("stream" in the body, default PARSE_STREAMING), the
+    OpenAI completion is streamed and the handler runs as soon as the intent's
+    required fields have arrived. Commands with several actions start each action
+    as soon as it has been generated; see execute_actions for the response shape.
+
+    Repeats of a command already running, and retries with the same Idempotency-Key
+    header, get its result instead of running again (see run_deduplicated).
     """
     try:
         data = await request.json()
         text = data.get("text")
         if not text:
-            return JSONResponse(content={"error": "Missing 'text' field"}, status_code=400)
-        
-        # First parse the text
-        body_bytes = await request.body()
-        async def new_receive():
-            return {"type": "http.request", "body": body_bytes}
-        new_req = Request(request.scope, new_receive)
-        parse_response = await parse(new_req)
-        
-        # Check if parsing was successful
-        if isinstance(parse_response, JSONResponse):
-            if parse_response.status_code != 200:
-                return parse_response
-            
-            # Extract the parsed data
-            parsed_data = parse_response.body
-            if isinstance(parsed_data, bytes):
-                parsed_data = json.loads(parsed_data.decode())
-            
-            # Now execute the command based on the intent.
-            let_intent = parsed_data.get("intent")
-            if not let_intent or (isinstance(let_intent, str) and let_intent.strip() == ""):
-                if parsed_data.get("device") and parsed_data.get("command"):
-                    parsed_data["intent"] = "trigger_ifttt"
-            intent = parsed_data.get("intent")
-            if intent == "set_color":
-                return await handle_set_color(parsed_data)
-            elif intent == "trigger_scene":
-                return handle_trigger_scene(parsed_data)
-            elif intent == "trigger_ifttt":
-                return await handle_ifttt_trigger(parsed_data)
-            elif intent == "lg_tv_control":
-                return await handle_lg_tv_control(parsed_data)
-            else:
-                return JSONResponse(content={"error": "Unknown intent. Ensure the command specifies a valid intent (e.g., 'set_color', 'trigger_scene', 'trigger_ifttt', or 'lg_tv_control'). If you intended to trigger IFTTT, also include a valid 'device' and 'command'.", "parsed_data": parsed_data}, status_code=400)
-        else:
-            return JSONResponse(content={"error": "Failed to parse command"}, status_code=500)
+            return to_response(failure("Missing 'text' field"))
+        # The same words from a second device are the same command
+        return await run_deduplicated(request, data, normalize_text(text), lambda: execute_text(text, data.get("stream", PARSE_STREAMING)))
     except Exception as e:
         return JSONResponse(content={"error": f"Error executing command: {str(e)}"}, status_code=500)
 
+
+async def execute_text(text, stream):
+    """
+    Parse and execute one /execute command.
+
+    Returns:
+        tuple: (ActionResult, parse path or None if parsing failed)
+    """
+    try:
+        if stream:
+            dispatcher = ActionDispatcher(run_action)
+            fast = parse_without_llm(text)
+            if fast:
+                parsed_data, parse_path, confidence = fast
+                parsed = ParseResult(parsed=parsed_data, parse_path=parse_path, confidence=confidence)
+            else:
+                parsed = await stream_llm_parse(text, dispatcher)
+            record_parse(parsed)
+            logging.info(f"/execute parsed via {parsed.parse_path}: {parsed.parsed}")
+            return await execute_actions(parsed.parsed, dispatcher), parsed.parse_path
+
+        # Parsed in process: the intents are passed on as objects, not re-read from a response
+        parsed = await parse_text(text)
+        return await execute_actions(parsed.parsed), parsed.parse_path
+    except ParseError as e:
+        return e.result, None
+
+
+# Progress event pushed on /ws when an action's handler returns, by intent
+ACTION_EVENTS = {
+    "set_color": "bridge_acknowledged",
+    "trigger_scene": "bridge_acknowledged",
+    "trigger_ifttt": "ifttt_queued",
+    "lg_tv_control": "tv_acknowledged"
+}
+
+
+async def run_ws_command(command, emit):
+    """
+    Run one /ws command in one of its home's request slots, like an HTTP request
+    (an error event with status 429 if the home is over its limits).
+    """
+    try:
+        async with home().admit():
+            await dispatch_ws_command(command, emit)
+    except HomeBusy as e:
+        await emit("error", status_code=429, error=str(e))
+
+
+async def dispatch_ws_command(command, emit):
+    """
+    Run one /ws command through the /execute (text) or /control (structured) pipeline,
+    emitting parsed, dispatched, per-action (bridge_acknowledged, ifttt_queued, tv_acknowledged or handled)
+    and done events, then ifttt_delivered for each webhook once the queue has sent it.
+    """
+    pending = []
+    deliveries = []
+
+    def on_start(index, action):
+        pending.append(asyncio.ensure_future(emit("dispatched", index=index, intent=action.get("intent"))))
+
+    def on_done(result):
+        event = ACTION_EVENTS.get(result["intent"], "handled")
+        fields = {key: result[key] for key in ("index", "status_code", "result", "elapsed_ms")}
+        pending.append(asyncio.ensure_future(emit(event, **fields)))
+        queue_id = result["result"].get("queue_id") if result["intent"] == "trigger_ifttt" else None
+        if result["status_code"] < 400 and queue_id is not None:
+            deliveries.append((result["index"], queue_id, ifttt_dispatcher.watch(queue_id)))
+
+    dispatcher = ActionDispatcher(run_action, on_start=on_start, on_done=on_done)
+    try:
+        text = command.get("text")
+        if text:
+            fast = parse_without_llm(text)
+            if fast:
+                parsed_data, parse_path, confidence = fast
+                parsed = ParseResult(parsed=parsed_data, parse_path=parse_path, confidence=confidence)
+            elif PARSE_STREAMING:
+                parsed = await stream_llm_parse(text, dispatcher)
+            else:
+                parsed = await parse_text(text)
+            record_parse(parsed)
+            await emit("parsed", parse_path=parsed.parse_path, parsed=parsed.parsed)
+            parsed_data = parsed.parsed
+        elif "intent" in command or "actions" in command:
+            parsed_data = command
+        else:
+            await emit("error", status_code=400, error="Missing 'text' field")
+            return
+        result = await execute_actions(parsed_data, dispatcher)
+    except ParseError as e:
+        await emit("error", status_code=e.result.status_code, **e.result.body)
+        return
+    finally:
+        if pending:
+            await asyncio.gather(*pending)
+    await emit("done", status_code=result.status_code, body=result.body)
+
+    for index, queue_id, delivery in deliveries:
+        outcome = await delivery
+        await emit("ifttt_delivered", index=index, queue_id=queue_id, **outcome)
+
+
+# One connection per voice client instead of an HTTPS request per utterance
+ws_channels = CommandChannels(run_ws_command, max_in_flight=int(os.getenv("WS_MAX_IN_FLIGHT", "8")))
+
+
+@app.websocket("/ws")
+async def command_channel(websocket: WebSocket):
+    """
+    Persistent command channel: send text ({"id": ..., "text": ...} or a plain string) or
+    structured commands (an intent object or {"actions": [...]}), and receive progress
+    events for each as it happens. See CommandChannels for the protocol.
+    """
+    await ws_channels.serve(websocket)
+
+
+@app.get("/ws/stats")
+async def ws_stats():
+    """
+    Report /ws connections (open and total) and the commands, events and errors handled.
+    """
+    return ws_channels.stats()
+
+
+async def run_scheduled_action(action):
+    """Run an automation step in the home that scheduled it (tagged "home" by create_automation)."""
+    scheduled_home = homes.get(action.pop("home", None))
+    if scheduled_home is None:
+        return 404, {"error": "The automation's home is no longer configured"}
+    token = current_home.set(scheduled_home)
+    try:
+        return await run_action(action)
+    finally:
+        current_home.reset(token)
+
+
+def home_jobs():
+    """The current home's scheduled automations."""
+    return [job for job in automation_scheduler.jobs() if job["steps"][0]["action"].get("home") == home().id]
+
+
+# Timed routines (sunrise, fades) and delayed actions, persisted across restarts
+automation_scheduler = AutomationScheduler(run_scheduled_action, path=os.getenv("AUTOMATIONS_PATH", DEFAULT_AUTOMATIONS_PATH))
+
+
+@app.post("/automations")
+async def create_automation(request: Request):
+    """
+    Schedule a routine ({"routine": "sunrise" | "sleep" | "fade", "location": ...}), a single
+    action ({"action": {...}}) or explicit steps ({"steps": [{"offset": s, "action": {...}}]}),
+    starting at "at" (Unix time, ISO time or "HH:MM") or "in_seconds" from now, and repeating
+    every "every_seconds" if given. Actions may carry "transition_seconds" so the bridge fades
+    to the new state itself.
+    """
+    try:
+        data = await request.json()
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        start = parse_when(data.get("at"), data.get("in_seconds"))
+        every = data.get("every_seconds")
+        steps = build_steps(data)
+        for step in steps:
+            step["action"] = {**step["action"], "home": home().id}
+        job = automation_scheduler.add(
+            steps,
+            start,
+            every=float(every) if every is not None else None,
+            name=data.get("name") or data.get("routine")
+        )
+        return job
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+
+
+@app.get("/automations")
+async def list_automations():
+    """
+    List the home's scheduled jobs by due time, with the scheduler's fired, failed and
+    skipped counts and firing lag (across all homes).
+    """
+    return {"jobs": home_jobs(), **automation_scheduler.stats()}
+
+
+@app.delete("/automations/{job_id}")
+async def delete_automation(job_id: str):
+    """
+    Cancel one of the home's scheduled jobs.
+    """
+    job = automation_scheduler.get(job_id)
+    if job is None or job["steps"][0]["action"].get("home") != home().id or not automation_scheduler.cancel(job_id):
+        return JSONResponse(content={"error": f"Unknown automation: {job_id}"}, status_code=404)
+    return {"cancelled": job_id}
+
+
+@app.get("/dedup")
+async def dedup_stats():
+    """
+    Report /execute and /control deduplication: commands run, identical requests that
+    shared a run, and Idempotency-Key results stored, replayed and conflicting.
+    """
+    return {"single_flight": single_flight.stats(), "idempotency": idempotency_store.stats()}
+
+
+@app.get("/homes")
+async def homes_status():
+    """
+    Report every home this process serves: its bridge, catalog, whether IFTTT and TVs are
+    configured, requests in flight and waiting against its concurrency limit, and its
+    request, error and rejection counts and latency (p50/p99).
+    """
+    return {"default": homes.default_id, "homes": homes.stats()}
+
+
+@app.get("/state")
+async def bridge_state(type: str = None):
+    """
+    Read-only view of the mirrored bridge state (grouped_light, light and scene resources),
+    served from memory without contacting the bridge. Filter with ?type=grouped_light.
+    """
+    current = home()
+    if type and type not in current.state_mirror.resources:
+        return JSONResponse(content={"error": f"Unknown resource type: {type}"}, status_code=400)
+    return {
+        **current.state_mirror.snapshot(type),
+        "eventstream": {"connects": current.hue_events.connects, "last_error": current.hue_events.last_error}
+    }
+
+
+@app.get("/scheduler")
+async def scheduler_stats():
+    """
+    Report bridge command scheduler counters: queue depth per group, coalesced drops and
+    time spent waiting on the per-resource-type rate limits.
+    """
+    return home().hue_scheduler.stats()
+
+
+@app.get("/healthz")
+async def healthz():
+    """
+    Readiness: 200 once the background warm-up has finished (503 until then), with the
+    cold start broken down into import phases, warm-up results and the first successful
+    request per route.
+    """
+    status = startup.status()
+    return JSONResponse(content=status, status_code=200 if status["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage latency histograms (llm, json_decode, fast_parse, dispatch,
+    bridge, scene_compile, webhook) labelled by intent, location and outcome, plus request
+    latency by route.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/ifttt")
+async def ifttt_status():
+    """
+    Report the IFTTT webhook queue: depth, in-flight deliveries, delivery latency,
+    retries, deduplicated submits and recent failures.
+    """
+    return ifttt_dispatcher.stats()
+
+
+@app.get("/tv")
+async def tv_status():
+    """
+    Report each LG TV's webOS session: connected, paired, reconnects, commands, errors
+    and command round-trip latency (p50/p95/p99).
+    """
+    return {name: tv.stats() for name, tv in home().tvs.items()}
+
+
+@app.get("/capture")
+async def capture_status():
+    """
+    Report request capture: whether it is enabled, the sample rate and the recorded,
+    written and dropped entry counts.
+    """
+    return {"enabled": CAPTURE_ENABLED, **capture_writer.stats()}
+
+
+@app.get("/scenes/compiled")
+async def compiled_scenes():
+    """
+    Report the looks compiled into bridge scenes and the compiler's hit/create/evict counters.
+    """
+    return {"enabled": SCENE_COMPILER_ENABLED, **home().scene_compiler.stats()}
+
+
+@app.get("/scenes/recommend")
+async def recommend_scene(text: str):
+    """
+    Show which scene a mood or colour request would be answered with, its look distance
+    and confidence, the look read from the request and the runners-up.
+    """
+    catalog = current_catalog()
+    recommendation = catalog.recommender.recommend(text, catalog.locations.keys())
+    if recommendation is not None:
+        recommendation["used"] = SCENE_RECOMMEND_ENABLED and recommendation["confidence"] >= SCENE_RECOMMEND_MIN_CONFIDENCE
+    return {"recommendation": recommendation, "min_confidence": SCENE_RECOMMEND_MIN_CONFIDENCE}
+
+
+@app.get("/catalog")
+async def catalog_status():
+    """
+    Report the current scene/location catalog and the state of the background bridge sync.
+    """
+    return home().catalog_sync.status()
+
+
+@app.post("/catalog/sync")
+async def catalog_sync_now():
+    """
+    Sync the catalog from the bridge immediately instead of waiting for the next poll.
+    """
+    try:
+        sync = home().catalog_sync
+        changed = await sync.sync_once()
+        return {"changed": changed, **sync.status()}
+    except httpx.HTTPError as e:
+        return JSONResponse(content={"error": f"Failed to sync catalog from Hue Bridge: {str(e)}"}, status_code=502)
+
+
+@app.get("/parse/stats")
+async def parse_stats():
+    """
+    Report how /parse and /execute requests were answered (local grammar, intent
+    cache, scene recommender, OpenAI or streamed OpenAI), the intent cache counters, the OpenAI hedging
+    counters per model (hedge rate, hedge wins, retries, deadline misses and p50/p99
+    latency with hedging against the first attempt alone) and the model router's
+    routing, escalation and per-model latency and validation-failure counters.
+    """
+    total = sum(PARSE_PATH_COUNTS.values())
+    return {
+        "paths": dict(PARSE_PATH_COUNTS),
+        "llm_calls_avoided": PARSE_PATH_COUNTS["local"] + PARSE_PATH_COUNTS["cache"] + PARSE_PATH_COUNTS["recommend"],
+        "llm_share": round((PARSE_PATH_COUNTS["llm"] + PARSE_PATH_COUNTS["llm_stream"]) / total, 4) if total else 0.0,
+        "cache": home().intent_cache.stats(),
+        "llm": {model: requester.stats() for model, requester in llm_requesters.items()},
+        "router": model_router.stats()
+    }
+
+
+# Module-level setup (catalog, caches, clients, routes) is done
+startup.mark("setup")
+
 if __name__ == "__main__":
     import asyncio
     
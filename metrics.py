@@ -0,0 +1,179 @@
+import asyncio
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+# Latency buckets in seconds: from local parses (~ms) up to slow LLM completions
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Per-request list of (stage, seconds) for the Server-Timing header; unset outside requests
+_request_timings = ContextVar("request_timings", default=None)
+
+
+class Histogram:
+    """
+    Minimal Prometheus-style histogram with a fixed label set.
+
+    observe() is a bisect and three additions, so it is cheap enough for the request path.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count], sum
+        self._series = {}
+
+    def observe(self, value, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, (counts, total) in sorted(self._series.items()):
+            labels = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, label_values))
+            prefix = f"{labels}," if labels else ""
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{labels}}} {total}")
+            lines.append(f"{self.name}_count{{{labels}}} {cumulative}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+STAGE_SECONDS = Histogram(
+    "jarvis_stage_seconds",
+    "Time spent in each processing stage (llm, json_decode, fast_parse, dispatch, bridge, scene_compile, webhook).",
+    ("stage", "intent", "location", "outcome")
+)
+REQUEST_SECONDS = Histogram(
+    "jarvis_request_seconds",
+    "HTTP request latency by path and status code.",
+    ("method", "path", "status")
+)
+
+HOME_REQUEST_SECONDS = Histogram(
+    "jarvis_home_request_seconds",
+    "HTTP request latency per home by outcome.",
+    ("home", "outcome")
+)
+
+AUTOMATION_LAG_SECONDS = Histogram(
+    "jarvis_automation_lag_seconds",
+    "Delay between a scheduled automation step's due time and when it ran.",
+    ("intent",)
+)
+
+
+def observe_stage(stage, seconds, intent=None, location=None, outcome="ok"):
+    """Record one stage duration in the histogram and the current request's Server-Timing."""
+    STAGE_SECONDS.observe(seconds, stage, intent or "", (location or "").lower(), outcome)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+class StageTimer:
+    """
+    Time a block as one stage: `with StageTimer("bridge", intent="set_color", location=loc) as s:`.
+
+    The outcome is "error" if the block raises ("cancelled" if it is cancelled), otherwise
+    "ok" unless the block sets s.outcome (or s.intent / s.location, e.g. once an LLM result
+    has been decoded).
+    """
+
+    __slots__ = ("name", "intent", "location", "outcome", "_start")
+
+    def __init__(self, name, intent=None, location=None):
+        self.name = name
+        self.intent = intent
+        self.location = location
+        self.outcome = "ok"
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is asyncio.CancelledError:
+            # e.g. the losing request of a hedged pair
+            self.outcome = "cancelled"
+        elif exc_type is not None:
+            self.outcome = "error"
+        observe_stage(self.name, time.perf_counter() - self._start, self.intent, self.location, self.outcome)
+        return False
+
+
+def outcome_for_status(status_code):
+    if status_code < 400:
+        return "ok"
+    return "client_error" if status_code < 500 else "error"
+
+
+def current_timings():
+    """Return the (stage, seconds) list collected so far for the current request, or None."""
+    return _request_timings.get()
+
+
+def server_timing(timings, seconds):
+    """Format stage timings and the total as a Server-Timing header value."""
+    parts = [f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in timings]
+    parts.append(f"total;dur={seconds * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that collects stage timings per request, adds them to the response
+    as a Server-Timing header and records the request latency by route.
+
+    A plain ASGI wrapper rather than BaseHTTPMiddleware, so it adds no extra task or
+    response buffering to each request. on_request(method, path, status, seconds), if
+    given, is called after each request with the same labels.
+    """
+
+    def __init__(self, app, on_request=None):
+        self.app = app
+        self.on_request = on_request
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                header = server_timing(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            # Label by route template to keep the label set bounded
+            path = getattr(scope.get("route"), "path", "unmatched")
+            seconds = time.perf_counter() - start
+            REQUEST_SECONDS.observe(seconds, scope["method"], path, str(status[0]))
+            if self.on_request is not None:
+                self.on_request(scope["method"], path, status[0], seconds)
+
+
+def render_metrics():
+    """Return every metric in the Prometheus text exposition format."""
+    return "\n".join(h.render() for h in (STAGE_SECONDS, REQUEST_SECONDS, HOME_REQUEST_SECONDS, AUTOMATION_LAG_SECONDS)) + "\n"
@@ -0,0 +1,166 @@
+from collections import deque
+
+from intent_cache import normalize_text
+
+DEFAULT_FAST_MODEL = "gpt-4.1-nano"
+DEFAULT_STRONG_MODEL = "o4-mini-2025-04-16"
+# Requests up to this many words (and without mood language) go to the fast model
+DEFAULT_MAX_WORDS = 8
+MIN_WORDS = 3
+MAX_WORDS = 16
+# Extra words allowed when the request names a known scene, location or device
+CATALOG_BONUS_WORDS = 4
+# Share of fast-model answers failing validation above which fewer requests are routed to it
+DEFAULT_TARGET_FAILURE_RATE = 0.1
+# Fast-model results per tuning step
+TUNE_WINDOW = 50
+# Per-model calls needed before latencies are compared; only this many most recent
+# calls are compared, so a model that got faster again is noticed quickly
+MIN_LATENCY_SAMPLES = 20
+LATENCY_WINDOW = 200
+# While the fast model is slower, every n-th simple request still goes to it, so its
+# latency keeps being measured and routing can switch back when it recovers
+PROBE_EVERY = 10
+
+# Descriptive, mood or comparative language that needs the reasoning model
+MOOD_WORDS = frozenset((
+    "feel", "feels", "feeling", "like", "mood", "vibe", "vibes", "vibey", "cozy", "cosy",
+    "romantic", "dreamy", "ambience", "ambiance", "atmosphere", "something", "kind", "sort",
+    "bit", "little", "more", "less", "warmer", "cooler", "brighter", "dimmer", "softer",
+    "similar", "reminds", "evoke", "aesthetic"
+))
+DEVICE_WORDS = frozenset(("tv", "ac", "curtains", "air", "conditioning", "lg", "television"))
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ModelRouter:
+    """
+    Choose the model for each LLM parse: a fast, cheap model for short catalog-like
+    commands ("turn off the TV", "read in the bedroom") and the reasoning model for
+    descriptive ones ("make it feel like a beach at dusk").
+
+    A request goes to the fast model when it has at most max_words words (plus
+    CATALOG_BONUS_WORDS if it names a known scene, location or device) and no mood
+    language. Callers report each call with record(); a fast-model answer that fails
+    validation is escalated to the strong model by the caller and counted as a failure.
+
+    Thresholds tune themselves: every TUNE_WINDOW fast-model results, max_words goes down
+    when the failure rate is above target_failure_rate and up when it is below half of
+    it. If the fast model stops being faster than the strong one, simple requests are
+    routed to the strong model until it is again, except for every PROBE_EVERY-th one.
+    """
+
+    def __init__(
+        self,
+        fast_model=DEFAULT_FAST_MODEL,
+        strong_model=DEFAULT_STRONG_MODEL,
+        max_words=DEFAULT_MAX_WORDS,
+        target_failure_rate=DEFAULT_TARGET_FAILURE_RATE
+    ):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.max_words = max_words
+        self.target_failure_rate = target_failure_rate
+        self.routed = {fast_model: 0, strong_model: 0}
+        self.escalations = 0
+        self.probes = 0
+        self._bypassed = 0
+        self._models = {}
+        self._window = []
+
+    def _model_stats(self, model):
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = {"calls": 0, "failures": 0, "latencies": deque(maxlen=LATENCY_WINDOW)}
+        return stats
+
+    def is_simple(self, text, catalog_words=()):
+        words = normalize_text(text).split()
+        if any(word in MOOD_WORDS for word in words):
+            return False
+        limit = self.max_words
+        if any(word in DEVICE_WORDS or word in catalog_words for word in words):
+            limit += CATALOG_BONUS_WORDS
+        return len(words) <= limit
+
+    def fast_is_faster(self):
+        fast = self._model_stats(self.fast_model)["latencies"]
+        strong = self._model_stats(self.strong_model)["latencies"]
+        if len(fast) < MIN_LATENCY_SAMPLES or len(strong) < MIN_LATENCY_SAMPLES:
+            return True
+        recent_fast = list(fast)[-MIN_LATENCY_SAMPLES:]
+        recent_strong = list(strong)[-MIN_LATENCY_SAMPLES:]
+        return _percentile(recent_fast, 0.5) < _percentile(recent_strong, 0.5)
+
+    def choose(self, text, catalog_words=()):
+        """
+        Return the model to try first for text.
+
+        Args:
+            text: The request text
+            catalog_words: Set of words from scene and location names, for spotting catalog-like requests
+        """
+        model = self.strong_model
+        if self.fast_model != self.strong_model and self.is_simple(text, catalog_words):
+            if self.fast_is_faster():
+                model = self.fast_model
+            else:
+                self._bypassed += 1
+                if self._bypassed % PROBE_EVERY == 0:
+                    model = self.fast_model
+                    self.probes += 1
+        self.routed[model] = self.routed.get(model, 0) + 1
+        return model
+
+    def record(self, model, seconds, valid):
+        """Record one call: its latency and whether the answer passed validation."""
+        stats = self._model_stats(model)
+        stats["calls"] += 1
+        stats["latencies"].append(seconds)
+        if not valid:
+            stats["failures"] += 1
+        if model == self.fast_model and model != self.strong_model:
+            if not valid:
+                self.escalations += 1
+            self._window.append(valid)
+            if len(self._window) >= TUNE_WINDOW:
+                self._tune()
+
+    def _tune(self):
+        failure_rate = self._window.count(False) / len(self._window)
+        if failure_rate > self.target_failure_rate:
+            self.max_words = max(MIN_WORDS, self.max_words - 1)
+        elif failure_rate < self.target_failure_rate / 2:
+            self.max_words = min(MAX_WORDS, self.max_words + 1)
+        self._window = []
+
+    def stats(self):
+        models = {}
+        for model, stats in self._models.items():
+            latencies = stats["latencies"]
+            models[model] = {
+                "calls": stats["calls"],
+                "failures": stats["failures"],
+                "failure_rate": round(stats["failures"] / stats["calls"], 4) if stats["calls"] else 0.0,
+                "latency_ms": {
+                    "p50": None if not latencies else round(_percentile(latencies, 0.5) * 1000, 1),
+                    "p95": None if not latencies else round(_percentile(latencies, 0.95) * 1000, 1)
+                }
+            }
+        return {
+            "fast_model": self.fast_model,
+            "strong_model": self.strong_model,
+            "max_words": self.max_words,
+            "routed": dict(self.routed),
+            "escalations": self.escalations,
+            "probes": self.probes,
+            "fast_is_faster": self.fast_is_faster(),
+            "models": models
+        }
+
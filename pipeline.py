@@ -0,0 +1,139 @@
+from typing import Any, Dict, Optional, Union
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+from actions import split_actions
+from llm_stream import missing_fields
+
+Number = Union[int, float]
+
+
+class Action(BaseModel):
+    """
+    One parsed action, validated once before it is dispatched to a handler.
+
+    The fields handlers read are typed (numbers sent as strings are coerced); anything else
+    the client or LLM sent is kept as an extra field.
+    """
+
+    model_config = ConfigDict(extra="allow")
+
+    intent: Optional[str] = None
+    location: Optional[str] = None
+    scene_name: Optional[str] = None
+    hue: Optional[Number] = None
+    sat: Optional[Number] = None
+    bri: Optional[Number] = None
+    color_description: Optional[str] = None
+    brightness_description: Optional[str] = None
+    mood_description: Optional[str] = None
+    device: Optional[str] = None
+    command: Optional[str] = None
+    # Hue dynamics: reach the new state gradually over this many seconds
+    transition_seconds: Optional[Number] = None
+
+
+class ActionResult(BaseModel):
+    """
+    A handler's outcome. Handlers and the pipeline pass these around as objects; the body
+    is serialized once, by to_response() at the HTTP edge.
+    """
+
+    status_code: int = 200
+    body: Dict[str, Any]
+
+
+class ParseResult(BaseModel):
+    """
+    The intent(s) parsed from one request and how they were produced.
+
+    Attributes:
+        parsed: A single action object or {"actions": [...]}, as returned by /parse
+        parse_path: "local", "cache", "recommend", "llm" or "llm_stream"
+        confidence: Local grammar or scene recommender confidence (local and recommend parses only)
+    """
+
+    parsed: Dict[str, Any]
+    parse_path: str
+    confidence: Optional[float] = None
+
+    def actions(self):
+        return split_actions(self.parsed)
+
+
+class ParseError(Exception):
+    """Parsing failed; result holds the error body and status to return."""
+
+    def __init__(self, message, status_code=500, **extra):
+        super().__init__(message)
+        self.result = failure(message, status_code, **extra)
+
+
+def success(**body):
+    return ActionResult(body=body)
+
+
+def failure(message, status_code=400, **extra):
+    return ActionResult(status_code=status_code, body={"error": message, **extra})
+
+
+def validate_action(data):
+    """
+    Validate a parsed action dict.
+
+    Returns:
+        tuple: (Action, None), or (None, ActionResult) with a 400 naming the invalid fields
+    """
+    try:
+        return Action.model_validate(data), None
+    except ValidationError as e:
+        # Union fields report one error per member type; keep the first per field
+        problems = {}
+        for error in e.errors():
+            problems.setdefault(str(error["loc"][0]) if error["loc"] else "action", error["msg"])
+        problems = "; ".join(f"{field}: {message}" for field, message in problems.items())
+        return None, failure(f"Invalid action: {problems}", 400, parsed_data=data)
+
+
+def parse_problems(parsed):
+    """
+    Check a parse result against the intent schema.
+
+    Returns:
+        list: Why it can't be dispatched as is (empty when every action validates, has a
+              known intent and all the fields that intent requires)
+    """
+    actions = split_actions(parsed)
+    if not actions:
+        return ["no actions"]
+    problems = []
+    for action in actions:
+        validated, invalid = validate_action(action)
+        if invalid:
+            problems.append(invalid.body["error"])
+            continue
+        missing = missing_fields(validated.model_dump())
+        if missing is None:
+            problems.append(f"unknown intent {validated.intent!r}")
+            continue
+        if missing:
+            problems.append(f"{validated.intent} missing {', '.join(missing)}")
+    return problems
+
+
+def to_response(result, parse_path=None):
+    """
+    Serialize an ActionResult or ParseResult at the HTTP edge, reporting the parse path in
+    X-Parse-Path (and a local parse's confidence in X-Parse-Confidence).
+    """
+    if isinstance(result, ParseResult):
+        response = JSONResponse(content=result.parsed)
+        parse_path = result.parse_path
+        if result.confidence is not None:
+            response.headers["X-Parse-Confidence"] = str(result.confidence)
+    else:
+        response = JSONResponse(content=result.body, status_code=result.status_code)
+    if parse_path:
+        response.headers["X-Parse-Path"] = parse_path
+    return response
@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import httpx
+
+from catalog import COMPILED_SCENE_PREFIX
+from color_engine import cached_hsb_to_xy, light_gamut
+
+# Compiled scenes kept on the bridge at once (the bridge holds ~200 scenes in total)
+DEFAULT_MAX_SCENES = 20
+# Compiled scenes not recalled for this long are deleted from the bridge
+DEFAULT_IDLE_SECONDS = 7 * 24 * 60 * 60
+# A look is compiled the n-th time it is requested; one-off looks are sent directly
+DEFAULT_COMPILE_AFTER = 2
+DEFAULT_CACHE_PATH = os.path.join("data", "compiled_scenes.json")
+# Looks counted towards compile_after; the oldest counts are dropped beyond this
+MAX_TRACKED_LOOKS = 256
+
+
+def group_for_grouped_light(grouped_light_id, rooms):
+    """
+    Return the {"rid", "rtype"} of the room or zone that owns a grouped_light, or None.
+    Scenes belong to a room/zone, while locations map to its grouped_light.
+    """
+    for room in rooms:
+        for service in room.get("services", []):
+            if service.get("rtype") == "grouped_light" and service.get("rid") == grouped_light_id:
+                return {"rid": room.get("id"), "rtype": room.get("type", "room")}
+    return None
+
+
+def group_lights(group, rooms, lights=(), scenes=()):
+    """
+    Return the light resources in a room or zone.
+
+    Room children are devices, matched to lights through the light's owner; zone children
+    are lights. If the lights aren't known (e.g. no mirrored state), fall back to the
+    lights targeted by existing scenes for the group, without gamut information.
+    """
+    lights = list(lights)
+    room = next((r for r in rooms if r.get("id") == group["rid"]), None)
+    found = {}
+    if room:
+        children = room.get("children", [])
+        devices = {c.get("rid") for c in children if c.get("rtype") == "device"}
+        light_ids = {c.get("rid") for c in children if c.get("rtype") == "light"}
+        for light in lights:
+            if light.get("id") in light_ids or light.get("owner", {}).get("rid") in devices:
+                found[light["id"]] = light
+    if not found:
+        for scene in scenes:
+            if scene.get("group", {}).get("rid") != group["rid"]:
+                continue
+            for action in scene.get("actions", []):
+                target = action.get("target", {})
+                if target.get("rtype") == "light" and target.get("rid"):
+                    found.setdefault(target["rid"], {"id": target["rid"]})
+    return [found[rid] for rid in sorted(found)]
+
+
+def light_actions(lights, hue, sat, bri):
+    """
+    Turn one colour into per-light scene actions, with xy clamped to each light's gamut.
+
+    Args:
+        lights: Light resources (see group_lights)
+        hue: 0-65535
+        sat: 0-254
+        bri: 0-254
+    """
+    brightness = round(min(100.0, max(0.0, (float(bri) / 254.0) * 100.0)), 2)
+    actions = []
+    for light in lights:
+        x, y = cached_hsb_to_xy(int(hue), int(sat), int(bri), light_gamut(light))
+        actions.append({
+            "target": {"rid": light["id"], "rtype": "light"},
+            "action": {
+                "on": {"on": True},
+                "dimming": {"brightness": brightness},
+                "color": {"xy": {"x": x, "y": y}}
+            }
+        })
+    return actions
+
+
+def look_hash(group, actions):
+    """Content hash of a look: the same group and per-light actions always give the same key."""
+    body = json.dumps({"group": group["rid"], "actions": actions}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(body.encode()).hexdigest()[:12]
+
+
+class SceneCompiler:
+    """
+    Compiles repeatedly requested looks into scenes stored on the bridge.
+
+    The first requests for a look are sent directly; once a look has been requested
+    compile_after times its per-light actions are saved as a bridge scene, and from then
+    on the look costs a single recall. Compiled scenes are tracked by content hash
+    (persisted to cache_path so restarts don't orphan them). When max_scenes is reached
+    the least recently used scene is overwritten (same group) or deleted, and scenes
+    idle for longer than idle_seconds are deleted.
+
+    Changes to the compiled scenes (compiling, eviction, pruning) are made one at a time,
+    so concurrent requests for the same new look share one compiled scene. Each bridge
+    call first awaits throttle("scene") if given (e.g. HueScheduler.throttle), so
+    compiling shares the bridge's scene rate limit with scene recalls.
+    """
+
+    def __init__(
+        self,
+        hue,
+        max_scenes=DEFAULT_MAX_SCENES,
+        idle_seconds=DEFAULT_IDLE_SECONDS,
+        compile_after=DEFAULT_COMPILE_AFTER,
+        cache_path=DEFAULT_CACHE_PATH,
+        throttle=None
+    ):
+        self.hue = hue
+        self.max_scenes = max_scenes
+        self.idle_seconds = idle_seconds
+        self.compile_after = compile_after
+        self.cache_path = cache_path
+        self.throttle = throttle
+        self._lock = None
+        # look hash -> {"id", "group", "last_used", "uses"}, least recently used first
+        self.scenes = OrderedDict()
+        self.seen = OrderedDict()
+        self.hits = 0
+        self.created = 0
+        self.updated = 0
+        self.evicted = 0
+        self.load()
+
+    def load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for key, entry in sorted(entries.items(), key=lambda item: item[1].get("last_used", 0)):
+            self.scenes[key] = entry
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(self.scenes, f, separators=(",", ":"))
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.warning(f"Failed to persist compiled scenes: {e}")
+
+    async def scene_for(self, group, actions):
+        """
+        Return the ID of a compiled scene for this look, creating it on the bridge once the
+        look has been requested compile_after times.
+
+        Returns:
+            str: Scene ID to recall, or None if the look should be sent directly
+
+        Raises:
+            httpx.HTTPError: If creating or updating the scene fails
+        """
+        key = look_hash(group, actions)
+        if key in self.scenes:
+            return self._hit(key)
+        count = self.seen.pop(key, 0) + 1
+        if count < self.compile_after:
+            self.seen[key] = count
+            while len(self.seen) > MAX_TRACKED_LOOKS:
+                self.seen.popitem(last=False)
+            return None
+        async with self._get_lock():
+            # Compiled by a concurrent request while this one waited
+            if key in self.scenes:
+                return self._hit(key)
+            return await self._compile(key, group, actions)
+
+    def _get_lock(self):
+        if self._lock is None:
+            # Created lazily so it binds to the running loop
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def _hit(self, key):
+        entry = self.scenes[key]
+        self.scenes.move_to_end(key)
+        entry["last_used"] = time.time()
+        entry["uses"] += 1
+        self.hits += 1
+        return entry["id"]
+
+    async def _throttle(self):
+        if self.throttle:
+            await self.throttle("scene")
+
+    async def _compile(self, key, group, actions):
+        await self._evict_idle()
+        body = {"metadata": {"name": f"{COMPILED_SCENE_PREFIX}{key}"}, "actions": actions}
+        reuse = None
+        if len(self.scenes) >= self.max_scenes:
+            old_key, old = self.scenes.popitem(last=False)
+            if old["group"] == group["rid"]:
+                reuse = old["id"]
+            else:
+                await self._delete(old["id"])
+        await self._throttle()
+        if reuse:
+            # Overwrite the evicted scene in place: one PUT instead of DELETE + POST
+            await self.hue.put_resource("scene", reuse, body)
+            scene_id = reuse
+            self.updated += 1
+        else:
+            res = await self.hue.post_resource("scene", {"type": "scene", "group": group, **body})
+            scene_id = res["data"][0]["rid"]
+            self.created += 1
+        self.scenes[key] = {"id": scene_id, "group": group["rid"], "last_used": time.time(), "uses": 1}
+        self._save()
+        logging.info(f"Compiled look {key} into scene {scene_id} ({len(actions)} lights)")
+        return scene_id
+
+    async def _delete(self, scene_id):
+        self.evicted += 1
+        try:
+            await self._throttle()
+            await self.hue.delete_resource("scene", scene_id)
+        except httpx.HTTPStatusError as e:
+            # Already gone (e.g. deleted in the Hue app) is fine
+            if e.response.status_code != 404:
+                logging.warning(f"Failed to delete compiled scene {scene_id}: {e}")
+        except httpx.HTTPError as e:
+            logging.warning(f"Failed to delete compiled scene {scene_id}: {e}")
+
+    async def evict_idle(self):
+        """Delete compiled scenes that haven't been recalled within idle_seconds."""
+        async with self._get_lock():
+            await self._evict_idle()
+
+    async def _evict_idle(self):
+        cutoff = time.time() - self.idle_seconds
+        idle = [key for key, entry in self.scenes.items() if entry["last_used"] < cutoff]
+        for key in idle:
+            await self._delete(self.scenes.pop(key)["id"])
+        if idle:
+            self._save()
+
+    async def prune(self, raw_scenes):
+        """
+        Evict idle scenes and delete compiled scenes on the bridge that aren't tracked
+        (left behind by a lost cache file), given the bridge's current scene list.
+        """
+        async with self._get_lock():
+            await self._evict_idle()
+            known = {entry["id"] for entry in self.scenes.values()}
+            for scene in raw_scenes:
+                name = scene.get("metadata", {}).get("name", "")
+                if name.startswith(COMPILED_SCENE_PREFIX) and scene.get("id") not in known:
+                    await self._delete(scene["id"])
+
+    def forget(self, scene_id):
+        """Drop a compiled scene that no longer exists on the bridge."""
+        for key, entry in list(self.scenes.items()):
+            if entry["id"] == scene_id:
+                del self.scenes[key]
+                self._save()
+
+    def stats(self):
+        return {
+            "scenes": len(self.scenes),
+            "max_scenes": self.max_scenes,
+            "hits": self.hits,
+            "created": self.created,
+            "updated": self.updated,
+            "evicted": self.evicted,
+            "compiled": {key: dict(entry) for key, entry in self.scenes.items()}
+        }
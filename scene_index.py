@@ -0,0 +1,168 @@
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from itertools import chain
+
+# Minimum score for best_match to accept a candidate
+DEFAULT_MIN_SCORE = 0.45
+
+# Score given when the whole name sounds the same as the query ("whisky" / "whiskey")
+PHONETIC_MATCH_SCORE = 0.9
+
+# Weight of per-word phonetic overlap ("sea sesh" / "sesh night")
+PHONETIC_TOKEN_WEIGHT = 0.75
+
+# Spelling rules applied in order before vowels are dropped
+_PHONETIC_RULES = (
+    ("sch", "sk"), ("ph", "f"), ("ck", "k"), ("wh", "w"), ("kn", "n"), ("wr", "r"),
+    ("sh", "x"), ("ch", "x"), ("th", "0"), ("gh", "g"), ("dg", "j"),
+    ("ce", "se"), ("ci", "si"), ("cy", "sy"), ("c", "k"), ("q", "k"), ("x", "ks"), ("z", "s"), ("v", "f")
+)
+
+
+def phonetic_key(text):
+    """
+    Compute a simplified Metaphone-style key so names that sound alike compare equal.
+
+    Vowels (and h, w, y) after the first letter are dropped and doubled consonants count
+    once, but a consonant repeated across a vowel is kept: "whisky" and "whiskey" ->
+    "wsk", "savanna" -> "sfn", while "mimi" -> "mm" stays apart from "mo" -> "m".
+    """
+    s = re.sub(r"[^a-z]", "", text.lower())
+    if not s:
+        return ""
+    for old, new in _PHONETIC_RULES:
+        s = s.replace(old, new)
+    key = s[0]
+    for previous, c in zip(s, s[1:]):
+        if c in "aeiouhwy" or c == previous:
+            continue
+        key += c
+    return key
+
+
+def trigrams(text):
+    """Return the set of character trigrams of text, padded so word edges count."""
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SceneIndex:
+    """
+    Scene catalog index for fast fuzzy lookup of spoken or misspelled scene names.
+
+    Builds a character-trigram inverted index plus phonetic keys for each name, so a
+    query only scores names that share a trigram or sound, instead of scanning the
+    whole catalog.
+    """
+
+    def __init__(self, scene_name_to_id):
+        self.names = list(scene_name_to_id)
+        self.ids = [scene_name_to_id[name] for name in self.names]
+        self._exact = {name.lower(): i for i, name in enumerate(self.names)}
+        self._trigrams = []
+        self._trigram_postings = defaultdict(list)
+        self._phonetic_postings = defaultdict(list)
+        self._token_postings = defaultdict(list)
+        self._token_counts = []
+
+        for i, name in enumerate(self.names):
+            grams = frozenset(trigrams(name))
+            self._trigrams.append(grams)
+            for gram in grams:
+                self._trigram_postings[gram].append(i)
+            self._phonetic_postings[phonetic_key(name)].append(i)
+            tokens = {phonetic_key(token) for token in name.split()} - {""}
+            self._token_counts.append(len(tokens))
+            for token in tokens:
+                self._token_postings[token].append(i)
+
+    def __len__(self):
+        return len(self.names)
+
+    def search(self, query, k=5, min_score=0.0):
+        """
+        Return up to k candidates ranked by score.
+
+        Args:
+            min_score: Candidates scoring below this may be left out, which (like
+                       good matches found early) lets the trigram scan skip the
+                       query's most common trigrams
+
+        Returns:
+            list: (scene_name, scene_id, score) tuples, best first, score between 0 and 1
+        """
+        if not query or not self.names:
+            return []
+        query = query.lower().strip()
+        exact = self._exact.get(query)
+        if exact is not None and k == 1:
+            return [(self.names[exact], self.ids[exact], 1.0)]
+
+        # Phonetic matches first: they are few, and the k-th best of them sets the score
+        # a trigram candidate has to beat
+        scores = {}
+        for i in self._phonetic_postings.get(phonetic_key(query), ()):
+            scores[i] = PHONETIC_MATCH_SCORE
+
+        query_tokens = {phonetic_key(token) for token in query.split()} - {""}
+        token_postings = self._token_postings
+        token_hits = Counter(chain.from_iterable(token_postings[token] for token in query_tokens if token in token_postings))
+        # Fewer shared words than this can't reach min_score whatever the name's length
+        needed_hits = math.ceil(min_score * len(query_tokens) / PHONETIC_TOKEN_WEIGHT)
+        for i, hits in token_hits.items():
+            if hits < needed_hits:
+                continue
+            score = PHONETIC_TOKEN_WEIGHT * hits / max(len(query_tokens), self._token_counts[i])
+            if score >= min_score and score > scores.get(i, 0.0):
+                scores[i] = score
+
+        if exact is not None:
+            scores[exact] = 1.0
+
+        # The k best scores so far; the smallest of them is what a trigram candidate has to beat
+        top = heapq.nlargest(k, scores.values())
+        heapq.heapify(top)
+
+        # Trigram Dice coefficient 2c / (q + n) for c shared trigrams. Beating floor takes
+        # c >= floor * q / (2 - floor), so once the query's rarest len(grams) - c + 1
+        # trigrams are scanned, a name sharing none of them can't: the scan walks the
+        # postings rarest first, scoring each name found on all its trigrams, and stops
+        # as soon as the k-th best score rules out the rest
+        query_grams = trigrams(query)
+        postings = self._trigram_postings
+        grams = sorted((gram for gram in query_grams if gram in postings), key=lambda gram: len(postings[gram]))
+        checked = set()
+        for scanned, gram in enumerate(grams):
+            floor = max(min_score, top[0]) if len(top) == k else min_score
+            needed = max(1, math.ceil(floor * len(query_grams) / (2.0 - floor)))
+            if scanned > len(grams) - needed:
+                break
+            for i in postings[gram]:
+                if i in checked:
+                    continue
+                checked.add(i)
+                score = 2.0 * len(query_grams & self._trigrams[i]) / (len(query_grams) + len(self._trigrams[i]))
+                previous = scores.get(i)
+                if previous is None:
+                    scores[i] = score
+                    if len(top) < k:
+                        heapq.heappush(top, score)
+                    else:
+                        heapq.heappushpop(top, score)
+                elif score > previous:
+                    # Already counted in top at its old score, which only keeps floor low
+                    scores[i] = score
+
+        ranked = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(self.names[i], self.ids[i], round(score, 4)) for i, score in ranked]
+
+    def best_match(self, query, min_score=DEFAULT_MIN_SCORE):
+        """
+        Return the ID of the best matching scene, or None if nothing scores at least min_score.
+        """
+        candidates = self.search(query, k=1, min_score=min_score)
+        if candidates and candidates[0][2] >= min_score:
+            return candidates[0][1]
+        return None
@@ -0,0 +1,385 @@
+import heapq
+import itertools
+import math
+
+from color_engine import BASE_COLORS, map_brightness_description_to_bri, mirek_to_xy, named_color_xy
+from intent_cache import normalize_text
+from local_parser import FILLER_WORDS, UNMATCHED_WORD_PENALTY
+
+# Feature weights in the distance: xy differences count fully, a 100% brightness
+# difference like 0.3 in xy, and spread (mean xy distance from the scene's colour) fully
+XY_WEIGHT = 1.0
+BRIGHTNESS_WEIGHT = 0.3
+SPREAD_WEIGHT = 1.0
+
+# Distance at which confidence reaches 0; a close look (~0.03) scores about 0.9
+DISTANCE_SCALE = 0.3
+
+# Colour words and the xy they stand for (temperatures on the Planckian locus)
+COLOR_TERMS = {name: named_color_xy(name) for name in BASE_COLORS}
+COLOR_TERMS.update({
+    "warm": mirek_to_xy(400),
+    "candlelight": mirek_to_xy(500),
+    "amber": named_color_xy("orange"),
+    "golden": named_color_xy("yellow"),
+    "gold": named_color_xy("yellow"),
+    "violet": named_color_xy("purple"),
+    "teal": named_color_xy("cyan"),
+    "cool": mirek_to_xy(200),
+    "cold": mirek_to_xy(200),
+    "daylight": mirek_to_xy(153)
+})
+
+# Brightness words (percent), from the same scale set_color uses
+BRIGHTNESS_TERMS = {
+    word: round(map_brightness_description_to_bri(word) / 254 * 100, 1)
+    for word in ("minimum", "very dim", "dim", "soft", "normal", "bright", "full", "max", "maximum")
+}
+BRIGHTNESS_TERMS.update({"dimmed": BRIGHTNESS_TERMS["dim"], "low": BRIGHTNESS_TERMS["dim"], "dark": BRIGHTNESS_TERMS["very dim"], "brighter": BRIGHTNESS_TERMS["bright"]})
+
+# Moods fill in whatever the request doesn't say explicitly
+MOOD_TERMS = {
+    "relaxing": {"xy": COLOR_TERMS["warm"], "brightness": BRIGHTNESS_TERMS["soft"]},
+    "relax": {"xy": COLOR_TERMS["warm"], "brightness": BRIGHTNESS_TERMS["soft"]},
+    "cozy": {"xy": COLOR_TERMS["warm"], "brightness": BRIGHTNESS_TERMS["soft"]},
+    "cosy": {"xy": COLOR_TERMS["warm"], "brightness": BRIGHTNESS_TERMS["soft"]},
+    "calm": {"xy": COLOR_TERMS["warm"], "brightness": BRIGHTNESS_TERMS["soft"]},
+    "calming": {"xy": COLOR_TERMS["warm"], "brightness": BRIGHTNESS_TERMS["soft"]},
+    "chill": {"xy": COLOR_TERMS["warm"], "brightness": BRIGHTNESS_TERMS["soft"]},
+    "romantic": {"xy": named_color_xy("calm red"), "brightness": BRIGHTNESS_TERMS["dim"]},
+    "sleepy": {"xy": COLOR_TERMS["candlelight"], "brightness": BRIGHTNESS_TERMS["very dim"]},
+    "focus": {"xy": COLOR_TERMS["cool"], "brightness": BRIGHTNESS_TERMS["full"], "spread": 0.0},
+    "reading": {"xy": COLOR_TERMS["cool"], "brightness": BRIGHTNESS_TERMS["bright"], "spread": 0.0},
+    "energizing": {"xy": COLOR_TERMS["cool"], "brightness": BRIGHTNESS_TERMS["full"]},
+    "colorful": {"spread": 0.15},
+    "colourful": {"spread": 0.15},
+    "party": {"spread": 0.15, "brightness": BRIGHTNESS_TERMS["bright"]},
+    "rainbow": {"spread": 0.2},
+    "vibrant": {"spread": 0.1}
+}
+
+# Words that ask for a look rather than an exact colour. Without one of these (or a mood),
+# "make the bedroom red" is a set_color command, not a scene request
+RECOMMEND_CUE_WORDS = {
+    "something", "scene", "kind", "sort", "like", "feel", "feels", "feeling", "mood", "vibe",
+    "vibes", "look", "ish", "atmosphere"
+}
+
+# Words in mood requests that carry no look of their own
+RECOMMEND_FILLER_WORDS = FILLER_WORDS | RECOMMEND_CUE_WORDS | {
+    "some", "and", "with", "very", "bit", "little", "more", "colour", "color", "colors",
+    "colours", "nice", "really", "quite", "bedtime", "on", "i", "want", "need", "let's", "lets"
+}
+
+_MAX_TERM_WORDS = 2
+
+
+def scene_features(scene):
+    """
+    Compact look of a CLIP v2 scene from its per-light actions.
+
+    Colour comes from each lit light's xy, colour temperature (mirek) or gradient points.
+
+    Returns:
+        dict: {"xy": dominant xy (the colour with the most total brightness), "mean_xy":
+               brightness-weighted mean xy, "brightness": mean percent, "spread":
+               brightness-weighted mean xy distance from mean_xy, "lights": lit lights},
+              or None if no light in the scene is on
+    """
+    colours = []
+    brightness = []
+    for entry in scene.get("actions", ()):
+        action = entry.get("action", {})
+        if not action.get("on", {}).get("on", True):
+            continue
+        level = action.get("dimming", {}).get("brightness", 100.0)
+        brightness.append(level)
+        if action.get("color", {}).get("xy"):
+            xy = action["color"]["xy"]
+            colours.append(((xy["x"], xy["y"]), level))
+        elif action.get("gradient", {}).get("points"):
+            points = [point["color"]["xy"] for point in action["gradient"]["points"] if point.get("color", {}).get("xy")]
+            colours.extend(((point["x"], point["y"]), level / len(points)) for point in points)
+        elif action.get("color_temperature", {}).get("mirek"):
+            colours.append((mirek_to_xy(action["color_temperature"]["mirek"]), level))
+    if not brightness:
+        return None
+    if not colours:
+        # Dimming only: treat as a neutral white
+        colours = [(named_color_xy("white"), 1.0)]
+    total = sum(weight for _, weight in colours)
+    if total <= 0:
+        colours = [(xy, 1.0) for xy, _ in colours]
+        total = float(len(colours))
+    mean_x = sum(xy[0] * weight for xy, weight in colours) / total
+    mean_y = sum(xy[1] * weight for xy, weight in colours) / total
+    spread = sum(math.dist(xy, (mean_x, mean_y)) * weight for xy, weight in colours) / total
+    by_colour = {}
+    for (x, y), weight in colours:
+        key = (round(x, 2), round(y, 2))
+        by_colour[key] = by_colour.get(key, 0.0) + weight
+    dominant = max(by_colour.items(), key=lambda item: item[1])[0]
+    return {
+        "xy": dominant,
+        "mean_xy": (round(mean_x, 4), round(mean_y, 4)),
+        "brightness": round(sum(brightness) / len(brightness), 1),
+        "spread": round(spread, 4),
+        "lights": len(brightness)
+    }
+
+
+def feature_vector(features):
+    return (features["xy"][0], features["xy"][1], features["brightness"] / 100.0, features["spread"])
+
+
+class KDTree:
+    """
+    k-d tree over fixed-length vectors for weighted nearest-neighbour queries.
+
+    A query weights each dimension; a weight of 0 leaves that dimension out of the
+    distance (and out of pruning), so requests that only say "dim" match on brightness.
+    """
+
+    def __init__(self, points):
+        """points: list of (vector, item)."""
+        self.size = len(points)
+        self.dims = len(points[0][0]) if points else 0
+        self.root = self._build(list(points), 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % self.dims
+        points.sort(key=lambda point: point[0][axis])
+        middle = len(points) // 2
+        return (points[middle], axis, self._build(points[:middle], depth + 1), self._build(points[middle + 1:], depth + 1))
+
+    def nearest(self, target, weights, k=1):
+        """
+        Return up to k (distance, item) pairs, nearest first.
+
+        Args:
+            target: Query vector
+            weights: Per-dimension weight (0 ignores the dimension)
+        """
+        best = []
+        counter = itertools.count()
+
+        def visit(node):
+            if node is None:
+                return
+            (vector, item), axis, left, right = node
+            distance = math.sqrt(sum((w * (a - b)) ** 2 for w, a, b in zip(weights, target, vector)))
+            if len(best) < k:
+                heapq.heappush(best, (-distance, next(counter), item))
+            elif distance < -best[0][0]:
+                heapq.heapreplace(best, (-distance, next(counter), item))
+            offset = weights[axis] * (target[axis] - vector[axis])
+            near, far = (left, right) if offset < 0 else (right, left)
+            visit(near)
+            if len(best) < k or abs(offset) < -best[0][0]:
+                visit(far)
+
+        visit(self.root)
+        return [(-negative, item) for negative, _, item in sorted(best, key=lambda entry: (-entry[0], entry[1]))]
+
+
+def _match_terms(tokens, terms, used):
+    """Longest-first matches of terms (up to _MAX_TERM_WORDS words) in unused tokens; marks them used."""
+    found = []
+    for length in range(_MAX_TERM_WORDS, 0, -1):
+        for start in range(len(tokens) - length + 1):
+            span = range(start, start + length)
+            phrase = " ".join(tokens[start:start + length])
+            if phrase in terms and not used.intersection(span):
+                used.update(span)
+                found.append((start, phrase))
+    return [phrase for _, phrase in sorted(found)]
+
+
+def _match_location(tokens, locations, used):
+    """Return the first location named in tokens (up to three words) and mark its words used."""
+    location_phrases = {loc.lower().replace("_", " "): loc for loc in locations}
+    for length in range(3, 0, -1):
+        for start in range(len(tokens) - length + 1):
+            phrase = " ".join(tokens[start:start + length])
+            if phrase in location_phrases:
+                used.update(range(start, start + length))
+                return location_phrases[phrase]
+    return None
+
+
+def describe_request(text, locations=()):
+    """
+    Read the look a mood or colour request asks for.
+
+    Returns:
+        dict: {"xy", "brightness", "spread" (each None if not asked for), "location",
+               "unmatched": words that are neither look, location nor filler}, or None if
+               the request names no mood and no colour or brightness with a cue word
+               (see RECOMMEND_CUE_WORDS)
+    """
+    tokens = normalize_text(text).split()
+    used = set()
+    location = _match_location(tokens, locations, used)
+    colours = _match_terms(tokens, COLOR_TERMS, used)
+    levels = _match_terms(tokens, BRIGHTNESS_TERMS, used)
+    moods = _match_terms(tokens, MOOD_TERMS, used)
+    if not (moods or ((colours or levels) and RECOMMEND_CUE_WORDS.intersection(tokens))):
+        return None
+
+    target = {"xy": None, "brightness": None, "spread": None}
+    for mood in moods:
+        for field, value in MOOD_TERMS[mood].items():
+            target[field] = value if target[field] is None else target[field]
+    if colours:
+        points = [COLOR_TERMS[colour] for colour in colours]
+        target["xy"] = (sum(p[0] for p in points) / len(points), sum(p[1] for p in points) / len(points))
+        if len(points) > 1 and target["spread"] is None:
+            # "red and blue" asks for a mix of colours
+            target["spread"] = sum(math.dist(p, target["xy"]) for p in points) / len(points)
+    if levels:
+        target["brightness"] = BRIGHTNESS_TERMS[levels[-1]]
+    target["location"] = location
+    target["unmatched"] = [t for i, t in enumerate(tokens) if i not in used and t not in RECOMMEND_FILLER_WORDS]
+    return target
+
+
+def _scene_name_form(phrase, names):
+    """Return the scene name phrase is, or is with an "-ing"/"-ed" ending ("relaxing"), or None."""
+    if phrase in names:
+        return phrase
+    for ending in ("ing", "ed"):
+        if phrase.endswith(ending) and phrase[:-len(ending)] in names:
+            return phrase[:-len(ending)]
+    return None
+
+
+class SceneRecommender:
+    """
+    Nearest-neighbour scene lookup by look rather than name.
+
+    Each scene's per-light actions are reduced once to a feature vector (dominant xy,
+    brightness, spread; see scene_features) and indexed in a k-d tree per room plus one
+    over every scene. recommend() reads the look a request asks for ("something warm and
+    dim in the bedroom") and returns the nearest scene in the requested room, with its
+    distance and a confidence, so that low-confidence requests can still go to the LLM.
+
+    Args:
+        raw_scenes: CLIP v2 scene resources (the scenes.json "data" list)
+        names: Scene ID -> catalog scene name (scenes not in it are skipped)
+        scene_rooms: Scene ID -> location key of the scene's room
+    """
+
+    def __init__(self, raw_scenes, names, scene_rooms=None):
+        self.scene_rooms = dict(scene_rooms or {})
+        self.features = {}
+        points = {}
+        for scene in raw_scenes:
+            scene_id = scene.get("id")
+            if scene_id not in names:
+                continue
+            features = scene_features(scene)
+            if features is None:
+                continue
+            self.features[scene_id] = {"scene_name": names[scene_id], **features}
+            point = (feature_vector(features), scene_id)
+            points.setdefault(None, []).append(point)
+            room = self.scene_rooms.get(scene_id)
+            if room:
+                points.setdefault(room, []).append(point)
+        self._trees = {room: KDTree(room_points) for room, room_points in points.items()}
+        # Normalized catalog scene name -> its scene IDs, so "relax" resolves to the Relax
+        # scene rather than to whichever scene looks most relaxing
+        self._names = dict(names)
+        self._named = {}
+        for scene_id, name in names.items():
+            self._named.setdefault(normalize_text(name), []).append(scene_id)
+        self._max_name_words = max((len(name.split()) for name in self._named), default=0)
+
+    def __len__(self):
+        return len(self.features)
+
+    def named_scene(self, text, locations=()):
+        """
+        Return the catalog scene a request names, if it names one and nothing else.
+
+        A request is naming a scene when, apart from the name (or the name with an "-ing"
+        or "-ed" ending, as in "something relaxing"), a location and filler words, it has
+        no other words. "something bright and red" names the Bright scene but also asks
+        for red, so it is left to recommend().
+
+        Returns:
+            tuple: (scene name, scene ID, location) or None
+        """
+        tokens = normalize_text(text).split()
+        used = set()
+        location = _match_location(tokens, locations, used)
+        for length in range(min(self._max_name_words, len(tokens)), 0, -1):
+            for start in range(len(tokens) - length + 1):
+                span = range(start, start + length)
+                if used.intersection(span):
+                    continue
+                name = _scene_name_form(" ".join(tokens[start:start + length]), self._named)
+                if name is None:
+                    continue
+                rest = [t for i, t in enumerate(tokens) if i not in used and i not in span]
+                if not all(t in RECOMMEND_FILLER_WORDS for t in rest):
+                    return None
+                scene_ids = self._named[name]
+                scene_id = next((s for s in scene_ids if location and self.scene_rooms.get(s) == location), scene_ids[0])
+                return self._names[scene_id], scene_id, location
+        return None
+
+    def recommend(self, text, locations=(), k=3):
+        """
+        Recommend a scene for a mood or colour request.
+
+        A request that names a catalog scene (see named_scene) gets that scene, with a
+        distance of 0, instead of the nearest look.
+
+        Returns:
+            dict: {"scene_name", "scene_id", "location", "distance", "confidence",
+                   "target", "alternatives": [{"scene_name", "distance"}, ...]}, or None if
+                   the request describes no look or the requested room has no scenes
+        """
+        target = describe_request(text, locations)
+        if target is None:
+            return None
+        named = self.named_scene(text, locations)
+        if named is not None:
+            scene_name, scene_id, location = named
+            return {
+                "scene_name": scene_name,
+                "scene_id": scene_id,
+                "location": location,
+                "distance": 0.0,
+                "confidence": 1.0,
+                "target": {field: target[field] for field in ("xy", "brightness", "spread")},
+                "alternatives": []
+            }
+        location = target["location"]
+        # Scenes belong to a room: only recommend one of the requested room's, unless rooms are unknown
+        tree = self._trees.get(location) if location and self.scene_rooms else self._trees.get(None)
+        if tree is None:
+            return None
+        xy = target["xy"] or (0.0, 0.0)
+        query = (xy[0], xy[1], (target["brightness"] or 0.0) / 100.0, target["spread"] or 0.0)
+        weights = (
+            XY_WEIGHT if target["xy"] else 0.0,
+            XY_WEIGHT if target["xy"] else 0.0,
+            BRIGHTNESS_WEIGHT if target["brightness"] is not None else 0.0,
+            SPREAD_WEIGHT if target["spread"] is not None else 0.0
+        )
+        matches = tree.nearest(query, weights, k=k)
+        distance, scene_id = matches[0]
+        confidence = 1.0 - distance / DISTANCE_SCALE - UNMATCHED_WORD_PENALTY * len(target["unmatched"])
+        return {
+            "scene_name": self.features[scene_id]["scene_name"],
+            "scene_id": scene_id,
+            "location": location or self.scene_rooms.get(scene_id),
+            "distance": round(distance, 4),
+            "confidence": round(min(1.0, max(0.0, confidence)), 2),
+            "target": {field: target[field] for field in ("xy", "brightness", "spread")},
+            "alternatives": [{"scene_name": self.features[other]["scene_name"], "distance": round(d, 4)} for d, other in matches[1:]]
+        }
@@ -1,18 +1,36 @@
 import os
-import requests
+import json
+import asyncio
+import logging
+import random
+import time
+from hue_client import HueClient
+from catalog import build_catalog, diff_catalogs
 
 HUE_BRIDGE_IP = os.getenv("HUE_BRIDGE_IP")
 HUE_USERNAME = os.getenv("HUE_USERNAME")
 
-def fetch_scenes():
-    url = f"https://{HUE_BRIDGE_IP}/clip/v2/resource/scene"
-    headers = {
-        "hue-application-key": HUE_USERNAME,
-        "Content-Type": "application/json"
-    }
-    response = requests.get(url, headers=headers, verify=False)
-    response.raise_for_status()
-    scenes = response.json().get("data", [])
+# Last good catalog, persisted in the raw bridge format (same as scenes.json). Kept apart
+# from the scenes.json fixture in the repo, which the sync must never overwrite
+DEFAULT_SCENES_SNAPSHOT = os.path.join("data", "catalog_scenes.json")
+DEFAULT_ROOMS_SNAPSHOT = os.path.join("data", "catalog_rooms.json")
+DEFAULT_SYNC_INTERVAL = 300.0
+
+async def fetch_scenes(hue=None):
+    """
+    Fetch scenes from the bridge and build the scene and location dictionaries.
+
+    Args:
+        hue: Shared HueClient to use; a temporary one is created (and closed) if omitted
+    """
+    owns_client = hue is None
+    if owns_client:
+        hue = HueClient(HUE_BRIDGE_IP, HUE_USERNAME)
+    try:
+        scenes = await hue.get_resource("scene")
+    finally:
+        if owns_client:
+            await hue.aclose()
     scene_dict = {}
     location_to_group = {}
     for scene in scenes:
@@ -31,14 +49,179 @@ def fetch_scenes():
             location_to_group[name.lower()] = group_id
     return scene_dict, location_to_group
 
+async def fetch_catalog_resources(hue):
+    """
+    Fetch the raw scene, room and zone resources the catalog is built from.
+
+    Returns:
+        tuple: (scenes, rooms_and_zones) as CLIP v2 "data" lists
+    """
+    scenes, rooms, zones = await asyncio.gather(
+        hue.get_resource("scene"),
+        hue.get_resource("room"),
+        hue.get_resource("zone")
+    )
+    return scenes, rooms + zones
+
+def _read_data(path):
+    try:
+        with open(path) as f:
+            return json.load(f).get("data", [])
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _write_data(path, data):
+    # Write to a temp file and rename so a crash never leaves a half-written snapshot
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"errors": [], "data": list(data)}, f, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def load_snapshot(scenes_path=DEFAULT_SCENES_SNAPSHOT, rooms_path=DEFAULT_ROOMS_SNAPSHOT, fallback_locations=None, aliases=None):
+    """
+    Load the last persisted catalog from disk, or None if there is no usable snapshot.
+    Locations fall back to fallback_locations when no rooms snapshot exists; aliases are
+    curated scene names applied on top (see build_catalog).
+    """
+    scenes = _read_data(scenes_path)
+    if not scenes:
+        return None
+    rooms = _read_data(rooms_path) or []
+    return build_catalog(scenes, rooms, fallback_locations=fallback_locations, source="snapshot", aliases=aliases)
+
+def save_snapshot(catalog, scenes_path=DEFAULT_SCENES_SNAPSHOT, rooms_path=DEFAULT_ROOMS_SNAPSHOT):
+    _write_data(scenes_path, catalog.raw_scenes)
+    if catalog.raw_rooms:
+        _write_data(rooms_path, catalog.raw_rooms)
+
+class CatalogSync:
+    """
+    Background task that keeps the scene/location catalog in sync with the bridge.
+
+    Polls the bridge every interval seconds (or sooner when request_sync() is called),
+    builds a new immutable Catalog, and if it differs from the current one (names, rooms
+    or scene looks) swaps it in
+    with a single attribute assignment, persists it as the new snapshot and calls
+    on_change(old, new). Readers just use `sync.current` and never lock.
+    """
+
+    def __init__(
+        self,
+        hue,
+        initial,
+        interval=DEFAULT_SYNC_INTERVAL,
+        scenes_path=DEFAULT_SCENES_SNAPSHOT,
+        rooms_path=DEFAULT_ROOMS_SNAPSHOT,
+        fallback_locations=None,
+        on_change=None,
+        aliases=None
+    ):
+        self.hue = hue
+        self.current = initial
+        self.interval = interval
+        self.scenes_path = scenes_path
+        self.rooms_path = rooms_path
+        self.fallback_locations = fallback_locations
+        self.aliases = aliases
+        self.on_change = on_change
+        self.last_sync = None
+        self.last_error = None
+        self.last_diff = None
+        self.syncs = 0
+        self.swaps = 0
+        self._wakeup = None
+        self._task = None
+
+    async def sync_once(self):
+        """Fetch the catalog from the bridge and swap it in if it changed. Returns True on swap."""
+        scenes, rooms = await fetch_catalog_resources(self.hue)
+        new = build_catalog(scenes, rooms, fallback_locations=self.fallback_locations, aliases=self.aliases)
+        self.syncs += 1
+        self.last_sync = time.time()
+        self.last_error = None
+        old = self.current
+        if new.version == old.version and new.looks_version == old.looks_version and old.source == "bridge":
+            return False
+        self.current = new
+        self.swaps += 1
+        self.last_diff = diff_catalogs(old, new)
+        logging.info(f"Catalog updated to {new.version}: {self.last_diff}")
+        try:
+            save_snapshot(new, self.scenes_path, self.rooms_path)
+        except OSError as e:
+            logging.warning(f"Failed to persist catalog snapshot: {e}")
+        if self.on_change:
+            self.on_change(old, new)
+        return True
+
+    def request_sync(self):
+        """Ask the background loop to sync now instead of waiting for the next poll."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run(self):
+        # Created here so the event belongs to the running loop
+        self._wakeup = asyncio.Event()
+        backoff = 5.0
+        while True:
+            try:
+                await self.sync_once()
+                backoff = 5.0
+                delay = self.interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logging.warning(f"Catalog sync failed: {e}")
+                delay = min(self.interval, backoff) * random.uniform(0.8, 1.2)
+                backoff *= 2
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def status(self):
+        return {
+            "catalog": self.current.summary(),
+            "interval_seconds": self.interval,
+            "syncs": self.syncs,
+            "swaps": self.swaps,
+            "last_sync": self.last_sync,
+            "last_error": self.last_error,
+            "last_diff": self.last_diff
+        }
+
+async def sync_snapshot():
+    """Fetch the catalog once and write it to the snapshot files."""
+    hue = HueClient(HUE_BRIDGE_IP, HUE_USERNAME)
+    try:
+        scenes, rooms = await fetch_catalog_resources(hue)
+    finally:
+        await hue.aclose()
+    catalog = build_catalog(scenes, rooms)
+    save_snapshot(catalog)
+    return catalog
+
 if __name__ == "__main__":
-    scenes, groups = fetch_scenes()
-    print("SCENE_NAME_TO_INFO = {")
-    for name, info in scenes.items():
-        print(f'    "{name}": {info},')
-    print("}")
-    print()
-    print("LOCATION_TO_GROUP_ID = {")
-    for loc, gid in groups.items():
-        print(f'    "{loc}": "{gid}",')
-    print("}")
\ No newline at end of file
+    # Refresh the on-disk snapshot the app loads at startup
+    catalog = asyncio.run(sync_snapshot())
+    print(f"Wrote {DEFAULT_SCENES_SNAPSHOT} and {DEFAULT_ROOMS_SNAPSHOT}")
+    print(json.dumps(catalog.summary(), indent=2))
@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+
+# Identical requests arriving this soon after the first one finished still share its result
+DEFAULT_LINGER_SECONDS = 1.0
+# Idempotency-Key results are replayed for this long
+DEFAULT_IDEMPOTENCY_TTL_SECONDS = 10 * 60
+DEFAULT_IDEMPOTENCY_MAX_ENTRIES = 10000
+
+# Idempotency-Key of the request being run (scoped by route), so side effects queued
+# elsewhere (e.g. IFTTT webhooks) can recognise a retry; None outside such requests
+current_idempotency_key = ContextVar("current_idempotency_key", default=None)
+
+
+class IdempotencyConflict(Exception):
+    """An Idempotency-Key was reused for a different request."""
+
+
+def request_fingerprint(path, data):
+    """Stable hash of a request's path and JSON body, to tell a retry from a different request."""
+    payload = json.dumps([path, data], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class SingleFlight:
+    """
+    Collapse identical concurrent calls into one.
+
+    The first call for a key runs as its own task; calls with the same key made while it
+    runs, or within linger seconds of it finishing, await that task instead of running
+    again, and get its result (or exception). A caller that is cancelled (e.g. its client
+    disconnected) doesn't cancel the shared call.
+
+    Args:
+        linger: Seconds a finished call's result stays shared (0 for in-flight calls only)
+    """
+
+    def __init__(self, linger=DEFAULT_LINGER_SECONDS):
+        self.linger = linger
+        self.calls = 0
+        self.shared = 0
+        self._tasks = {}
+
+    async def run(self, key, call):
+        """
+        Run call() for key, or join the call already running for it.
+
+        Returns:
+            tuple: (call's result, shared) where shared is True if another request's call was joined
+        """
+        task = self._tasks.get(key)
+        shared = task is not None
+        if shared:
+            self.shared += 1
+        else:
+            self.calls += 1
+            task = self._tasks[key] = asyncio.ensure_future(call())
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task), shared
+
+    def _finished(self, key, task):
+        if self.linger > 0 and not task.cancelled():
+            asyncio.get_running_loop().call_later(self.linger, self._forget, key, task)
+        else:
+            self._forget(key, task)
+
+    def _forget(self, key, task):
+        if self._tasks.get(key) is task:
+            del self._tasks[key]
+
+    def stats(self):
+        return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._tasks), "linger_seconds": self.linger}
+
+
+class IdempotencyStore:
+    """
+    Results of requests sent with an Idempotency-Key.
+
+    The first request with a key runs; a retry with the same key within ttl_seconds, or
+    while the first is still running, gets the original result without running again.
+    Reusing a key for a different request (by fingerprint) is a conflict. Entries are
+    evicted oldest first beyond max_entries.
+
+    Args:
+        ttl_seconds: How long a result is replayed
+        max_entries: Results kept at most
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_IDEMPOTENCY_TTL_SECONDS, max_entries=DEFAULT_IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.stored = 0
+        self.replayed = 0
+        self.conflicts = 0
+        # key -> (fingerprint, result, expires at), oldest first
+        self._results = OrderedDict()
+        self._running = {}
+
+    def _expire(self, now):
+        while self._results:
+            key, (_, _, expires) = next(iter(self._results.items()))
+            if expires > now and len(self._results) <= self.max_entries:
+                break
+            del self._results[key]
+
+    async def run(self, key, fingerprint, call, keep=None):
+        """
+        Run call() once for key.
+
+        Args:
+            key: The Idempotency-Key (scoped by the caller, e.g. with the route)
+            fingerprint: request_fingerprint() of the request
+            call: async callable producing the result
+            keep: Optional predicate; results it rejects (e.g. server errors) are not
+                  stored, so a retry runs again
+
+        Returns:
+            tuple: (result, replayed) where replayed is True if the request did not run again
+
+        Raises:
+            IdempotencyConflict: If key was used for a request with a different fingerprint
+        """
+        now = time.monotonic()
+        self._expire(now)
+        running = self._running.get(key)
+        entry = self._results.get(key)
+        previous = running or entry
+        if previous is not None and previous[0] != fingerprint:
+            self.conflicts += 1
+            raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+        if running is not None:
+            self.replayed += 1
+            return await asyncio.shield(running[1]), True
+        if entry is not None:
+            self.replayed += 1
+            return entry[1], True
+
+        task = asyncio.ensure_future(call())
+        self._running[key] = (fingerprint, task)
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            if task.done():
+                self._running.pop(key, None)
+            else:
+                # This caller was cancelled; the call finishes (and is stored) on its own
+                task.add_done_callback(lambda done: self._store(key, fingerprint, done, keep))
+        self._store(key, fingerprint, task, keep)
+        return result, False
+
+    def _store(self, key, fingerprint, task, keep):
+        self._running.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if keep is not None and not keep(result):
+            return
+        self._results[key] = (fingerprint, result, time.monotonic() + self.ttl_seconds)
+        self.stored += 1
+        self._expire(time.monotonic())
+
+    def stats(self):
+        return {
+            "entries": len(self._results),
+            "stored": self.stored,
+            "replayed": self.replayed,
+            "conflicts": self.conflicts,
+            "ttl_seconds": self.ttl_seconds
+        }
@@ -0,0 +1,83 @@
+import asyncio
+import logging
+import os
+import time
+
+
+def process_age():
+    """Seconds since this process was started (Linux only; None elsewhere)."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the command name, which is in parentheses and may contain spaces
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class StartupTracker:
+    """
+    Timeline of a cold start, reported by /healthz.
+
+    Import-time phases are recorded with mark(), each measured from the previous mark.
+    warm_up() runs the connection warmers (concurrently, errors are recorded rather than
+    raised) and marks the app ready. record_request() keeps the first successful request
+    per route, measured from when the tracker was created.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # Interpreter and server start-up before the app module began importing
+        self.before_import = process_age()
+        self.phases = []
+        self.warmups = {}
+        self.first_requests = {}
+        self.ready = False
+        self._last = self.started
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    async def _warm(self, name, warmer):
+        start = time.perf_counter()
+        try:
+            await warmer()
+            self.warmups[name] = {"ok": True}
+        except Exception as e:
+            logging.warning(f"Warm-up of {name} failed: {e}")
+            self.warmups[name] = {"ok": False, "error": str(e)}
+        self.warmups[name]["ms"] = round((time.perf_counter() - start) * 1000, 1)
+        self.warmups[name]["done_at_ms"] = round((time.perf_counter() - self.started) * 1000, 1)
+
+    async def warm_up(self, warmers):
+        """
+        Run every warmer concurrently, then mark the app ready.
+
+        Args:
+            warmers: dict of name -> async callable
+        """
+        await asyncio.gather(*(self._warm(name, warmer) for name, warmer in warmers.items()))
+        self.ready = True
+
+    def record_request(self, method, path, status, seconds):
+        key = f"{method} {path}"
+        if status < 400 and key not in self.first_requests:
+            self.first_requests[key] = {
+                "status": status,
+                "ms": round(seconds * 1000, 1),
+                "done_at_ms": round((time.perf_counter() - self.started) * 1000, 1)
+            }
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "uptime_s": round(time.perf_counter() - self.started, 1),
+            "before_import_ms": None if self.before_import is None else round(self.before_import * 1000, 1),
+            "import_ms": {phase: round(seconds * 1000, 1) for phase, seconds in self.phases},
+            "warmup": self.warmups,
+            "first_requests": self.first_requests
+        }
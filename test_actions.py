@@ -0,0 +1,34 @@
+import asyncio
+
+from actions import ActionDispatcher, split_actions
+
+
+def test_split_actions():
+    single = {"intent": "lg_tv_control", "command": "off"}
+    assert split_actions(single) == [single]
+    assert split_actions({"actions": [single, "junk", single]}) == [single, single]
+    assert split_actions({}) == []
+
+
+def test_same_target_in_order_other_targets_concurrent():
+    events = []
+
+    async def execute(action):
+        events.append(("start", action["name"]))
+        await asyncio.sleep(0.02)
+        events.append(("end", action["name"]))
+        return 200, {"name": action["name"]}
+
+    async def run():
+        dispatcher = ActionDispatcher(execute)
+        dispatcher.dispatch(0, {"name": "bedroom color", "intent": "set_color", "location": "bedroom"})
+        dispatcher.dispatch(1, {"name": "ac", "intent": "trigger_ifttt", "device": "ac"})
+        dispatcher.dispatch(2, {"name": "bedroom scene", "intent": "trigger_scene", "location": "bedroom"})
+        dispatcher.dispatch(0, {"name": "duplicate", "intent": "lg_tv_control"})
+        return await dispatcher.results()
+
+    results = asyncio.run(run())
+    assert [r["result"]["name"] for r in results] == ["bedroom color", "ac", "bedroom scene"]
+    assert events.index(("start", "ac")) < events.index(("end", "bedroom color"))
+    assert events.index(("end", "bedroom color")) < events.index(("start", "bedroom scene"))
+    assert all(r["status_code"] == 200 for r in results)
@@ -0,0 +1,143 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+from automations import MAX_TRANSITION_SECONDS, AutomationScheduler, build_steps, parse_when
+from hue_state import StateMirror
+
+
+def recorder(ran):
+    async def run_action(action):
+        ran.append((time.time(), action))
+        return 200, {"ok": True}
+    return run_action
+
+
+def test_jobs_fire_in_due_order_and_repeat(tmp_path):
+    ran = []
+
+    async def run():
+        scheduler = AutomationScheduler(recorder(ran), path=str(tmp_path / "jobs.db"))
+        scheduler.start()
+        now = time.time()
+        scheduler.add([{"offset": 0, "action": {"intent": "second"}}], now + 0.1)
+        scheduler.add([{"offset": 0, "action": {"intent": "first"}}], now + 0.05)
+        repeating = scheduler.add([{"offset": 0, "action": {"intent": "repeat"}}], now + 0.02, every=0.1)
+        await asyncio.sleep(0.28)
+        stats = scheduler.stats()
+        pending = [job["id"] for job in scheduler.jobs()]
+        await scheduler.stop()
+        return repeating, stats, pending
+
+    repeating, stats, pending = asyncio.run(run())
+    intents = [action["intent"] for _, action in ran]
+    assert [intent for intent in intents if intent != "repeat"] == ["first", "second"]
+    assert intents.count("repeat") >= 2
+    # One-off jobs are removed once they have run; the repeating one stays scheduled
+    assert pending == [repeating["id"]]
+    assert stats["failed"] == 0 and stats["fired"] == len(ran)
+
+
+def test_jobs_survive_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    ran = []
+
+    async def schedule_then_stop():
+        scheduler = AutomationScheduler(recorder(ran), path=path)
+        scheduler.start()
+        scheduler.add([{"offset": 0, "action": {"intent": "set_color"}}], time.time() + 0.2, name="later")
+        await scheduler.stop()
+
+    async def restart():
+        scheduler = AutomationScheduler(recorder(ran), path=path)
+        scheduler.start()
+        loaded = [job["name"] for job in scheduler.jobs()]
+        await asyncio.sleep(0.35)
+        await scheduler.stop()
+        return loaded
+
+    asyncio.run(schedule_then_stop())
+    assert ran == []
+    assert asyncio.run(restart()) == ["later"]
+    assert len(ran) == 1
+
+
+def test_cancel_and_many_pending_jobs():
+    ran = []
+
+    async def run():
+        scheduler = AutomationScheduler(recorder(ran), path=None)
+        scheduler.start()
+        now = time.time()
+        jobs = [scheduler.add([{"offset": 0, "action": {"intent": "later"}}], now + 3600 + i) for i in range(5000)]
+        soon = scheduler.add([{"offset": 0, "action": {"intent": "soon"}}], now + 0.05)
+        cancelled = scheduler.add([{"offset": 0, "action": {"intent": "cancelled"}}], now + 0.05)
+        assert scheduler.cancel(cancelled["id"])
+        assert not scheduler.cancel("unknown")
+        await asyncio.sleep(0.15)
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return jobs, soon, stats
+
+    jobs, soon, stats = asyncio.run(run())
+    assert [action["intent"] for _, action in ran] == ["soon"]
+    assert stats["pending"] == len(jobs)
+
+
+def test_overdue_steps_skipped_after_downtime():
+    ran = []
+
+    async def run():
+        scheduler = AutomationScheduler(recorder(ran), path=None)
+        scheduler.start()
+        start = time.time() - 600
+        steps = [{"offset": offset, "action": {"intent": "step", "n": offset}} for offset in (0, 300, 590, 700)]
+        scheduler.add(steps, start)
+        await asyncio.sleep(0.05)
+        stats = scheduler.stats()
+        await scheduler.stop()
+        return stats
+
+    stats = asyncio.run(run())
+    # Only the latest overdue step is applied; the one still in the future stays scheduled
+    assert [action["n"] for _, action in ran] == [590]
+    assert stats["skipped"] == 2 and stats["pending"] == 1
+
+
+def test_sunrise_uses_bridge_transitions():
+    steps = build_steps({"routine": "sunrise", "location": "bedroom", "duration_seconds": 1800})
+    assert len(steps) == 4
+    assert "transition_seconds" not in steps[0]["action"]
+    assert [step["offset"] for step in steps] == [0, 0, 600, 1200]
+    assert all(step["action"]["transition_seconds"] == 600 for step in steps[1:])
+    assert steps[-1]["action"]["bri"] == 254
+
+
+def test_long_transitions_split_or_capped():
+    steps = build_steps({"routine": "fade", "location": "den", "from": {"hue": 0, "bri": 1}, "to": {"hue": 40, "bri": 254}, "duration_seconds": 10000})
+    assert len(steps) == 3
+    assert all(step["action"]["transition_seconds"] <= MAX_TRANSITION_SECONDS for step in steps[1:])
+    assert steps[-1]["action"]["hue"] == 40
+    capped = build_steps({"action": {"intent": "set_color", "location": "den", "hue": 0, "bri": 100, "transition_seconds": 9000}})
+    assert capped[0]["action"]["transition_seconds"] == MAX_TRANSITION_SECONDS
+    with pytest.raises(ValueError):
+        build_steps({"routine": "moonrise", "location": "den"})
+
+
+def test_parse_when():
+    now = datetime(2024, 5, 1, 8, 30).timestamp()
+    assert parse_when(in_seconds=90, now=now) == now + 90
+    assert parse_when("09:00", now=now) == now + 1800
+    # A time that has already passed today means tomorrow
+    assert parse_when("08:00", now=now) == now + 23.5 * 3600
+    with pytest.raises(ValueError):
+        parse_when("soon", now=now)
+
+
+def test_dynamics_alone_is_not_a_change():
+    mirror = StateMirror()
+    mirror.live = True
+    mirror.resources["grouped_light"]["g1"] = {"id": "g1", "on": {"on": True}}
+    assert mirror.shrink_payload("grouped_light", "g1", {"on": {"on": True}, "dynamics": {"duration": 1000}}) == {}
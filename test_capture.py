@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+
+from capture import CaptureMiddleware, CaptureWriter, add_dispatch, annotate
+from metrics import MetricsMiddleware, StageTimer
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_writer_rotates_by_size(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    writer = CaptureWriter(path=path, max_bytes=200, backups=2)
+
+    async def run():
+        for i in range(3):
+            writer.record({"i": i, "padding": "x" * 100})
+            await writer.flush()
+        await writer.close()
+
+    asyncio.run(run())
+    assert [e["i"] for e in read_lines(path)] == [2]
+    assert [e["i"] for e in read_lines(path + ".1")] == [1]
+    assert [e["i"] for e in read_lines(path + ".2")] == [0]
+    assert writer.rotations == 2 and writer.written == 3
+
+
+def test_writer_drops_when_buffer_full(tmp_path):
+    writer = CaptureWriter(path=str(tmp_path / "requests.jsonl"), max_buffer=2)
+
+    async def run():
+        for i in range(3):
+            writer.record({"i": i})
+        await writer.close()
+
+    asyncio.run(run())
+    assert writer.dropped == 1 and writer.written == 2
+
+
+def test_middleware_records_request_annotations_and_timings(tmp_path):
+    path = str(tmp_path / "requests.jsonl")
+    writer = CaptureWriter(path=path)
+
+    async def app(scope, receive, send):
+        body = json.loads((await receive())["body"])
+        annotate(parse_path="local", parsed={"intent": "trigger_scene"})
+        with StageTimer("bridge"):
+            add_dispatch({"intent": "trigger_scene"}, 200)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": json.dumps({"echo": body["text"]}).encode()})
+
+    async def receive():
+        return {"type": "http.request", "body": b'{"text": "relax in the bedroom"}'}
+
+    async def send(message):
+        pass
+
+    async def run():
+        wrapped = MetricsMiddleware(CaptureMiddleware(app, writer))
+        await wrapped({"type": "http", "method": "POST", "path": "/execute"}, receive, send)
+        await wrapped({"type": "http", "method": "GET", "path": "/metrics"}, receive, send)
+        await writer.close()
+
+    asyncio.run(run())
+    [entry] = read_lines(path)
+    assert entry["request"] == {"text": "relax in the bedroom"}
+    assert entry["response"] == {"echo": "relax in the bedroom"}
+    assert entry["status"] == 200 and entry["parse_path"] == "local"
+    assert entry["dispatched"] == [{"action": {"intent": "trigger_scene"}, "status": 200}]
+    assert entry["timings_ms"][0][0] == "bridge"
+
+
+def test_sample_rate_zero_records_nothing(tmp_path):
+    writer = CaptureWriter(path=str(tmp_path / "requests.jsonl"), sample_rate=0.0)
+    assert not any(writer.sampled() for _ in range(100))
+    assert not os.path.exists(writer.path)
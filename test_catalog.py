@@ -0,0 +1,101 @@
+import asyncio
+import copy
+import json
+import os
+
+from catalog import build_catalog, diff_catalogs
+from scene_sync import CatalogSync, load_snapshot
+
+ROOMS = [
+    {"id": "room1", "metadata": {"name": "Living Room"}, "services": [{"rid": "gl1", "rtype": "grouped_light"}]},
+    {"id": "room2", "metadata": {"name": "Bedroom"}, "services": [{"rid": "gl2", "rtype": "grouped_light"}]}
+]
+
+
+def make_scene(scene_id, name, room, brightness=50.0):
+    return {
+        "id": scene_id,
+        "metadata": {"name": name},
+        "group": {"rid": room, "rtype": "room"},
+        "actions": [{"target": {"rid": "l1", "rtype": "light"}, "action": {"on": {"on": True}, "dimming": {"brightness": brightness}}}],
+        "status": {"active": "inactive"}
+    }
+
+
+SCENES = [
+    make_scene("s1", "Relax", "room1"),
+    make_scene("s2", "Relax", "room2"),
+    make_scene("s3", "Read", "room2"),
+    make_scene("s4", "jarvis:abc123", "room1")
+]
+
+
+class FakeHue:
+    def __init__(self, scenes, rooms):
+        self.resources = {"scene": scenes, "room": rooms, "zone": []}
+
+    async def get_resource(self, rtype):
+        return copy.deepcopy(self.resources[rtype])
+
+
+def test_build_catalog():
+    catalog = build_catalog(SCENES, ROOMS)
+    assert dict(catalog.locations) == {"living_room": "gl1", "bedroom": "gl2"}
+    # Compiled scenes stay out; a name in several rooms resolves per room
+    assert sorted(catalog.scenes) == ["read", "relax"]
+    assert catalog.scene_id("Relax", "bedroom") == "s2"
+    assert catalog.scene_id("relax", "living room") == "s1"
+    assert build_catalog(SCENES, [], fallback_locations={"den": "g9"}).locations == {"den": "g9"}
+
+
+def test_diff_catalogs_reports_names_and_looks():
+    old = build_catalog(SCENES, ROOMS)
+    scenes = [make_scene("s1", "Relax", "room1", brightness=90.0), make_scene("s3", "Read", "room2"), make_scene("s5", "Movie", "room1")]
+    new = build_catalog(scenes, ROOMS)
+    diff = diff_catalogs(old, new)
+    assert diff["scenes"] == {"added": ["movie"], "removed": [], "changed": []}
+    assert diff["looks"] == {"changed": ["relax"]}
+    assert diff["locations"] == {"added": [], "removed": [], "changed": []}
+
+
+def test_sync_once_swaps_on_changes_and_persists(tmp_path):
+    hue = FakeHue(copy.deepcopy(SCENES), ROOMS)
+    changes = []
+    scenes_path, rooms_path = str(tmp_path / "data" / "scenes.json"), str(tmp_path / "data" / "rooms.json")
+    sync = CatalogSync(hue, build_catalog([], [], source="builtin"), scenes_path=scenes_path, rooms_path=rooms_path, on_change=lambda old, new: changes.append(new))
+
+    async def run():
+        swapped = [await sync.sync_once()]
+        # Same scenes; only which one is active changed
+        hue.resources["scene"][0]["status"] = {"active": "static"}
+        swapped.append(await sync.sync_once())
+        # Same names, new look
+        hue.resources["scene"][0]["actions"][0]["action"]["dimming"]["brightness"] = 10.0
+        swapped.append(await sync.sync_once())
+        return swapped
+
+    assert asyncio.run(run()) == [True, False, True]
+    assert sync.last_diff["looks"] == {"changed": ["relax"]}
+    assert changes[0].version == changes[1].version and changes[0].looks_version != changes[1].looks_version
+    assert sync.current.recommender.features["s1"]["brightness"] == 10.0
+    with open(scenes_path) as f:
+        assert len(json.load(f)["data"]) == len(SCENES)
+    assert load_snapshot(scenes_path, rooms_path).looks_version == sync.current.looks_version
+
+
+def test_aliases_survive_the_seed():
+    with open(os.path.join(os.path.dirname(__file__), "scenes.json")) as f:
+        raw_scenes = json.load(f)["data"]
+    # The curated names in main.SCENE_NAME_TO_ID, some of which name a different scene
+    # than the bridge's own scene of that name
+    aliases = {
+        "stefan": "cb2c4125-aa86-48ce-b6d1-08781127f91c",
+        "miami": "97be9237-8cee-484a-ab6b-406e03ab37fa",
+        "soho": "777b5186-b0f7-42ce-ada9-b495a0d38595",
+        "relax": "b11ed74d-8dd9-4cb1-bddf-b99e3f238774"
+    }
+    catalog = build_catalog(raw_scenes, [], aliases={**aliases, "gone": "00000000-0000-0000-0000-000000000000"})
+    assert {name: catalog.scenes[name] for name in aliases} == aliases
+    # Aliases for scenes the bridge no longer has are dropped
+    assert "gone" not in catalog.scenes
+    assert build_catalog(raw_scenes, []).scenes["stefan"] != aliases["stefan"]
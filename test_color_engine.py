@@ -0,0 +1,41 @@
+import random
+
+import color_engine
+from color_engine import clamp_to_gamut, hsb_batch_to_xy, hsb_to_xy, named_color_xy, rgb_batch_to_xy
+
+
+def test_clamp_keeps_inside_points_and_moves_outside_ones_onto_edge():
+    assert clamp_to_gamut(0.3127, 0.329, "C") == (0.3127, 0.329)
+    # Pure sRGB green lies outside gamut B, so it is moved onto the triangle
+    x, y = clamp_to_gamut(0.3, 0.6, "B")
+    assert (x, y) != (0.3, 0.6)
+    assert clamp_to_gamut(x, y, "B") == (x, y)
+
+
+def test_hsb_to_xy_white_and_gamut():
+    assert hsb_to_xy(0, 0, 254) == (0.3127, 0.329)
+    assert hsb_to_xy(43690, 254, 254, "A") != hsb_to_xy(43690, 254, 254, "C")
+
+
+def test_batch_matches_scalar():
+    hsb = [(h, s, b) for h in (0, 12000, 43690, 65535) for s in (0, 120, 254) for b in (1, 254)]
+    assert hsb_batch_to_xy(hsb, "B") == [hsb_to_xy(h, s, b, "B") for h, s, b in hsb]
+    assert rgb_batch_to_xy([(0, 0, 0), (1, 1, 1)]) == [(0.3127, 0.329), (0.3127, 0.329)]
+
+
+def test_numpy_and_fallback_batches_agree(monkeypatch):
+    rng = random.Random(3)
+    hsb = [(rng.randrange(65536), rng.randrange(255), rng.randrange(255)) for _ in range(500)]
+    rgb = [(rng.random(), rng.random(), rng.random()) for _ in range(500)] + [(0, 0, 0)]
+    assert color_engine._numpy() is not None
+    vectorized = [hsb_batch_to_xy(hsb, gamut) for gamut in ("A", "B", "C")] + [rgb_batch_to_xy(rgb)]
+    monkeypatch.setattr(color_engine, "np", None)
+    monkeypatch.setattr(color_engine, "_numpy_checked", True)
+    fallback = [hsb_batch_to_xy(hsb, gamut) for gamut in ("A", "B", "C")] + [rgb_batch_to_xy(rgb)]
+    assert vectorized == fallback
+
+
+def test_named_colors_precomputed():
+    assert named_color_xy("Blue", "C") == hsb_to_xy(43690, 254, 254, "C")
+    assert named_color_xy("calm blue") is not None
+    assert named_color_xy("chartreuse") is None
@@ -0,0 +1,95 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from catalog import Catalog
+from homes import Home, HomeMiddleware, HomeRegistry, current_home, load_homes_config
+
+
+class Stub:
+    """Stands in for the per-home components the registry tests don't exercise."""
+
+    def __init__(self, bridge_ip=None):
+        self.bridge_ip = bridge_ip
+        self.current = Catalog({"relax": "s1"}, {"den": "g1"})
+
+
+def make_home(home_id, **kwargs):
+    stub = Stub()
+    return Home(home_id, stub, stub, stub, stub, stub, stub, stub, **kwargs)
+
+
+def make_app(registry, release=None):
+    async def app(scope, receive, send):
+        if release is not None:
+            await release.wait()
+        body = json.dumps({"home": current_home.get().id}).encode()
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": body})
+    return HomeMiddleware(app, registry)
+
+
+def test_requests_routed_by_header_or_query():
+    registry = HomeRegistry()
+    for home_id in ("default", "smith", "jones"):
+        registry.add(make_home(home_id))
+
+    async def run():
+        transport = httpx.ASGITransport(app=make_app(registry))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return [
+                await client.get("/state"),
+                await client.get("/state", headers={"X-Home-Id": "smith"}),
+                await client.get("/state?home=jones"),
+                await client.get("/state", headers={"X-Home-Id": "nobody"})
+            ]
+
+    default, smith, jones, unknown = asyncio.run(run())
+    assert default.json() == {"home": "default"}
+    assert smith.json() == {"home": "smith"}
+    assert jones.json() == {"home": "jones"}
+    assert unknown.status_code == 404 and "nobody" in unknown.json()["error"]
+    assert registry.get("smith").stats()["requests"] == 1
+    assert current_home.get() is None
+
+
+def test_concurrency_limit_is_per_home():
+    registry = HomeRegistry()
+    registry.add(make_home("default"))
+    registry.add(make_home("busy", max_concurrency=1, max_waiting=1))
+
+    async def run():
+        release = asyncio.Event()
+        transport = httpx.ASGITransport(app=make_app(registry, release))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            busy = [asyncio.create_task(client.get("/", headers={"X-Home-Id": "busy"})) for _ in range(3)]
+            await asyncio.sleep(0.05)
+            stats = registry.get("busy").stats()
+            # The other home is not held up by the busy one
+            other = asyncio.create_task(client.get("/"))
+            await asyncio.sleep(0.05)
+            assert registry.get("default").stats()["in_flight"] == 1
+            release.set()
+            return [r.status_code for r in await asyncio.gather(*busy)], (await other).status_code, stats
+
+    statuses, other, stats = asyncio.run(run())
+    assert sorted(statuses) == [200, 200, 429]
+    assert other == 200
+    assert stats["in_flight"] == 1 and stats["waiting"] == 1 and stats["rejected"] == 1
+
+
+def test_load_homes_config(tmp_path, monkeypatch):
+    monkeypatch.setenv("SMITH_HUE_KEY", "secret")
+    path = tmp_path / "homes.json"
+    path.write_text(json.dumps({"homes": {"smith": {"bridge_ip": "10.0.0.2", "username": "${SMITH_HUE_KEY}", "locations": {"den": "g1"}}}}))
+    configs = load_homes_config(str(path))
+    assert configs == {"smith": {"bridge_ip": "10.0.0.2", "username": "secret", "locations": {"den": "g1"}}}
+
+    path.write_text(json.dumps({"homes": {"../etc": {"bridge_ip": "10.0.0.3"}}}))
+    with pytest.raises(ValueError):
+        load_homes_config(str(path))
+    path.write_text(json.dumps({"homes": {"jones": {"username": "x"}}}))
+    with pytest.raises(ValueError):
+        load_homes_config(str(path))
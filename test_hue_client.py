@@ -0,0 +1,78 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from hue_client import HueClient
+
+
+def make_bridge(requests, status_code=200):
+    def handler(request):
+        requests.append(request)
+        if request.method == "GET":
+            return httpx.Response(status_code, json={"errors": [], "data": [{"id": "g1", "on": {"on": True}}]})
+        return httpx.Response(status_code, json={"errors": [], "data": [{"rid": "g1", "rtype": "grouped_light"}]})
+    return httpx.MockTransport(handler)
+
+
+def test_get_and_put_resources():
+    requests = []
+
+    async def run():
+        hue = HueClient("10.0.0.2", "app-key", transport=make_bridge(requests))
+        try:
+            groups = await hue.get_resource("grouped_light")
+            one = await hue.get_resource("grouped_light", "g1")
+            put = await hue.put_resource("grouped_light", "g1", {"on": {"on": False}})
+        finally:
+            await hue.aclose()
+        return groups, one, put
+
+    groups, one, put = asyncio.run(run())
+    assert groups == one == [{"id": "g1", "on": {"on": True}}]
+    assert put["data"] == [{"rid": "g1", "rtype": "grouped_light"}]
+    assert [(r.method, str(r.url)) for r in requests] == [
+        ("GET", "https://10.0.0.2/clip/v2/resource/grouped_light"),
+        ("GET", "https://10.0.0.2/clip/v2/resource/grouped_light/g1"),
+        ("PUT", "https://10.0.0.2/clip/v2/resource/grouped_light/g1")
+    ]
+    assert all(r.headers["hue-application-key"] == "app-key" for r in requests)
+    assert json.loads(requests[-1].content) == {"on": {"on": False}}
+
+
+def test_error_responses_raise():
+    async def run(transport):
+        hue = HueClient("10.0.0.2", "app-key", transport=transport)
+        try:
+            await hue.put_resource("grouped_light", "g1", {"on": {"on": True}})
+        finally:
+            await hue.aclose()
+
+    with pytest.raises(httpx.HTTPStatusError) as error:
+        asyncio.run(run(make_bridge([], status_code=429)))
+    assert error.value.response.status_code == 429
+
+    def unreachable(request):
+        raise httpx.ConnectError("bridge unreachable")
+
+    with pytest.raises(httpx.HTTPError):
+        asyncio.run(run(httpx.MockTransport(unreachable)))
+
+
+def test_reopens_after_close():
+    requests = []
+
+    async def run():
+        hue = HueClient("10.0.0.2", "app-key", transport=make_bridge(requests), scheme="http")
+        hue.open()
+        await hue.get_resource("light")
+        await hue.aclose()
+        # Used again after shutdown (e.g. the CLI after the app stopped): a new pool is opened
+        lights = await hue.get_resource("light")
+        await hue.aclose()
+        await hue.aclose()
+        return lights
+
+    assert asyncio.run(run()) == [{"id": "g1", "on": {"on": True}}]
+    assert len(requests) == 2 and requests[1].url.scheme == "http"
@@ -0,0 +1,74 @@
+import asyncio
+
+from hue_scheduler import HueScheduler
+
+
+def test_coalescing_and_ordering_per_group():
+    sent = []
+
+    async def send(rtype, rid, payload):
+        await asyncio.sleep(0.01)
+        sent.append((rtype, rid, payload))
+        return {"sent": payload}
+
+    async def run():
+        scheduler = HueScheduler(send, rates={"grouped_light": (1000.0, 10), "scene": (1000.0, 10)})
+        first = asyncio.create_task(scheduler.submit("g1", "grouped_light", "g1", {"on": {"on": True}}))
+        await asyncio.sleep(0)  # first command is now in flight
+        burst = [
+            asyncio.create_task(scheduler.submit("g1", "grouped_light", "g1", {"dimming": {"brightness": b}}))
+            for b in (10, 20, 30)
+        ]
+        scene = asyncio.create_task(scheduler.submit("g1", "scene", "s1", {"recall": {"action": "active"}}))
+        results = await asyncio.gather(first, *burst, scene)
+        return scheduler, results
+
+    scheduler, results = asyncio.run(run())
+    assert sent == [
+        ("grouped_light", "g1", {"on": {"on": True}}),
+        ("grouped_light", "g1", {"dimming": {"brightness": 30}}),
+        ("scene", "s1", {"recall": {"action": "active"}})
+    ]
+    # Every coalesced caller sees the result of the PUT that carried its payload
+    assert results[1] == results[2] == results[3] == {"sent": {"dimming": {"brightness": 30}}}
+    assert scheduler.stats()["coalesced_drops"] == 2
+    assert scheduler.stats()["queue_depth"] == 0
+
+
+def test_coalesced_command_does_not_inherit_transition():
+    sent = []
+
+    async def send(rtype, rid, payload):
+        await asyncio.sleep(0.01)
+        sent.append(payload)
+        return {}
+
+    async def run():
+        scheduler = HueScheduler(send, rates={"grouped_light": (1000.0, 10)})
+        first = asyncio.create_task(scheduler.submit("g1", "grouped_light", "g1", {"on": {"on": True}}))
+        await asyncio.sleep(0)
+        fade = asyncio.create_task(scheduler.submit("g1", "grouped_light", "g1", {"dimming": {"brightness": 5}, "dynamics": {"duration": 600000}}))
+        now = asyncio.create_task(scheduler.submit("g1", "grouped_light", "g1", {"dimming": {"brightness": 80}}))
+        await asyncio.gather(first, fade, now)
+
+    asyncio.run(run())
+    assert sent[-1] == {"dimming": {"brightness": 80}}
+
+
+def test_throttle_shares_the_bucket():
+    async def send(rtype, rid, payload):
+        return payload
+
+    async def run():
+        scheduler = HueScheduler(send, rates={"scene": (20.0, 1)})
+        start = asyncio.get_running_loop().time()
+        await scheduler.throttle("scene")
+        await scheduler.submit("g1", "scene", "s1", {"recall": {"action": "active"}})
+        await scheduler.throttle("scene")
+        # Unlimited resource types don't wait
+        await scheduler.throttle("device")
+        return asyncio.get_running_loop().time() - start, scheduler.stats()
+
+    elapsed, stats = asyncio.run(run())
+    assert elapsed >= 0.09
+    assert stats["rate_limit_wait_seconds"]["scene"] > 0
@@ -0,0 +1,54 @@
+from hue_state import StateMirror
+
+
+def make_mirror():
+    mirror = StateMirror()
+    mirror.load("grouped_light", [{"id": "g1", "owner": {"rid": "room1", "rtype": "room"}, "on": {"on": True}, "dimming": {"brightness": 50.0}}])
+    mirror.load("light", [{"id": "l1", "on": {"on": True}, "dimming": {"brightness": 50.0}, "color": {"xy": {"x": 0.3, "y": 0.3}}}])
+    mirror.load("scene", [{"id": "s1", "group": {"rid": "room1", "rtype": "room"}}])
+    mirror.live = True
+    return mirror
+
+
+def test_shrink_payload_drops_confirmed_matches():
+    mirror = make_mirror()
+    assert mirror.shrink_payload("grouped_light", "g1", {"on": {"on": True}, "dimming": {"brightness": 50.5}}) == {}
+    assert mirror.shrink_payload("grouped_light", "g1", {"on": {"on": True}, "dimming": {"brightness": 80}}) == {"dimming": {"brightness": 80}}
+    assert mirror.shrink_payload("light", "l1", {"color": {"xy": {"x": 0.301, "y": 0.3}}}) == {}
+    assert mirror.suppressed == 2 and mirror.shrunk == 1
+    # Not trusted until the event stream is connected
+    mirror.live = False
+    assert mirror.shrink_payload("grouped_light", "g1", {"on": {"on": True}}) == {"on": {"on": True}}
+
+
+def test_group_colour_is_always_sent():
+    mirror = make_mirror()
+    payload = {"on": {"on": True}, "color": {"xy": {"x": 0.5, "y": 0.4}}}
+    mirror.apply_put("grouped_light", "g1", payload)
+    assert "color" not in mirror.get("grouped_light", "g1")
+    # The same colour again (e.g. after a scene or the Hue app changed the lights) still goes out
+    assert mirror.shrink_payload("grouped_light", "g1", payload) == {"color": {"xy": {"x": 0.5, "y": 0.4}}}
+
+
+def test_apply_event_updates_adds_and_deletes():
+    mirror = make_mirror()
+    touched = mirror.apply_event({"type": "update", "data": [
+        {"id": "g1", "type": "grouped_light", "dimming": {"brightness": 10.0}},
+        {"id": "d1", "type": "device"}
+    ]})
+    assert touched == [("update", "grouped_light", "g1"), ("update", "device", "d1")]
+    assert mirror.get("grouped_light", "g1")["dimming"]["brightness"] == 10.0
+    assert mirror.get("grouped_light", "g1")["on"] == {"on": True}
+    mirror.apply_event({"type": "add", "data": [{"id": "s2", "type": "scene"}]})
+    mirror.apply_event({"type": "delete", "data": [{"id": "l1", "type": "light"}]})
+    assert mirror.get("scene", "s2") is not None and mirror.get("light", "l1") is None
+
+
+def test_scene_recall_forgets_group_state():
+    mirror = make_mirror()
+    mirror.apply_put("scene", "s1", {"recall": {"action": "active"}})
+    assert mirror.get("grouped_light", "g1") is None
+    assert mirror.shrink_payload("grouped_light", "g1", {"on": {"on": True}}) == {"on": {"on": True}}
+    # The bridge's next event for the group is mirrored again
+    mirror.apply_event({"type": "update", "data": [{"id": "g1", "type": "grouped_light", "on": {"on": True}}]})
+    assert mirror.shrink_payload("grouped_light", "g1", {"on": {"on": True}}) == {}
@@ -0,0 +1,133 @@
+import asyncio
+import json
+
+import httpx
+
+import ifttt_dispatcher
+from ifttt_dispatcher import IftttDispatcher
+
+URL = "https://ifttt.test/trigger/ac_power/json/with/key/test"
+
+
+def test_retry_then_deliver_and_deduplicate_by_key(tmp_path, monkeypatch):
+    monkeypatch.setattr(ifttt_dispatcher, "BASE_BACKOFF", 0.01)
+    responses = [503, 200]
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(responses.pop(0))
+
+    async def run():
+        dispatcher = IftttDispatcher(path=str(tmp_path / "queue.db"), workers=2, transport=httpx.MockTransport(handler))
+        first = dispatcher.submit("ac_power", URL, {"value1": "on"}, dedup_key="/execute k1")
+        second = dispatcher.submit("ac_power", URL, {"value1": "on"}, dedup_key="/execute k1")
+        outcome = await asyncio.wait_for(dispatcher.watch(first[0]), 1)
+        stats = dispatcher.stats()
+        # Watching a webhook that has already been delivered resolves straight away
+        assert (await dispatcher.watch(first[0])) == outcome
+        await dispatcher.stop()
+        return first, second, stats, outcome
+
+    first, second, stats, outcome = asyncio.run(run())
+    assert outcome == {"delivered": True, "attempts": 2}
+    assert second == (first[0], True)
+    assert len(requests) == 2
+    assert stats["delivered"] == 1 and stats["retries"] == 1 and stats["deduplicated"] == 1
+    assert stats["queue_depth"] == 0
+
+
+def test_undelivered_webhooks_replayed_on_start(tmp_path):
+    path = str(tmp_path / "data" / "queue.db")
+    delivered = []
+
+    async def enqueue_then_crash():
+        def down(request):
+            raise httpx.ConnectError("bridge down")
+        dispatcher = IftttDispatcher(path=path, workers=1, max_attempts=100, transport=httpx.MockTransport(down))
+        dispatcher.submit("TV_power", URL, {"value1": "off"})
+        await dispatcher.stop()
+
+    async def restart():
+        def ok(request):
+            delivered.append(request.content)
+            return httpx.Response(200)
+        dispatcher = IftttDispatcher(path=path, workers=1, transport=httpx.MockTransport(ok))
+        dispatcher.start()
+        for _ in range(100):
+            if dispatcher.delivered:
+                break
+            await asyncio.sleep(0.01)
+        stats = dispatcher.stats()
+        await dispatcher.stop()
+        return stats
+
+    asyncio.run(enqueue_then_crash())
+    stats = asyncio.run(restart())
+    assert stats["replayed"] == 1 and stats["delivered"] == 1
+    assert [json.loads(body) for body in delivered] == [{"value1": "off"}]
+
+
+def test_same_command_for_two_homes_is_not_deduplicated(tmp_path):
+    async def run():
+        dispatcher = IftttDispatcher(path=str(tmp_path / "queue.db"), transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+        first = dispatcher.submit("ac_power", URL, {"value1": "on"})
+        other_home = dispatcher.submit("ac_power", URL.replace("/key/test", "/key/other"), {"value1": "on"})
+        await dispatcher.stop()
+        return first, other_home
+
+    first, other_home = asyncio.run(run())
+    assert other_home[1] is False and other_home[0] != first[0]
+
+
+def test_repeated_commands_without_a_key_are_all_sent(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200)
+
+    async def run():
+        dispatcher = IftttDispatcher(path=str(tmp_path / "queue.db"), workers=1, transport=httpx.MockTransport(handler))
+        # "Turn on the AC", then off and on again
+        ids = [dispatcher.submit("ac_power", URL, {"value1": command})[0] for command in ("on", "off", "on")]
+        await asyncio.wait_for(asyncio.gather(*(dispatcher.watch(row_id) for row_id in ids)), 1)
+        await dispatcher.stop()
+
+    asyncio.run(run())
+    assert requests == [{"value1": "on"}, {"value1": "off"}, {"value1": "on"}]
+
+
+def test_unexpected_errors_are_retried_and_resolve_watchers(tmp_path, monkeypatch):
+    monkeypatch.setattr(ifttt_dispatcher, "BASE_BACKOFF", 0.01)
+
+    def broken(request):
+        raise RuntimeError("proxy misconfigured")
+
+    async def run():
+        dispatcher = IftttDispatcher(path=str(tmp_path / "queue.db"), workers=1, max_attempts=2, transport=httpx.MockTransport(broken))
+        row_id, _ = dispatcher.submit("ac_power", URL, {"value1": "on"})
+        outcome = await asyncio.wait_for(dispatcher.watch(row_id), 1)
+        stats = dispatcher.stats()
+        await dispatcher.stop()
+        return outcome, stats
+
+    outcome, stats = asyncio.run(run())
+    assert outcome == {"delivered": False, "attempts": 2, "error": "proxy misconfigured"}
+    assert stats["retries"] == 1 and stats["failed"] == 1 and stats["queue_depth"] == 0
+
+
+def test_worker_errors_resolve_watchers(tmp_path):
+    async def run():
+        dispatcher = IftttDispatcher(path=str(tmp_path / "queue.db"), workers=1, transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+
+        async def crash(row_id):
+            raise OSError("disk I/O error")
+
+        dispatcher._deliver = crash
+        row_id, _ = dispatcher.submit("ac_power", URL, {"value1": "on"})
+        outcome = await asyncio.wait_for(dispatcher.watch(row_id), 1)
+        await dispatcher.stop()
+        return outcome
+
+    assert asyncio.run(run()) == {"delivered": False, "attempts": None, "error": "disk I/O error"}
@@ -0,0 +1,37 @@
+import time
+
+from intent_cache import IntentCache, catalog_version, normalize_text
+
+
+def test_normalized_text_shares_entry():
+    cache = IntentCache(version="v1")
+    cache.put("Turn on the AC!", {"intent": "trigger_ifttt", "device": "ac", "command": "on"})
+    assert normalize_text("turn  on the ac") == "turn on the ac"
+    assert cache.get("turn on the  ac")["device"] == "ac"
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_and_ttl_eviction():
+    cache = IntentCache(max_entries=2, ttl_seconds=0.05, version="v1")
+    cache.put("a", {"intent": "a"})
+    cache.put("b", {"intent": "b"})
+    cache.get("a")
+    cache.put("c", {"intent": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 2
+
+
+def test_catalog_change_invalidates():
+    scenes = {"sesh": "id-1"}
+    locations = {"bedroom": "group-1"}
+    cache = IntentCache(version=catalog_version(scenes, locations))
+    cache.put("sesh in the bedroom", {"intent": "trigger_scene", "scene_name": "sesh"})
+    cache.set_version(catalog_version(scenes, locations))
+    assert cache.get("sesh in the bedroom") is not None
+    scenes["chill"] = "id-2"
+    cache.set_version(catalog_version(scenes, locations))
+    assert cache.get("sesh in the bedroom") is None
+    assert cache.stats()["invalidations"] == 1
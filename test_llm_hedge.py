@@ -0,0 +1,55 @@
+import asyncio
+
+import pytest
+
+from llm_hedge import MIN_SAMPLES, DeadlineExceeded, HedgedRequester
+
+
+def test_slow_first_attempt_is_hedged_and_cancelled():
+    requester = HedgedRequester(deadline=2.0, default_delay=0.02)
+    calls = []
+    cancelled = []
+
+    async def attempt(timeout):
+        calls.append(timeout)
+        try:
+            await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(len(calls))
+            raise
+        return len(calls)
+
+    assert asyncio.run(requester.call(attempt)) == 2
+    assert cancelled and requester.hedged == 1 and requester.hedge_wins == 1
+    assert calls[1] < calls[0] <= 2.0
+
+
+def test_failed_attempt_is_retried_within_max_attempts():
+    requester = HedgedRequester(max_attempts=2, hedge_percentile=None)
+    attempts = []
+
+    async def attempt(timeout):
+        attempts.append(timeout)
+        raise ValueError("invalid JSON")
+
+    with pytest.raises(ValueError):
+        asyncio.run(requester.call(attempt))
+    assert len(attempts) == 2 and requester.retries == 1 and requester.failed == 1
+
+
+def test_deadline_bounds_the_whole_call():
+    requester = HedgedRequester(deadline=0.05, default_delay=0.01)
+
+    async def attempt(timeout):
+        await asyncio.sleep(1.0)
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(requester.call(attempt))
+    assert requester.deadline_exceeded == 1 and requester.hedged == 1
+
+
+def test_hedge_delay_is_learned_from_recent_latencies():
+    requester = HedgedRequester(hedge_percentile=0.9, default_delay=3.0)
+    assert requester.hedge_delay() == 3.0
+    requester.attempt_latencies.extend([0.5] * (MIN_SAMPLES - 2) + [1.5, 1.5])
+    assert requester.hedge_delay() == 1.5
@@ -0,0 +1,38 @@
+from llm_stream import IncrementalJSONObject, ready_intent
+
+
+def test_fields_complete_before_closing_brace():
+    parser = IncrementalJSONObject()
+    assert parser.feed('{"intent": "trigger_ifttt", "dev') == ["intent"]
+    assert ready_intent(parser.fields) is None
+    assert parser.feed('ice": "ac", "command": "on",') == ["device", "command"]
+    assert ready_intent(parser.fields) == "trigger_ifttt"
+    assert not parser.complete
+
+
+def test_nested_values_and_escaped_strings():
+    parser = IncrementalJSONObject()
+    for chunk in ['{"a": {"b": [1,', ' 2]}, "s": "x,\\"}y"', '}']:
+        parser.feed(chunk)
+    assert parser.fields == {"a": {"b": [1, 2]}, "s": 'x,"}y'}
+    assert parser.complete
+
+
+def test_action_items_available_as_each_closes():
+    parser = IncrementalJSONObject()
+    parser.feed('{"actions": [{"intent": "trigger_ifttt", "device": "ac", "command": "on"}, {"intent": "trig')
+    assert parser.items == [{"intent": "trigger_ifttt", "device": "ac", "command": "on"}]
+    parser.feed('ger_scene", "scene_name": "relax", "location": "bedroom"}]}')
+    assert len(parser.items) == 2
+    assert parser.complete
+
+
+def test_descriptions_wait_for_the_closing_brace():
+    parser = IncrementalJSONObject()
+    parser.feed('{"intent": "set_color", "location": "den", "color_description": "warm",')
+    # brightness_description may still follow
+    assert ready_intent(parser.fields, complete=False) is None
+    parser.feed(' "brightness_description": "dim"}')
+    assert ready_intent(parser.fields) == "set_color"
+    exact = {"intent": "set_color", "location": "den", "hue": 30, "sat": 254, "bri": 100}
+    assert ready_intent(exact, complete=False) == "set_color"
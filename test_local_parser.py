@@ -0,0 +1,26 @@
+from local_parser import DEFAULT_MIN_CONFIDENCE, parse_locally
+
+SCENES = ["movie mode", "sesh", "bright", "stef night"]
+LOCATIONS = ["bedroom", "living_room"]
+
+
+def test_device_commands():
+    parsed, confidence = parse_locally("Turn on the AC", SCENES, LOCATIONS)
+    assert parsed == {"intent": "trigger_ifttt", "device": "ac", "command": "on"}
+    assert confidence >= DEFAULT_MIN_CONFIDENCE
+
+    parsed, _ = parse_locally("open the curtains please", SCENES, LOCATIONS)
+    assert parsed == {"intent": "trigger_ifttt", "device": "curtains", "command": "open"}
+
+
+def test_scene_with_location():
+    parsed, confidence = parse_locally("movie mode in the living room", SCENES, LOCATIONS)
+    assert parsed == {"intent": "trigger_scene", "scene_name": "movie mode", "location": "living_room"}
+    assert confidence >= DEFAULT_MIN_CONFIDENCE
+
+
+def test_descriptive_requests_stay_low_confidence():
+    for text in ["make the bedroom bright blue", "movie mode", "turn on the tv and open the curtains"]:
+        _, confidence = parse_locally(text, SCENES, LOCATIONS)
+        assert confidence < DEFAULT_MIN_CONFIDENCE, text
+    assert parse_locally("make the bedroom soft pink", SCENES, LOCATIONS) == (None, 0.0)
@@ -0,0 +1,35 @@
+import asyncio
+
+from metrics import Histogram, MetricsMiddleware, StageTimer
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "llm")
+    text = histogram.render()
+    assert 'test_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'test_seconds_bucket{stage="llm",le="1.0"} 2' in text
+    assert 'test_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'test_seconds_count{stage="llm"} 3' in text
+
+
+def test_middleware_adds_server_timing_for_stages():
+    async def app(scope, receive, send):
+        with StageTimer("bridge", "set_color", "Bedroom"):
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    asyncio.run(MetricsMiddleware(app)({"type": "http", "method": "POST", "path": "/control"}, receive, send))
+    headers = dict(sent[0]["headers"])
+    timing = headers[b"server-timing"].decode()
+    assert timing.startswith("bridge;dur=") and "total;dur=" in timing
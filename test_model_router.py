@@ -0,0 +1,70 @@
+from model_router import MIN_LATENCY_SAMPLES, PROBE_EVERY, TUNE_WINDOW, ModelRouter
+from pipeline import parse_problems
+
+
+def test_short_catalog_commands_go_to_the_fast_model():
+    router = ModelRouter(fast_model="fast", strong_model="strong", max_words=4)
+    assert router.choose("turn off the tv") == "fast"
+    assert router.choose("make the bedroom feel like a beach at dusk") == "strong"
+    # Naming a known scene or room allows a few more words
+    text = "set the movie night scene in den"
+    assert router.choose(text) == "strong"
+    assert router.choose(text, catalog_words={"movie", "night", "den"}) == "fast"
+    assert router.routed == {"fast": 2, "strong": 2}
+
+
+def test_routing_disabled_when_models_are_the_same():
+    router = ModelRouter(fast_model="strong", strong_model="strong")
+    assert router.choose("turn off the tv") == "strong"
+    router.record("strong", 1.0, valid=False)
+    assert router.escalations == 0
+
+
+def test_failures_count_escalations_and_tune_max_words():
+    router = ModelRouter(fast_model="fast", strong_model="strong", max_words=8, target_failure_rate=0.1)
+    for i in range(TUNE_WINDOW):
+        router.record("fast", 0.1, valid=i % 4 != 0)
+    assert router.escalations == TUNE_WINDOW // 4 + 1
+    assert router.max_words == 7
+    for _ in range(TUNE_WINDOW):
+        router.record("fast", 0.1, valid=True)
+    assert router.max_words == 8
+    assert router.stats()["models"]["fast"]["failure_rate"] == round(13 / 100, 4)
+
+
+def test_slow_fast_model_is_bypassed():
+    router = ModelRouter(fast_model="fast", strong_model="strong")
+    for _ in range(MIN_LATENCY_SAMPLES):
+        router.record("fast", 2.0, valid=True)
+        router.record("strong", 1.0, valid=True)
+    assert not router.fast_is_faster()
+    assert router.choose("turn off the tv") == "strong"
+
+
+def test_bypassed_fast_model_is_probed_and_recovers():
+    router = ModelRouter(fast_model="fast", strong_model="strong")
+    for _ in range(MIN_LATENCY_SAMPLES):
+        router.record("fast", 2.0, valid=True)
+        router.record("strong", 1.0, valid=True)
+    chosen = [router.choose("turn off the tv") for _ in range(PROBE_EVERY)]
+    assert chosen.count("fast") == 1 and router.probes == 1
+    # The fast model is quick again: once the probes outnumber the old samples in the
+    # recent window, simple requests go back to it
+    probes = 0
+    while not router.fast_is_faster():
+        model = router.choose("turn off the tv")
+        router.record(model, 0.2 if model == "fast" else 1.0, valid=True)
+        probes += model == "fast"
+    assert probes <= MIN_LATENCY_SAMPLES // 2 + 1
+    assert router.choose("turn off the tv") == "fast"
+
+
+def test_parse_problems_flags_incomplete_intents():
+    assert parse_problems({"intent": "trigger_ifttt", "device": "tv", "command": "on"}) == []
+    assert parse_problems({"intent": "set_color"}) == ["set_color missing location, hue/sat/bri or color_description"]
+    assert parse_problems({"intent": "set_color", "location": "den", "color_description": "warm"}) == []
+    assert parse_problems({"intent": "set_color", "location": "den", "hue": 30, "sat": 254, "bri": 200}) == []
+    assert parse_problems({"intent": "set_color", "color_description": "warm", "hue": 30}) == ["set_color missing location"]
+    assert parse_problems({"intent": "trigger_scene", "location": "den"}) == ["trigger_scene missing scene_name"]
+    assert parse_problems({"actions": [{"intent": "dance"}]}) == ["unknown intent 'dance'"]
+    assert parse_problems({}) == ["no actions"]
@@ -0,0 +1,33 @@
+import json
+
+from pipeline import ActionResult, ParseResult, failure, to_response, validate_action
+
+
+def test_validate_action_coerces_and_keeps_extras():
+    action, invalid = validate_action({"intent": "set_color", "location": "bedroom", "hue": "200", "bri": 150.5, "note": "x"})
+    assert invalid is None
+    assert action.hue == 200 and isinstance(action.hue, int)
+    assert action.bri == 150.5 and action.sat is None
+    assert action.note == "x"
+
+
+def test_validate_action_rejects_bad_fields():
+    action, invalid = validate_action({"intent": "set_color", "hue": "warm"})
+    assert action is None
+    assert invalid.status_code == 400
+    assert invalid.body["error"].startswith("Invalid action: hue:")
+    assert invalid.body["parsed_data"] == {"intent": "set_color", "hue": "warm"}
+
+
+def test_to_response_serializes_results_and_parses():
+    response = to_response(failure("Missing scene_name"), "cache")
+    assert response.status_code == 400
+    assert json.loads(response.body) == {"error": "Missing scene_name"}
+    assert response.headers["X-Parse-Path"] == "cache"
+
+    parsed = {"intent": "trigger_scene", "scene_name": "relax"}
+    response = to_response(ParseResult(parsed=parsed, parse_path="local", confidence=0.9))
+    assert json.loads(response.body) == parsed
+    assert response.headers["X-Parse-Path"] == "local"
+    assert response.headers["X-Parse-Confidence"] == "0.9"
+    assert to_response(ActionResult(body={})).status_code == 200
@@ -0,0 +1,96 @@
+import asyncio
+
+from catalog import build_catalog
+from scene_compiler import SceneCompiler, group_for_grouped_light, group_lights, light_actions
+
+ROOMS = [{
+    "id": "room-1",
+    "type": "room",
+    "metadata": {"name": "Bedroom"},
+    "children": [{"rid": "dev-1", "rtype": "device"}, {"rid": "dev-2", "rtype": "device"}],
+    "services": [{"rid": "gl-1", "rtype": "grouped_light"}]
+}]
+LIGHTS = [
+    {"id": "light-a", "owner": {"rid": "dev-1"}, "color": {"gamut_type": "A"}},
+    {"id": "light-c", "owner": {"rid": "dev-2"}, "color": {"gamut_type": "C"}},
+    {"id": "light-x", "owner": {"rid": "dev-9"}}
+]
+
+
+class FakeHue:
+    def __init__(self):
+        self.calls = []
+
+    async def post_resource(self, rtype, payload):
+        await asyncio.sleep(0.01)
+        self.calls.append(("POST", rtype, payload["metadata"]["name"]))
+        return {"data": [{"rid": f"scene-{len(self.calls)}", "rtype": "scene"}]}
+
+    async def put_resource(self, rtype, rid, payload):
+        self.calls.append(("PUT", rtype, rid))
+        return {"data": [{"rid": rid}]}
+
+    async def delete_resource(self, rtype, rid):
+        self.calls.append(("DELETE", rtype, rid))
+        return {"data": [{"rid": rid}]}
+
+
+def test_group_lights_and_per_gamut_actions():
+    group = group_for_grouped_light("gl-1", ROOMS)
+    assert group == {"rid": "room-1", "rtype": "room"}
+    lights = group_lights(group, ROOMS, LIGHTS)
+    assert [light["id"] for light in lights] == ["light-a", "light-c"]
+    actions = light_actions(lights, 43690, 254, 254)
+    assert actions[0]["action"]["color"] != actions[1]["action"]["color"]
+
+
+def test_compile_after_repeat_then_recall_and_evict():
+    hue = FakeHue()
+    compiler = SceneCompiler(hue, max_scenes=1, compile_after=2, cache_path=None)
+    group = {"rid": "room-1", "rtype": "room"}
+    blue = light_actions(LIGHTS[:2], 43690, 254, 254)
+    red = light_actions(LIGHTS[:2], 0, 254, 254)
+
+    async def run():
+        first = await compiler.scene_for(group, blue)
+        second = await compiler.scene_for(group, blue)
+        third = await compiler.scene_for(group, blue)
+        await compiler.scene_for(group, red)
+        reused = await compiler.scene_for(group, red)
+        return first, second, third, reused
+
+    first, second, third, reused = asyncio.run(run())
+    assert first is None
+    assert second == third == "scene-1"
+    # Capacity reached: the old scene in the same group is overwritten in place
+    assert reused == "scene-1"
+    assert [call[0] for call in hue.calls] == ["POST", "PUT"]
+    assert compiler.stats()["hits"] == 1
+
+
+def test_concurrent_requests_compile_once_within_rate_limit():
+    hue = FakeHue()
+    throttled = []
+
+    async def throttle(rtype):
+        throttled.append(rtype)
+
+    compiler = SceneCompiler(hue, compile_after=1, cache_path=None, throttle=throttle)
+    group = {"rid": "room-1", "rtype": "room"}
+    blue = light_actions(LIGHTS[:2], 43690, 254, 254)
+
+    async def run():
+        return await asyncio.gather(*(compiler.scene_for(group, blue) for _ in range(5)))
+
+    assert asyncio.run(run()) == ["scene-1"] * 5
+    assert hue.calls == [("POST", "scene", hue.calls[0][2])]
+    assert throttled == ["scene"]
+    assert compiler.stats()["created"] == 1 and compiler.stats()["hits"] == 4
+
+
+def test_compiled_scenes_stay_out_of_catalog():
+    scenes = [
+        {"id": "s1", "metadata": {"name": "Relax"}, "group": {"rid": "room-1"}},
+        {"id": "s2", "metadata": {"name": "jarvis:abc123"}, "group": {"rid": "room-1"}}
+    ]
+    assert dict(build_catalog(scenes, ROOMS).scenes) == {"relax": "s1"}
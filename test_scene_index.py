@@ -0,0 +1,47 @@
+from scene_index import SceneIndex, phonetic_key
+
+CATALOG = {
+    "sesh": "id-sesh",
+    "whiskey": "id-whiskey",
+    "savanna sunset": "id-savanna",
+    "sunset": "id-sunset",
+    "stef night": "id-stef-night",
+    "movie mode": "id-movie"
+}
+
+
+def test_phonetic_key():
+    assert phonetic_key("whisky") == phonetic_key("whiskey")
+    # A consonant repeated across a vowel is part of the sound, not a doubled letter
+    assert phonetic_key("mimi") != phonetic_key("mo")
+    assert phonetic_key("savanna") == phonetic_key("savana")
+
+
+def test_voice_transcribed_names():
+    index = SceneIndex(CATALOG)
+    assert index.best_match("sea sesh") == "id-sesh"
+    assert index.best_match("whisky") == "id-whiskey"
+    assert index.best_match("stef nite") == "id-stef-night"
+    assert index.best_match("savannah sunset") == "id-savanna"
+    assert index.best_match("nothing like it") is None
+
+
+def test_search_ranks_candidates():
+    results = SceneIndex(CATALOG).search("sunset", k=2)
+    assert results[0] == ("sunset", "id-sunset", 1.0)
+    assert results[1][0] == "savanna sunset"
+    assert results[1][2] < 1.0
+
+
+def test_short_names_keep_apart():
+    index = SceneIndex({"mimi": "id-mimi", "mo": "id-mo", "ma": "id-ma"})
+    assert index.best_match("mo") == "id-mo"
+    assert index.best_match("ma") == "id-ma"
+    assert index.best_match("mimmi") == "id-mimi"
+
+
+def test_min_score_keeps_the_top_results():
+    index = SceneIndex(CATALOG)
+    for query in ("sea sesh", "savannah sunset", "stef nite", "sunset movie"):
+        filtered = index.search(query, k=2, min_score=0.45)
+        assert [r for r in filtered if r[2] >= 0.45] == [r for r in index.search(query, k=2) if r[2] >= 0.45]
@@ -0,0 +1,110 @@
+import json
+import math
+import os
+import random
+
+from catalog import build_catalog
+from color_engine import mirek_to_xy
+from scene_recommender import KDTree, SceneRecommender, describe_request, scene_features
+
+
+def light(brightness=100.0, xy=None, mirek=None, gradient=None, on=True):
+    action = {"on": {"on": on}, "dimming": {"brightness": brightness}}
+    if xy:
+        action["color"] = {"xy": {"x": xy[0], "y": xy[1]}}
+    if mirek:
+        action["color_temperature"] = {"mirek": mirek}
+    if gradient:
+        action["gradient"] = {"points": [{"color": {"xy": {"x": x, "y": y}}} for x, y in gradient]}
+    return {"target": {"rid": "l", "rtype": "light"}, "action": action}
+
+
+def scene(scene_id, name, *lights):
+    return {"id": scene_id, "metadata": {"name": name}, "actions": list(lights)}
+
+
+SCENES = [
+    scene("warm-dim", "Evening", light(30, mirek=450), light(20, mirek=450)),
+    scene("cool-bright", "Work", light(100, mirek=200), light(100, mirek=200)),
+    scene("party", "Disco", light(90, xy=(0.6, 0.38)), light(90, xy=(0.45, 0.22)), light(90, gradient=[(0.35, 0.5), (0.6, 0.38)])),
+    scene("warm-dim-den", "Den evening", light(25, mirek=450)),
+    scene("off", "All off", light(on=False))
+]
+ROOMS = {"warm-dim": "bedroom", "cool-bright": "bedroom", "party": "bedroom", "warm-dim-den": "den", "off": "bedroom"}
+
+
+def make_recommender():
+    return SceneRecommender(SCENES, {s["id"]: s["metadata"]["name"].lower() for s in SCENES}, ROOMS)
+
+
+def test_scene_features():
+    warm = scene_features(SCENES[0])
+    assert warm["brightness"] == 25.0 and warm["spread"] == 0.0 and warm["lights"] == 2
+    assert warm["xy"] == tuple(round(v, 2) for v in mirek_to_xy(450))
+    party = scene_features(SCENES[2])
+    # Gradient points count as colours of their own, weighted by their share of the light
+    assert party["xy"] == (0.6, 0.38)
+    assert party["spread"] > 0.1
+    assert scene_features(SCENES[4]) is None
+
+
+def test_kdtree_matches_brute_force():
+    rng = random.Random(7)
+    points = [((rng.random(), rng.random(), rng.random(), rng.random() / 4), i) for i in range(300)]
+    tree = KDTree(points)
+    for weights in ((1, 1, 0.3, 1), (1, 1, 0, 0), (0, 0, 0.3, 0)):
+        for _ in range(20):
+            target = tuple(rng.random() for _ in range(4))
+            expected = sorted(math.sqrt(sum((w * (a - b)) ** 2 for w, a, b in zip(weights, p, target))) for p, _ in points)[:3]
+            assert [round(d, 9) for d, _ in tree.nearest(target, weights, k=3)] == [round(d, 9) for d in expected]
+
+
+def test_recommend_by_look_and_room():
+    recommender = make_recommender()
+    warm = recommender.recommend("something warm and dim in the bedroom", ["bedroom", "den"])
+    assert warm["scene_id"] == "warm-dim" and warm["location"] == "bedroom"
+    assert warm["confidence"] >= 0.8
+    den = recommender.recommend("something warm and dim in the den", ["bedroom", "den"])
+    assert den["scene_id"] == "warm-dim-den"
+    assert recommender.recommend("a colorful party vibe", ["bedroom", "den"])["scene_id"] == "party"
+    assert recommender.recommend("bright white for reading", ["bedroom", "den"])["scene_id"] == "cool-bright"
+
+
+def test_commands_are_not_recommendations():
+    recommender = make_recommender()
+    # No look at all, or an exact colour that set_color should handle
+    assert recommender.recommend("turn off the tv", ["bedroom"]) is None
+    assert recommender.recommend("make the bedroom red", ["bedroom"]) is None
+    assert describe_request("something red", ["bedroom"])["xy"] is not None
+    # Words the recommender can't place lower its confidence
+    vague = recommender.recommend("something warm like the fireplace at grandmas house", ["bedroom"])
+    assert vague["confidence"] < 0.5
+
+
+def test_real_scenes():
+    with open(os.path.join(os.path.dirname(__file__), "scenes.json")) as f:
+        raw_scenes = json.load(f)["data"]
+    catalog = build_catalog(raw_scenes, [])
+    assert len(catalog.recommender) > 0
+    result = catalog.recommender.recommend("something sleepy and very dim", catalog.locations.keys())
+    features = catalog.recommender.features[result["scene_id"]]
+    assert features["brightness"] < 30
+    colorful = catalog.recommender.recommend("a colorful party vibe", catalog.locations.keys())
+    assert catalog.recommender.features[colorful["scene_id"]]["spread"] > 0.1
+
+
+def test_catalog_scene_names_resolve_to_themselves():
+    with open(os.path.join(os.path.dirname(__file__), "scenes.json")) as f:
+        raw_scenes = json.load(f)["data"]
+    catalog = build_catalog(raw_scenes, [])
+    locations = catalog.locations.keys()
+    for name in catalog.scenes:
+        # Names that read as no look at all ("stefan") are left to the parsers
+        result = catalog.recommender.recommend(name, locations)
+        assert result is None or result["scene_name"] == name
+        if result is not None:
+            assert result["scene_id"] == catalog.scenes[name] and result["confidence"] == 1.0
+    for text, name in (("relax", "relax"), ("relax please", "relax"), ("something relaxing", "relax"), ("a chill vibe", "chill")):
+        assert catalog.recommender.recommend(text, locations)["scene_name"] == name
+    # A name plus more look words is still a recommendation
+    assert catalog.recommender.named_scene("something bright and red", locations) is None
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from single_flight import IdempotencyConflict, IdempotencyStore, SingleFlight, request_fingerprint
+
+
+def test_identical_calls_share_one_run():
+    runs = []
+
+    async def call():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return {"status": "sent"}
+
+    async def run():
+        flight = SingleFlight(linger=0.1)
+        results = await asyncio.gather(*(flight.run("tv off", call) for _ in range(3)))
+        # Still shared shortly after finishing, run again once the linger has passed
+        late = await flight.run("tv off", call)
+        await asyncio.sleep(0.15)
+        again = await flight.run("tv off", call)
+        other = await flight.run("tv on", call)
+        return results, late, again, other, flight.stats()
+
+    results, late, again, other, stats = asyncio.run(run())
+    assert [shared for _, shared in results] == [False, True, True]
+    assert late == ({"status": "sent"}, True)
+    assert again[1] is False and other[1] is False
+    assert len(runs) == 3
+    assert stats["calls"] == 3 and stats["shared"] == 3
+
+
+def test_cancelled_caller_does_not_cancel_shared_call():
+    async def call():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def run():
+        flight = SingleFlight(linger=0)
+        first = asyncio.create_task(flight.run("k", call))
+        second = asyncio.create_task(flight.run("k", call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == ("done", True)
+
+
+def test_idempotency_key_replays_result():
+    runs = []
+
+    async def call():
+        runs.append(1)
+        await asyncio.sleep(0.02)
+        return {"status_code": len(runs) * 100 + 100}
+
+    async def run():
+        store = IdempotencyStore(ttl_seconds=60)
+        fingerprint = request_fingerprint("/control", {"intent": "trigger_ifttt", "device": "tv"})
+        first, retry_in_flight = await asyncio.gather(store.run("k1", fingerprint, call), store.run("k1", fingerprint, call))
+        retry = await store.run("k1", fingerprint, call)
+        with pytest.raises(IdempotencyConflict):
+            await store.run("k1", request_fingerprint("/control", {"intent": "trigger_scene"}), call)
+        # Rejected results (e.g. 5XX) are not kept, so the retry runs again
+        failed = await store.run("k2", fingerprint, call, keep=lambda result: result["status_code"] < 300)
+        rerun = await store.run("k2", fingerprint, call, keep=lambda result: result["status_code"] < 300)
+        return first, retry_in_flight, retry, failed, rerun, store.stats()
+
+    first, retry_in_flight, retry, failed, rerun, stats = asyncio.run(run())
+    assert first == ({"status_code": 200}, False)
+    assert retry_in_flight == retry == ({"status_code": 200}, True)
+    assert failed[1] is False and rerun[1] is False
+    assert len(runs) == 3
+    assert stats["replayed"] == 2 and stats["conflicts"] == 1 and stats["entries"] == 1
+
+
+def test_idempotency_results_expire():
+    async def call():
+        return "ok"
+
+    async def run():
+        store = IdempotencyStore(ttl_seconds=0.05, max_entries=2)
+        for key in ("a", "b", "c"):
+            await store.run(key, "f", call)
+        evicted = store.stats()["entries"]
+        await asyncio.sleep(0.06)
+        return evicted, await store.run("c", "f", call)
+
+    evicted, after_ttl = asyncio.run(run())
+    assert evicted == 2
+    assert after_ttl == ("ok", False)
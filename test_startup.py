@@ -0,0 +1,32 @@
+import asyncio
+
+from startup import StartupTracker
+
+
+def test_warm_up_records_failures_and_marks_ready():
+    tracker = StartupTracker()
+    tracker.mark("imports")
+
+    async def ok():
+        await asyncio.sleep(0)
+
+    async def broken():
+        raise ConnectionError("bridge unreachable")
+
+    asyncio.run(tracker.warm_up({"openai": ok, "hue": broken}))
+    status = tracker.status()
+    assert status["ready"]
+    assert list(status["import_ms"]) == ["imports"]
+    assert status["warmup"]["openai"]["ok"]
+    assert not status["warmup"]["hue"]["ok"]
+    assert status["warmup"]["hue"]["error"] == "bridge unreachable"
+
+
+def test_first_successful_request_per_route():
+    tracker = StartupTracker()
+    tracker.record_request("POST", "/execute", 500, 0.2)
+    tracker.record_request("POST", "/execute", 200, 0.1)
+    tracker.record_request("POST", "/execute", 200, 0.05)
+    first = tracker.status()["first_requests"]
+    assert list(first) == ["POST /execute"]
+    assert first["POST /execute"]["ms"] == 100.0
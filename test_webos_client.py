@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import webos_client
+from benchmarks.fakes import serve_in_thread, webos_app
+from benchmarks.load import free_port
+from webos_client import KeyStore, WebOSClient, WebOSError, resolve_command
+
+
+@pytest.fixture
+def fake_tv():
+    app = webos_app(latency_ms=50)
+    port = free_port()
+    server = serve_in_thread(app, port)
+    yield app, port
+    server.should_exit = True
+
+
+def test_resolve_command():
+    assert resolve_command("Turn off the TV") == ("ssap://system/turnOff", {})
+    assert resolve_command("volume 25") == ("ssap://audio/setVolume", {"volume": 25})
+    assert resolve_command("open Netflix") == ("ssap://system.launcher/launch", {"id": "netflix"})
+    assert resolve_command("turn the TV volume up") == ("ssap://audio/volumeUp", {})
+    assert resolve_command("switch to HDMI 2") == ("ssap://tv/switchInput", {"inputId": "HDMI_2"})
+    assert resolve_command("do a barrel roll") is None
+
+
+def test_pairs_once_and_pipelines_commands(fake_tv, tmp_path):
+    app, port = fake_tv
+    path = str(tmp_path / "keys.json")
+
+    async def session():
+        tv = WebOSClient("tv", KeyStore(path), url=f"ws://127.0.0.1:{port}/")
+        try:
+            await tv.request("ssap://audio/setVolume", {"volume": 20})
+            start = time.perf_counter()
+            # Twenty commands in flight on one socket take about one round trip, not twenty
+            await asyncio.gather(*(tv.request("ssap://audio/volumeUp") for _ in range(20)))
+            elapsed = time.perf_counter() - start
+            volume = await tv.request("ssap://audio/getVolume")
+            with pytest.raises(WebOSError):
+                await tv.request("ssap://nope/nothing")
+            return elapsed, volume, tv.stats()
+        finally:
+            await tv.stop()
+
+    elapsed, volume, stats = asyncio.run(session())
+    assert elapsed < 0.5
+    assert volume["volume"] == 40
+    assert stats["commands"] == 23 and stats["errors"] == 1 and stats["rtt_ms"]["p50"] >= 50
+    # A second session (e.g. after a restart) registers with the stored key: no new prompt
+    asyncio.run(session())
+    assert app.state.counts["pairings"] == 1 and app.state.counts["registrations"] == 2
+    assert KeyStore(path).get("tv")
+
+
+def test_reconnects_after_the_session_drops(fake_tv, tmp_path, monkeypatch):
+    monkeypatch.setattr(webos_client, "BASE_BACKOFF", 0.01)
+    app, port = fake_tv
+
+    async def session():
+        tv = WebOSClient("tv", KeyStore(str(tmp_path / "keys.json")), url=f"ws://127.0.0.1:{port}/")
+        try:
+            await tv.request("ssap://media.controls/pause")
+            async with httpx.AsyncClient() as client:
+                await client.post(f"http://127.0.0.1:{port}/bench/drop")
+            for _ in range(100):
+                if not tv.connected:
+                    break
+                await asyncio.sleep(0.01)
+            await tv.request("ssap://media.controls/play")
+            return tv.stats()
+        finally:
+            await tv.stop()
+
+    stats = asyncio.run(session())
+    assert stats["connects"] == 2 and stats["disconnects"] == 1 and stats["errors"] == 0
+    assert app.state.counts["pairings"] == 1
+
+
+def test_dropped_socket_is_a_webos_error(fake_tv, tmp_path):
+    from websockets.exceptions import ConnectionClosed
+
+    app, port = fake_tv
+
+    async def session():
+        tv = WebOSClient("tv", KeyStore(str(tmp_path / "keys.json")), url=f"ws://127.0.0.1:{port}/")
+        try:
+            await tv.request("ssap://media.controls/pause")
+
+            async def closed(message):
+                raise ConnectionClosed(None, None)
+
+            # The socket went away before the session noticed
+            tv._socket.send = closed
+            with pytest.raises(WebOSError):
+                await tv.request("ssap://media.controls/play")
+            return tv.stats()
+        finally:
+            await tv.stop()
+
+    stats = asyncio.run(session())
+    assert stats["errors"] == 1
+
+
+def test_key_store_creates_its_directory(tmp_path):
+    path = str(tmp_path / "data" / "lg_tv_keys.json")
+    KeyStore(path).put("tv", "client-key")
+    assert KeyStore(path).get("tv") == "client-key"
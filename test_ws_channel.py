@@ -0,0 +1,77 @@
+import asyncio
+
+from fastapi import FastAPI, WebSocket
+from fastapi.testclient import TestClient
+
+from ws_channel import CommandChannels, read_command
+
+
+def make_app(run_command, max_in_flight=8):
+    app = FastAPI()
+    channels = CommandChannels(run_command, max_in_flight=max_in_flight)
+
+    @app.websocket("/ws")
+    async def ws(websocket: WebSocket):
+        await channels.serve(websocket)
+
+    return app, channels
+
+
+def test_read_command_accepts_json_or_plain_text():
+    assert read_command('{"id": 1, "text": "lights off"}') == {"id": 1, "text": "lights off"}
+    assert read_command(" turn on the tv ") == {"text": "turn on the tv"}
+    assert read_command('"quoted"') == {"text": '"quoted"'}
+
+
+def test_events_are_pushed_per_command_and_commands_run_in_order():
+    dispatched = []
+
+    async def run_command(command, emit):
+        await emit("parsed", text=command["text"])
+        # The slow command would finish after the fast one sent after it if they overlapped
+        await asyncio.sleep(0.2 if command["text"] == "slow" else 0.01)
+        dispatched.append(command["text"])
+        await emit("done", status_code=200)
+
+    app, channels = make_app(run_command)
+    with TestClient(app) as client, client.websocket_connect("/ws") as ws:
+        ws.send_json({"id": "a", "text": "slow"})
+        ws.send_text("fast")
+        events = [ws.receive_json() for _ in range(6)]
+
+    assert [e["event"] for e in events if e["id"] == "a"] == ["received", "parsed", "done"]
+    assert [e["event"] for e in events if e["id"] == 2] == ["received", "parsed", "done"]
+    assert dispatched == ["slow", "fast"]
+    done = [e["id"] for e in events if e["event"] == "done"]
+    assert done == ["a", 2]
+    assert channels.stats()["commands"] == 2 and channels.stats()["open"] == 0
+
+
+def test_events_after_done_do_not_hold_up_the_next_command():
+    async def run_command(command, emit):
+        await emit("done", status_code=200)
+        if command["text"] == "ac on":
+            # Like waiting for an IFTTT delivery
+            await asyncio.sleep(0.3)
+            await emit("ifttt_delivered", delivered=True)
+
+    app, _ = make_app(run_command)
+    with TestClient(app) as client, client.websocket_connect("/ws") as ws:
+        ws.send_text("ac on")
+        ws.send_text("lights off")
+        events = [(e["id"], e["event"]) for e in (ws.receive_json() for _ in range(5))]
+
+    assert events.index((2, "done")) < events.index((1, "ifttt_delivered"))
+
+
+def test_failed_command_reports_an_error_event():
+    async def run_command(command, emit):
+        raise RuntimeError("bridge unplugged")
+
+    app, channels = make_app(run_command)
+    with TestClient(app) as client, client.websocket_connect("/ws") as ws:
+        ws.send_json({"id": 7, "intent": "set_color"})
+        assert ws.receive_json()["event"] == "received"
+        error = ws.receive_json()
+    assert error["id"] == 7 and error["event"] == "error" and error["error"] == "bridge unplugged"
+    assert channels.errors == 1
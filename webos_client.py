@@ -0,0 +1,396 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import socket
+import ssl
+import time
+from collections import deque
+
+DEFAULT_KEY_PATH = os.path.join("data", "lg_tv_keys.json")
+# Where keys were kept before; read if the default file doesn't exist yet, so paired TVs
+# don't prompt again
+LEGACY_KEY_PATH = "lg_tv_keys.json"
+DEFAULT_TIMEOUT = 5.0
+# Seconds between WebSocket pings on an idle session
+DEFAULT_KEEPALIVE = 20.0
+# Seconds to wait for the pairing prompt on the TV to be accepted
+PAIRING_TIMEOUT = 60.0
+BASE_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+# Permissions asked for when pairing; the TV shows them in its prompt
+MANIFEST = {
+    "manifestVersion": 1,
+    "appVersion": "1.1",
+    "signed": {
+        "appId": "com.jarvis.smarthome",
+        "vendorId": "com.jarvis",
+        "localizedAppNames": {"": "Jarvis"},
+        "permissions": ["CONTROL_POWER", "CONTROL_AUDIO", "CONTROL_INPUT_TV", "CONTROL_INPUT_MEDIA_PLAYBACK", "LAUNCH", "READ_INSTALLED_APPS", "WRITE_NOTIFICATION_TOAST"],
+        "serial": "jarvis-0001"
+    },
+    "permissions": [
+        "LAUNCH", "CONTROL_AUDIO", "CONTROL_DISPLAY", "CONTROL_INPUT_MEDIA_PLAYBACK", "CONTROL_POWER",
+        "CONTROL_INPUT_TV", "READ_INSTALLED_APPS", "READ_CURRENT_CHANNEL", "READ_RUNNING_APPS",
+        "WRITE_NOTIFICATION_TOAST"
+    ],
+    "signatures": [{"signatureVersion": 1, "signature": ""}]
+}
+
+# Dropped from spoken commands before matching ("turn the TV volume up")
+FILLER_WORDS = frozenset(("the", "tv", "television", "lg", "please", "my", "a", "bit"))
+
+# Handled with Wake-on-LAN: a TV that is off has no webOS session to send them on
+POWER_ON_COMMANDS = frozenset(("on", "power on", "turn on", "turn on the tv", "turn the tv on"))
+
+# Spoken commands -> (SSAP URI, payload)
+COMMANDS = {
+    "off": ("ssap://system/turnOff", {}),
+    "power off": ("ssap://system/turnOff", {}),
+    "turn off": ("ssap://system/turnOff", {}),
+    "volume up": ("ssap://audio/volumeUp", {}),
+    "volume down": ("ssap://audio/volumeDown", {}),
+    "mute": ("ssap://audio/setMute", {"mute": True}),
+    "unmute": ("ssap://audio/setMute", {"mute": False}),
+    "channel up": ("ssap://tv/channelUp", {}),
+    "channel down": ("ssap://tv/channelDown", {}),
+    "play": ("ssap://media.controls/play", {}),
+    "pause": ("ssap://media.controls/pause", {}),
+    "stop": ("ssap://media.controls/stop", {}),
+    "rewind": ("ssap://media.controls/rewind", {}),
+    "fast forward": ("ssap://media.controls/fastForward", {})
+}
+APPS = {
+    "netflix": "netflix",
+    "youtube": "youtube.leanback.v4",
+    "prime video": "amazon",
+    "amazon": "amazon",
+    "disney": "com.disney.disneyplus-prod",
+    "disney plus": "com.disney.disneyplus-prod",
+    "spotify": "spotify-beehive",
+    "live tv": "com.webos.app.livetv",
+    "browser": "com.webos.app.browser"
+}
+
+
+class WebOSError(Exception):
+    """The TV rejected a command, or no session could be used in time."""
+
+
+def resolve_command(command):
+    """
+    Map a spoken TV command to an SSAP request.
+
+    Accepts the fixed commands in COMMANDS, "volume <0-100>", "launch/open <app>",
+    "input hdmi <n>" and raw "ssap://..." URIs.
+
+    Returns:
+        tuple: (uri, payload), or None if the command isn't recognized
+    """
+    text = " ".join(re.sub(r"[^a-z0-9:/._ -]", " ", command.lower()).split())
+    if text.startswith("ssap://"):
+        return text, {}
+    text = " ".join(word for word in text.split() if word not in FILLER_WORDS)
+    text = re.sub(r"^(turn (?!off|on)|set |switch (to )?|change (to )?|go to )", "", text)
+    if text in COMMANDS:
+        uri, payload = COMMANDS[text]
+        return uri, dict(payload)
+    match = re.fullmatch(r"volume (?:to )?(\d{1,3})", text)
+    if match:
+        return "ssap://audio/setVolume", {"volume": min(100, int(match.group(1)))}
+    match = re.fullmatch(r"(?:launch|open|start|play) (.+)", text)
+    if match and match.group(1) in APPS:
+        return "ssap://system.launcher/launch", {"id": APPS[match.group(1)]}
+    match = re.fullmatch(r"(?:input |source )?hdmi ?(\d)", text)
+    if match:
+        return "ssap://tv/switchInput", {"inputId": f"HDMI_{match.group(1)}"}
+    return None
+
+
+def wake_on_lan(mac, broadcast="255.255.255.255"):
+    """Send a Wake-on-LAN magic packet (the only way to turn a webOS TV on)."""
+    address = bytes.fromhex(re.sub(r"[^0-9a-fA-F]", "", mac))
+    if len(address) != 6:
+        raise ValueError(f"Invalid MAC address: {mac}")
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.sendto(b"\xff" * 6 + address * 16, (broadcast, 9))
+
+
+class KeyStore:
+    """Pairing client-keys per TV host, persisted to a JSON file so the TV only prompts once."""
+
+    def __init__(self, path=DEFAULT_KEY_PATH):
+        self.path = path
+        self.keys = {}
+        if path == DEFAULT_KEY_PATH and not os.path.exists(path):
+            path = LEGACY_KEY_PATH
+        if path:
+            try:
+                with open(path) as f:
+                    self.keys = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    def get(self, host):
+        return self.keys.get(host)
+
+    def put(self, host, key):
+        if self.keys.get(host) == key:
+            return
+        self.keys[host] = key
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(self.keys, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.warning(f"Failed to persist LG TV client key: {e}")
+
+
+def _percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class WebOSClient:
+    """
+    A persistent SSAP (webOS) session with one LG TV.
+
+    start() runs a background task that connects, registers with the cached client-key
+    (pairing on first use, when the TV shows a prompt) and reads responses, reconnecting
+    with jittered exponential backoff whenever the socket drops (e.g. the TV was switched
+    off). request() writes one frame on the open socket and waits for the response with
+    the same id, so several commands can be in flight at once. WebSocket pings every
+    keepalive seconds keep the session (and NAT/Wi-Fi state) from idling out.
+
+    Args:
+        host: TV address (host or host:port)
+        keys: KeyStore for the pairing client-key
+        secure: wss:// on port 3001 (required by recent firmware) instead of ws:// on 3000
+        mac: TV MAC address, for turning it on with Wake-on-LAN
+        timeout: Seconds to wait for a session and for each response
+        keepalive: Seconds between pings
+        url: Full WebSocket URL, overriding host/secure (e.g. a local fake)
+    """
+
+    def __init__(
+        self,
+        host,
+        keys,
+        secure=True,
+        mac=None,
+        timeout=DEFAULT_TIMEOUT,
+        keepalive=DEFAULT_KEEPALIVE,
+        url=None
+    ):
+        self.host = host
+        self.keys = keys
+        self.mac = mac
+        self.timeout = timeout
+        self.keepalive = keepalive
+        if url is None:
+            port = "" if ":" in host else (":3001" if secure else ":3000")
+            url = f"{'wss' if secure else 'ws'}://{host}{port}"
+        self.url = url
+        self.connects = 0
+        self.disconnects = 0
+        self.commands = 0
+        self.errors = 0
+        self.last_error = None
+        self.latencies = deque(maxlen=200)
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._socket = None
+        self._ready = None
+        self._task = None
+
+    @property
+    def connected(self):
+        return self._ready is not None and self._ready.is_set()
+
+    def start(self):
+        if self._task is None:
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _ssl_context(self):
+        if not self.url.startswith("wss://"):
+            return None
+        # The TV serves a self-signed certificate
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+
+    async def _run(self):
+        # Imported here: only needed when a TV is configured
+        from websockets.asyncio.client import connect
+
+        failures = 0
+        while True:
+            try:
+                async with connect(
+                    self.url,
+                    ssl=self._ssl_context(),
+                    open_timeout=self.timeout,
+                    ping_interval=self.keepalive,
+                    ping_timeout=self.timeout
+                ) as websocket:
+                    self._socket = websocket
+                    reader = asyncio.create_task(self._read(websocket))
+                    try:
+                        await self._register()
+                        self.connects += 1
+                        failures = 0
+                        self._ready.set()
+                        logging.info(f"LG TV session open: {self.url}")
+                        await reader
+                    finally:
+                        reader.cancel()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e)
+                logging.debug(f"LG TV session to {self.url} failed: {e}")
+            finally:
+                if self._ready.is_set():
+                    self.disconnects += 1
+                self._ready.clear()
+                self._socket = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(WebOSError("Connection to the TV was lost"))
+                self._pending = {}
+            failures += 1
+            delay = min(MAX_BACKOFF, BASE_BACKOFF * 2 ** min(failures - 1, 10))
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def _read(self, websocket):
+        async for message in websocket:
+            try:
+                frame = json.loads(message)
+            except ValueError:
+                continue
+            future = self._pending.get(frame.get("id"))
+            if future is None or future.done():
+                continue
+            if frame.get("type") == "response" and frame.get("payload", {}).get("pairingType") == "PROMPT":
+                # Registration is waiting for the user to accept the prompt on the TV
+                continue
+            self._pending.pop(frame.get("id"), None)
+            if frame.get("type") == "error":
+                future.set_exception(WebOSError(frame.get("error") or "TV returned an error"))
+            else:
+                future.set_result(frame)
+
+    async def _send(self, frame, timeout):
+        from websockets.exceptions import ConnectionClosed
+
+        websocket = self._socket
+        if websocket is None:
+            raise WebOSError("Connection to the TV was lost")
+        future = asyncio.get_running_loop().create_future()
+        self._pending[frame["id"]] = future
+        try:
+            try:
+                await websocket.send(json.dumps(frame))
+            except (ConnectionClosed, OSError) as e:
+                # The TV was switched off, or the socket dropped between keepalives
+                raise WebOSError(f"Connection to the TV was lost: {e}")
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(frame["id"], None)
+
+    async def _register(self):
+        payload = {"forcePairing": False, "pairingType": "PROMPT", "manifest": MANIFEST}
+        key = self.keys.get(self.host)
+        if key:
+            payload["client-key"] = key
+        frame = {"type": "register", "id": f"register_{next(self._ids)}", "payload": payload}
+        response = await self._send(frame, PAIRING_TIMEOUT)
+        if response.get("type") != "registered":
+            raise WebOSError(f"Registration failed: {response}")
+        key = response.get("payload", {}).get("client-key")
+        if key:
+            self.keys.put(self.host, key)
+
+    async def request(self, uri, payload=None, timeout=None):
+        """
+        Send one SSAP request on the open session.
+
+        Returns:
+            dict: The response payload
+
+        Raises:
+            WebOSError: If there's no session within timeout, the TV returns an error or
+                        returnValue false, or the response doesn't arrive in time
+        """
+        self.start()
+        timeout = timeout or self.timeout
+        start = time.perf_counter()
+        self.commands += 1
+        try:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                raise WebOSError(f"TV not reachable at {self.url}" + (f": {self.last_error}" if self.last_error else ""))
+            remaining = max(0.001, timeout - (time.perf_counter() - start))
+            frame = {"type": "request", "id": f"req_{next(self._ids)}", "uri": uri, "payload": payload or {}}
+            try:
+                response = await self._send(frame, remaining)
+            except asyncio.TimeoutError:
+                raise WebOSError(f"No response from the TV to {uri} within {timeout:g}s")
+            result = response.get("payload", {})
+            if result.get("returnValue") is False:
+                raise WebOSError(result.get("errorText") or f"TV rejected {uri}")
+        except WebOSError as e:
+            self.errors += 1
+            self.last_error = str(e)
+            raise
+        self.latencies.append(time.perf_counter() - start)
+        return result
+
+    async def power_on(self):
+        """Wake the TV over LAN; the session reconnects once it is up."""
+        if not self.mac:
+            raise WebOSError("LG_TV_MAC is not set, so the TV can't be turned on over the network")
+        await asyncio.to_thread(wake_on_lan, self.mac)
+
+    def stats(self):
+        def ms(fraction):
+            value = _percentile(self.latencies, fraction)
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            "url": self.url,
+            "connected": self.connected,
+            "paired": self.keys.get(self.host) is not None,
+            "connects": self.connects,
+            "disconnects": self.disconnects,
+            "commands": self.commands,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "rtt_ms": {"p50": ms(0.5), "p95": ms(0.95), "p99": ms(0.99)}
+        }
+
@@ -0,0 +1,147 @@
+import asyncio
+import json
+import logging
+import time
+
+from starlette.websockets import WebSocketDisconnect
+
+# Commands one connection may have running or waiting their turn at once; further frames
+# wait to be read
+DEFAULT_MAX_IN_FLIGHT = 8
+# Events that settle a command; the connection's next command starts after one of them
+SETTLING_EVENTS = ("done", "error")
+
+
+def read_command(message):
+    """
+    Decode one client frame into a command dict.
+
+    A JSON object is taken as is ({"text": ...} or a structured intent / {"actions": [...]},
+    with an optional "id"); any other frame is the text of a spoken command.
+    """
+    try:
+        command = json.loads(message)
+    except ValueError:
+        command = None
+    if not isinstance(command, dict):
+        return {"text": message.strip()}
+    return command
+
+
+class CommandChannels:
+    """
+    Persistent WebSocket command channels (/ws), one per voice client.
+
+    Each frame is one command, run by run_command(command, emit). A connection's commands
+    run in the order they were received: each starts once the one before it has emitted a
+    settling event ("done" or "error") or returned, so "lights on" then "lights off" can
+    never be dispatched the other way round. Events after "done" (e.g. ifttt_delivered)
+    don't hold up the next command. Up to max_in_flight commands are read ahead.
+
+    run_command reports progress through emit(event, **fields); every event is pushed to
+    the client straight away as {"id": ..., "event": ..., "t_ms": ..., ...}, with t_ms
+    measured from when the command was received. Commands without an "id" are numbered
+    per connection. Sends on one connection are serialized, and a client disconnecting
+    cancels its running commands.
+
+    Args:
+        run_command: async callable (command dict, emit)
+        max_in_flight: Commands per connection running or waiting their turn at once
+    """
+
+    def __init__(self, run_command, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+        self.run_command = run_command
+        self.max_in_flight = max_in_flight
+        self.open = 0
+        self.connections = 0
+        self.commands = 0
+        self.events = 0
+        self.errors = 0
+
+    async def serve(self, websocket):
+        """Accept websocket and run its commands until the client disconnects."""
+        await websocket.accept()
+        self.open += 1
+        self.connections += 1
+        send_lock = asyncio.Lock()
+        slots = asyncio.Semaphore(self.max_in_flight)
+        tasks = set()
+        closed = False
+        sequence = 0
+        # Set once the most recently received command has settled
+        previous_settled = None
+
+        async def send(event):
+            nonlocal closed
+            if closed:
+                return
+            async with send_lock:
+                try:
+                    await websocket.send_text(json.dumps(event))
+                    self.events += 1
+                except Exception:
+                    # The client went away mid-command; the receive loop notices too
+                    closed = True
+
+        async def run(command_id, command, turn, settled):
+            received = time.perf_counter()
+
+            async def emit(event, **fields):
+                ms = round((time.perf_counter() - received) * 1000, 1)
+                await send({"id": command_id, "event": event, "t_ms": ms, **fields})
+                if event in SETTLING_EVENTS:
+                    settled.set()
+
+            try:
+                await emit("received")
+                if turn is not None:
+                    await turn.wait()
+                await self.run_command(command, emit)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"/ws command {command_id} failed: {e}")
+                await emit("error", status_code=500, error=str(e))
+            finally:
+                settled.set()
+                slots.release()
+
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                frame = message.get("text")
+                if frame is None:
+                    frame = (message.get("bytes") or b"").decode(errors="replace")
+                command = read_command(frame)
+                sequence += 1
+                command_id = command.pop("id", sequence)
+                self.commands += 1
+                # Stop reading while the connection has max_in_flight commands running or waiting
+                await slots.acquire()
+                settled = asyncio.Event()
+                task = asyncio.create_task(run(command_id, command, previous_settled, settled))
+                previous_settled = settled
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            closed = True
+            self.open -= 1
+            for task in tasks:
+                task.cancel()
+            if tasks:
+                await asyncio.wait(tasks)
+
+    def stats(self):
+        return {
+            "open": self.open,
+            "connections": self.connections,
+            "commands": self.commands,
+            "events": self.events,
+            "errors": self.errors,
+            "max_in_flight": self.max_in_flight
+        }